@@ -1,7 +1,7 @@
 # app_streamlit.py
 import streamlit as st
 import os
-from src.pipeline import run_pipeline
+from src.job_runner import JobRunner, save_upload
 
 st.set_page_config(page_title="Assembly Verification", layout="wide")
 st.title("Assembly Verification from Video Upload")
@@ -16,44 +16,51 @@ golden_steps = [
     "Step 6: Connect charging cable; LED should light"
 ]
 
-st.info("""
-**Instructions for Demo**
-1. Upload an assembly process video.
-2. The system will analyze the video step by step.
-3. Verification results will be displayed below.
-""")
+POLL_SECONDS = 2
 
-# ---- File Uploader ----
-uploaded_video = st.file_uploader("Upload an assembly video", type=["mp4", "mov", "avi"])
 
-if uploaded_video is not None:
-    # Save video to local file
-    os.makedirs("data", exist_ok=True)
-    # Keep original filename
-    filename = uploaded_video.name  
-    video_path = os.path.join("data", filename)
-    with open(video_path, "wb") as f:
-        f.write(uploaded_video.read())
+@st.cache_resource
+def get_runner():
+    # one job queue per server process, shared by all sessions; every worker process loads its own models.
+    # Evidence frames are annotated inside the job: the uploaded video is deleted once it finishes.
+    return JobRunner(workers=int(os.environ.get("APP_JOB_WORKERS", "1")), golden_steps=golden_steps,
+                     annotate=True)
 
-# Unique output folder based on filename (without extension)
-    out_dir = f"out_{os.path.splitext(filename)[0]}"
 
+def poll(fn):
+    # Streamlit >= 1.37 re-runs just this part of the page on a timer; older versions get a refresh button
+    if hasattr(st, "fragment"):
+        return st.fragment(run_every=POLL_SECONDS)(fn)
+    return fn
 
-    col1, col2, col3 = st.columns([1, 2, 1])  # middle column is wider
-    with col2:
-        st.video(video_path)
 
-        st.write("Analysis and results will appear here")
+runner = get_runner()
+st.session_state.setdefault("my_jobs", [])
 
-    # Run pipeline on uploaded video
-    with st.spinner(" Analyzing video, please wait..."):
-        out_dir = os.path.splitext(os.path.basename(video_path))[0]  # e.g., test1
-        out_dir = f"out_{out_dir}"
-        result = run_pipeline(video_path, out_dir, golden_steps)
+st.info("""
+**Instructions for Demo**
+1. Upload an assembly process video.
+2. The system will analyze the video step by step in the background — you can upload more videos meanwhile.
+3. Verification results will be displayed below once a job is done.
+""")
 
+# ---- File Uploader ----
+with st.form("upload", clear_on_submit=True):
+    uploaded_video = st.file_uploader("Upload an assembly video", type=["mp4", "mov", "avi"])
+    submitted = st.form_submit_button("Analyze")
 
+if submitted and uploaded_video is not None:
+    # streamed to disk in chunks under a unique name (several operators may upload the same file name)
+    video_path = save_upload(uploaded_video, os.path.join("data", "uploads"))
+    # Unique output folder based on the stored filename (without extension)
+    out_dir = f"out_{os.path.splitext(os.path.basename(video_path))[0]}"
+    job = runner.submit(video_path, out_dir, name=uploaded_video.name, remove_video=True)
+    st.session_state["my_jobs"].insert(0, job.id)
+    st.toast(f"Queued {uploaded_video.name}")
 
-    st.success("Analysis complete!")
+
+def show_result(job):
+    result = job.result
 
     # ---- Show Results ----
     st.subheader("Verification Results")
@@ -71,6 +78,49 @@ if uploaded_video is not None:
         else:
             st.info(f"{expected} (Unclear)")
 
-    # ---- Debug / Optional ----
+        # annotated by the job (the uploaded video is gone by now); only loaded when asked for
+        if info.get("annotated_frame") and st.checkbox(f"Show evidence for step {step}", key=f"evidence_{job.id}_{step}"):
+            st.image(info["annotated_frame"], caption=f"{info.get('timestamp') or ''}")
+
+
+@poll
+def show_jobs():
+    # jobs live in the server process: ids from before a restart are gone
+    my_jobs = [job for job in map(runner.get, st.session_state["my_jobs"]) if job is not None]
+    if not my_jobs:
+        st.write("Analysis and results will appear here")
+        return
+    for job in my_jobs:
+        snap = job.snapshot()
+        if snap["status"] == "queued":
+            st.write(f"⏳ {snap['name']}: waiting ({runner.queue_position(job)} job(s) ahead)")
+        elif snap["status"] == "running":
+            counts = snap["counts"]
+            total = snap["total"] or "?"
+            st.progress(snap["progress"], text=f"🔄 {snap['name']}: decoded {counts['decode']}/{total}, "
+                                               f"detected {counts['detect']}, verified {counts['vlm']} frames "
+                                               f"({snap['elapsed_s']:.0f}s)")
+        elif snap["status"] == "failed":
+            st.error(f"❌ {snap['name']}: {snap['error']}")
+        else:
+            st.success(f"Analysis of {snap['name']} complete! ({snap['elapsed_s']:.0f}s)")
+    if not hasattr(st, "fragment"):
+        st.button("Refresh")
+
+    done = [job for job in my_jobs if job.status == "done"]
+    if done:
+        names = {job.id: job.name for job in done}
+        selected = st.selectbox("Show results for", list(names), format_func=names.get)
+        show_result(runner.get(selected))
+
+
+show_jobs()
+
+with st.expander("All jobs on this server"):
+    for job in runner.jobs():
+        snap = job.snapshot()
+        st.write(f"{snap['id']} · {snap['name']} · {snap['status']} · {snap['progress']:.0%}")
+
+# ---- Debug / Optional ----
     #with st.expander("🔎 Raw Verification Data"):
         #st.json(result["verification"])
@@ -0,0 +1,237 @@
+# src/alignment.py
+"""
+Golden-vs-test temporal alignment.
+
+Both runs are turned into per-frame feature sequences (best detector confidence per object
+class + which step rules the frame matches) and aligned with a banded DTW: only cells within
+`band` of the (rescaled) diagonal are evaluated, so time is O(N·w) and memory is two cost rows
+plus an int8 move per band cell, instead of O(N·M). Each row is vectorized: the in-row
+recurrence D[j] = c[j] + min(a[j], D[j-1]) is solved with a cumulative sum + running minimum.
+
+    python -m src.alignment --golden out_golden/verification_result.json --test out_test/verification_result.json
+
+Reports per-step time offsets (when each step happened in golden vs test, and where the
+alignment expected it in test) and divergence points (stretches where aligned frames differ).
+Needs the per-frame fields run_pipeline writes (frames, timestamps, vllm_texts, detections).
+"""
+from typing import Optional
+
+import numpy as np
+
+from src.object_detector import LABELS, as_detections
+from src.step_rules import compile_rules, frame_features
+
+CLASSES = list(LABELS)
+
+_DIAG, _UP, _LEFT = 0, 1, 2
+
+
+def sequence_features(result: dict, rules, step_weight: float = 1.0):
+    """
+    (timestamps (N,), features (N, classes + steps) float32) for one run's verification_result.
+    """
+    frames = result.get("frames")
+    answers = result.get("vllm_texts")
+    if not frames or answers is None or "timestamps" not in result:
+        raise ValueError(f"{result.get('video', 'result')}: no per-frame data to align "
+                         "(re-run the pipeline on this video)")
+    detections = result.get("detections") or {}
+    times = np.array([float(result["timestamps"][k]) for k in frames], dtype=np.float64)
+    feats = np.zeros((len(frames), len(CLASSES) + len(rules)), dtype=np.float32)
+    seen = set()
+    for i, key in enumerate(frames):
+        dets = as_detections(detections.get(key))
+        ours = dets.cls < len(CLASSES)   # names beyond LABELS (older caches) have no column
+        np.maximum.at(feats[i], dets.cls[ours], dets.conf[ours])
+        objs, words, named_step = frame_features(answers.get(key, ""), dets)
+        seen |= objs
+        for r, rule in enumerate(rules):
+            if rule.matches(objs, words, named_step, seen):
+                feats[i, len(CLASSES) + r] = step_weight
+    return times, feats
+
+
+def banded_dtw(a: np.ndarray, b: np.ndarray, band: int):
+    """
+    DTW of sequences a (N, F) and b (M, F) under L1 frame distance, restricted to |j - i·M/N| <= band.
+    Returns (path (K, 2) int array, per-step cost along the path (K,), total cost).
+    """
+    n, m = len(a), len(b)
+    if n == 0 or m == 0:
+        raise ValueError("cannot align an empty sequence")
+    # the band must be wide enough for consecutive rows to overlap
+    band = max(int(band), int(np.ceil(m / n)) + 1)
+    centers = np.round(np.arange(n) * ((m - 1) / max(n - 1, 1))).astype(np.int64)
+    lo = np.clip(centers - band, 0, m - 1)
+    hi = np.clip(centers + band + 1, 1, m)
+    width = int((hi - lo).max())
+    moves = np.full((n, width), _DIAG, dtype=np.int8)
+
+    inf = np.inf
+    prev = np.full(m + 1, inf)      # prev[j + 1] = D[i-1, j]; prev[0] = D[i-1, -1] (inf)
+    for i in range(n):
+        l, h = lo[i], hi[i]
+        c = np.abs(b[l:h] - a[i]).sum(axis=1, dtype=np.float64)
+        if i == 0:
+            diag = np.full(h - l, inf)
+            up = np.full(h - l, inf)
+            if l == 0:
+                diag[0] = 0.0      # virtual start before (0, 0)
+        else:
+            diag = prev[l:h]                # D[i-1, j-1]
+            up = prev[l + 1:h + 1]          # D[i-1, j]
+        a_min = np.minimum(diag, up)
+        # D[j] = c[j] + min(a_min[j], D[j-1])  →  D[j] = C[j] + min_{k<=j}(a_min[k] - C[k-1])
+        csum = np.cumsum(c)
+        shifted = a_min - (csum - c)
+        run_min = np.minimum.accumulate(shifted)
+        row = csum + run_min
+
+        # moves: horizontal when the running minimum came from an earlier column
+        left = np.zeros(h - l, dtype=bool)
+        left[1:] = run_min[:-1] < shifted[1:]
+        mv = np.where(left, _LEFT, np.where(up < diag, _UP, _DIAG)).astype(np.int8)
+        moves[i, :h - l] = mv
+
+        cur = np.full(m + 1, inf)
+        cur[l + 1:h + 1] = row
+        prev = cur
+
+    total = float(prev[m])
+    if not np.isfinite(total):
+        raise ValueError("band too narrow for these sequences")
+
+    # backtrack from (n-1, m-1)
+    path = []
+    i, j = n - 1, m - 1
+    while i >= 0 and j >= 0:
+        path.append((i, j))
+        mv = moves[i, j - lo[i]]
+        if mv == _LEFT:
+            j -= 1
+        elif mv == _UP:
+            i -= 1
+        else:
+            i -= 1
+            j -= 1
+    path = np.array(path[::-1], dtype=np.int64)
+    costs = np.abs(a[path[:, 0]] - b[path[:, 1]]).sum(axis=1)
+    return path, costs, total
+
+
+def _first_match(feats: np.ndarray, col: int) -> Optional[int]:
+    hits = np.flatnonzero(feats[:, col] > 0)
+    return int(hits[0]) if len(hits) else None
+
+
+def _feature_names(rules):
+    return CLASSES + [f"step {r.step}" for r in rules]
+
+
+def find_divergences(path, costs, g_times, t_times, g_feats, t_feats, names,
+                     threshold: float = 1.0, min_frames: int = 3) -> list:
+    """
+    Stretches of >= min_frames path cells whose frame distance exceeds threshold.
+    """
+    bad = costs > threshold
+    # run boundaries of consecutive True values
+    edges = np.diff(np.concatenate(([0], bad.astype(np.int8), [0])))
+    starts, ends = np.flatnonzero(edges == 1), np.flatnonzero(edges == -1)
+    out = []
+    for s, e in zip(starts, ends):
+        if e - s < min_frames:
+            continue
+        gi, ti = path[s:e, 0], path[s:e, 1]
+        g_on = g_feats[gi].mean(axis=0) > 0.5 * g_feats.max(initial=1.0)
+        t_on = t_feats[ti].mean(axis=0) > 0.5 * t_feats.max(initial=1.0)
+        out.append({
+            "golden_s": [round(float(g_times[gi[0]]), 2), round(float(g_times[gi[-1]]), 2)],
+            "test_s": [round(float(t_times[ti[0]]), 2), round(float(t_times[ti[-1]]), 2)],
+            "mean_cost": round(float(costs[s:e].mean()), 3),
+            "only_in_golden": [n for n, g, t in zip(names, g_on, t_on) if g and not t],
+            "only_in_test": [n for n, g, t in zip(names, g_on, t_on) if t and not g],
+        })
+    return out
+
+
+def align_runs(golden: dict, test: dict, golden_steps, rules=None, band_s: float = 30.0,
+               divergence_threshold: float = 1.0, min_divergence_frames: int = 3) -> dict:
+    """
+    Align a test run against the golden run (both verification_result dicts).
+    band_s: how far (seconds of test video) the alignment may stray from the rescaled diagonal.
+    """
+    rules = rules or compile_rules(golden_steps)
+    g_times, g_feats = sequence_features(golden, rules)
+    t_times, t_feats = sequence_features(test, rules)
+    return align_sequences(g_times, g_feats, t_times, t_feats, rules, band_s=band_s,
+                           divergence_threshold=divergence_threshold, min_divergence_frames=min_divergence_frames)
+
+
+def align_sequences(g_times, g_feats, t_times, t_feats, rules, band_s: float = 30.0,
+                    divergence_threshold: float = 1.0, min_divergence_frames: int = 3) -> dict:
+    """
+    align_runs on precomputed sequence_features (e.g. a golden index's stored features).
+    """
+    t_span = max(float(t_times[-1] - t_times[0]), 1e-6)
+    band = int(np.ceil(band_s / t_span * len(t_times)))
+    path, costs, total = banded_dtw(g_feats, t_feats, band)
+
+    # golden frame → first aligned test frame
+    g_to_t = np.full(len(g_times), -1, dtype=np.int64)
+    first = np.unique(path[:, 0], return_index=True)[1]
+    g_to_t[path[first, 0]] = path[first, 1]
+
+    steps = {}
+    for r, rule in enumerate(rules):
+        col = len(CLASSES) + r
+        gi, ti = _first_match(g_feats, col), _first_match(t_feats, col)
+        info = {"golden_s": None, "test_s": None, "expected_test_s": None, "offset_s": None, "drift_s": None}
+        if gi is not None:
+            info["golden_s"] = round(float(g_times[gi]), 2)
+            info["expected_test_s"] = round(float(t_times[g_to_t[gi]]), 2)
+        if ti is not None:
+            info["test_s"] = round(float(t_times[ti]), 2)
+        if gi is not None and ti is not None:
+            info["offset_s"] = round(info["test_s"] - info["golden_s"], 2)      # raw time difference
+            info["drift_s"] = round(info["test_s"] - info["expected_test_s"], 2)  # vs the alignment
+        steps[rule.step] = info
+
+    divergences = find_divergences(path, costs, g_times, t_times, g_feats, t_feats, _feature_names(rules),
+                                   threshold=divergence_threshold, min_frames=min_divergence_frames)
+    return {
+        "golden_frames": len(g_times),
+        "test_frames": len(t_times),
+        "band_frames": band,
+        "total_cost": round(total, 3),
+        "mean_cost": round(float(costs.mean()), 4),
+        "steps": steps,
+        "divergences": divergences,
+    }
+
+
+if __name__ == "__main__":
+    import argparse
+    from src.pipeline import GOLDEN_STEPS
+
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--golden", default="out_golden/verification_result.json")
+    parser.add_argument("--test", required=True)
+    parser.add_argument("--band_s", type=float, default=30.0, help="max deviation from the diagonal, seconds")
+    parser.add_argument("--threshold", type=float, default=1.0, help="frame distance counted as divergent")
+    args = parser.parse_args()
+
+    from src.frame_store import load_result
+    golden, test = load_result(args.golden), load_result(args.test)
+    report = align_runs(golden, test, GOLDEN_STEPS, band_s=args.band_s, divergence_threshold=args.threshold)
+
+    for step, info in report["steps"].items():
+        if info["offset_s"] is None:
+            where = "in neither run" if info["golden_s"] is None and info["test_s"] is None else \
+                "only in golden" if info["test_s"] is None else "only in test"
+            print(f"⚠️ Step {step}: observed {where}")
+        else:
+            print(f"⏱️ Step {step}: golden {info['golden_s']}s → test {info['test_s']}s "
+                  f"(offset {info['offset_s']:+.2f}s, {info['drift_s']:+.2f}s vs alignment)")
+    for d in report["divergences"]:
+        print(f"🔀 diverges golden {d['golden_s'][0]}–{d['golden_s'][1]}s / test {d['test_s'][0]}–{d['test_s'][1]}s: "
+              f"only golden {d['only_in_golden']}, only test {d['only_in_test']}")
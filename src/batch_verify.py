@@ -0,0 +1,239 @@
+# src/batch_verify.py
+"""
+Batch verification of many station recordings with a process pool.
+
+    python -m src.batch_verify --videos recordings/ --outdir out_batch --workers 4
+    python -m src.batch_verify --manifest shift_12.txt --outdir out_batch     # one video path per line
+
+Every worker process loads YOLO (and the VLLM with --use_api) once, then runs run_pipeline
+for each video it is handed; results go to <outdir>/<video name>/verification_result.json.
+Finished videos are appended to <outdir>/batch_ledger.jsonl as they complete, so re-running
+the same command after a crash skips them (unless the video file changed) and retries the rest.
+<outdir>/batch_summary.json consolidates the latest ledger entry of every video.
+"""
+import contextlib
+import json
+import os
+import time
+import traceback
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from multiprocessing import get_context
+
+VIDEO_EXTS = (".mp4", ".avi", ".mov", ".mkv")
+LEDGER_NAME = "batch_ledger.jsonl"
+SUMMARY_NAME = "batch_summary.json"
+
+
+def list_videos(videos_dir: str = None, manifest: str = None) -> list:
+    """
+    Video paths from a directory (recursive) or a manifest (one path per line, # comments;
+    relative paths are relative to the manifest).
+    """
+    paths = []
+    if manifest:
+        base = os.path.dirname(os.path.abspath(manifest))
+        with open(manifest, "r", encoding="utf-8") as f:
+            for line in f:
+                line = line.split("#", 1)[0].strip()
+                if line:
+                    paths.append(line if os.path.isabs(line) else os.path.join(base, line))
+    if videos_dir:
+        for dirpath, _, filenames in os.walk(videos_dir):
+            paths += [os.path.join(dirpath, n) for n in filenames if n.lower().endswith(VIDEO_EXTS)]
+    return sorted(dict.fromkeys(os.path.abspath(p) for p in paths))
+
+
+def _out_dirs(videos: list, out_root: str) -> dict:
+    """
+    Output dir per video, named after the file; clashing names get a numeric suffix.
+    """
+    out, used = {}, set()
+    for video in videos:
+        name = os.path.splitext(os.path.basename(video))[0]
+        candidate, n = name, 1
+        while candidate in used:
+            n += 1
+            candidate = f"{name}_{n}"
+        used.add(candidate)
+        out[video] = os.path.join(out_root, candidate)
+    return out
+
+
+def _fingerprint(video: str) -> list:
+    # cheap change check for resume (hashing hundreds of recordings up front would dominate)
+    st = os.stat(video)
+    return [st.st_size, st.st_mtime_ns]
+
+
+# --------------------------
+# Ledger (append-only, one JSON line per finished video)
+# --------------------------
+def read_ledger(path: str) -> dict:
+    """
+    Latest entry per video. A torn last line (crash mid-write) is ignored.
+    """
+    entries = {}
+    if not os.path.exists(path):
+        return entries
+    with open(path, "r", encoding="utf-8") as f:
+        for line in f:
+            try:
+                entry = json.loads(line)
+            except ValueError:
+                continue
+            entries[entry["video"]] = entry
+    return entries
+
+
+def _append_ledger(path: str, entry: dict):
+    with open(path, "a", encoding="utf-8") as f:
+        f.write(json.dumps(entry, ensure_ascii=False) + "\n")
+        f.flush()
+        os.fsync(f.fileno())
+
+
+def _is_finished(entry: dict, video: str) -> bool:
+    return (entry is not None and entry["status"] == "ok" and os.path.exists(video)
+            and entry.get("fingerprint") == _fingerprint(video)
+            and os.path.exists(os.path.join(entry["outdir"], "verification_result.json")))
+
+
+# --------------------------
+# Worker process
+# --------------------------
+def _init_worker(model_path, device, use_api, warmup, initializer=None, initargs=()):
+    # runs once per worker process: models stay loaded for every video it verifies
+    from src import object_detector, vllm_reasoner
+    if initializer is not None:
+        initializer(*initargs)
+    object_detector.configure(model_path=model_path, device=device)
+    if warmup:
+        object_detector.warmup()
+    else:
+        object_detector.ensure_model_loaded()
+    if use_api:
+        vllm_reasoner.ensure_model_loaded()
+
+
+def _verify_one(video: str, out_dir: str, golden_steps: list, options: dict) -> dict:
+    from src.pipeline import run_pipeline
+
+    entry = {"video": video, "outdir": out_dir, "fingerprint": _fingerprint(video), "pid": os.getpid()}
+    os.makedirs(out_dir, exist_ok=True)
+    t0 = time.perf_counter()
+    # per-video log instead of interleaving every worker's prints on the console
+    with open(os.path.join(out_dir, "pipeline.log"), "w", encoding="utf-8") as log, \
+            contextlib.redirect_stdout(log):
+        try:
+            result = run_pipeline(video, out_dir, golden_steps, **options)
+        except Exception as e:
+            traceback.print_exc(file=log)
+            entry.update(status="failed", error=f"{type(e).__name__}: {e}",
+                         wall_s=round(time.perf_counter() - t0, 3))
+            return entry
+
+    verification = result["verification"]
+    missing = [step for step, info in verification.items() if info.get("status") != "done"]
+    entry.update(status="ok", wall_s=round(time.perf_counter() - t0, 3),
+                 frames=len(result["frames"]), steps_total=len(verification),
+                 steps_done=len(verification) - len(missing), missing_steps=missing,
+                 passed=not missing, vlm_calls=result["vlm_gate"]["vlm_calls"])
+    return entry
+
+
+# --------------------------
+# Driver
+# --------------------------
+def write_summary(out_root: str, videos: list) -> dict:
+    ledger = read_ledger(os.path.join(out_root, LEDGER_NAME))
+    rows = [ledger[v] for v in videos if v in ledger]
+    ok = [r for r in rows if r["status"] == "ok"]
+    summary = {
+        "videos": len(videos),
+        "verified": len(ok),
+        "passed": sum(1 for r in ok if r["passed"]),
+        "failed_to_run": sum(1 for r in rows if r["status"] == "failed"),
+        "pending": len(videos) - len(rows),
+        "results": rows,
+    }
+    with open(os.path.join(out_root, SUMMARY_NAME), "w", encoding="utf-8") as f:
+        json.dump(summary, f, indent=2, ensure_ascii=False)
+    return summary
+
+
+def run_batch(videos: list, out_root: str, golden_steps: list, workers: int = 2,
+              model_path: str = None, device: str = None, warmup: bool = False, initializer=None,
+              initargs=(), **options) -> dict:
+    """
+    Verify videos across `workers` processes; `options` are passed to run_pipeline.
+    initializer(*initargs): run in every worker process before the models are loaded.
+    """
+    os.makedirs(out_root, exist_ok=True)
+    ledger_path = os.path.join(out_root, LEDGER_NAME)
+    ledger = read_ledger(ledger_path)
+    out_dirs = _out_dirs(videos, out_root)
+
+    todo = [v for v in videos if not _is_finished(ledger.get(v), v)]
+    print(f"📼 {len(videos)} videos, {len(videos) - len(todo)} already verified, {len(todo)} to run "
+          f"on {workers} workers")
+
+    if todo:
+        # spawn: torch / OpenCV thread pools don't survive fork reliably
+        with ProcessPoolExecutor(max_workers=workers, mp_context=get_context("spawn"),
+                                 initializer=_init_worker,
+                                 initargs=(model_path, device, options.get("use_api", False), warmup,
+                                           initializer, initargs)) as pool:
+            futures = {pool.submit(_verify_one, v, out_dirs[v], golden_steps, options): v for v in todo}
+            for done, fut in enumerate(as_completed(futures), 1):
+                video = futures[fut]
+                try:
+                    entry = fut.result()
+                except Exception as e:   # worker died (e.g. OOM kill): BrokenProcessPool
+                    entry = {"video": video, "outdir": out_dirs[video], "status": "failed",
+                             "error": f"{type(e).__name__}: {e}"}
+                _append_ledger(ledger_path, entry)
+                if entry["status"] == "ok":
+                    mark = "✅" if entry["passed"] else "⚠️"
+                    print(f"{mark} [{done}/{len(todo)}] {video}: {entry['steps_done']}/{entry['steps_total']} "
+                          f"steps ({entry['wall_s']:.1f}s)")
+                else:
+                    print(f"❌ [{done}/{len(todo)}] {video}: {entry['error']}")
+
+    summary = write_summary(out_root, videos)
+    print(f"📊 {summary['passed']}/{summary['verified']} verified videos passed, "
+          f"{summary['failed_to_run']} failed to run → {os.path.join(out_root, SUMMARY_NAME)}")
+    return summary
+
+
+if __name__ == "__main__":
+    import argparse
+    from src.pipeline import GOLDEN_STEPS
+    from src.station_calibration import load_calibration
+    from src.vlm_gate import GatePolicy
+
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--videos", help="directory of videos (searched recursively)")
+    parser.add_argument("--manifest", help="text file with one video path per line")
+    parser.add_argument("--outdir", default="out_batch")
+    parser.add_argument("--workers", type=int, default=max(1, (os.cpu_count() or 2) // 2))
+    parser.add_argument("--stride", type=int, default=8)
+    parser.add_argument("--sampler", choices=["stride", "adaptive"], default="stride")
+    parser.add_argument("--use_api", action="store_true")
+    parser.add_argument("--batch", type=int, default=8, help="frames per YOLO call")
+    parser.add_argument("--model", default=None, help="YOLO weights (default: $YOLO_MODEL_PATH or yolov8n.pt)")
+    parser.add_argument("--device", default=None, help="YOLO device, e.g. cpu or cuda:0")
+    parser.add_argument("--warmup", action="store_true", help="warm up YOLO in every worker before its first video")
+    parser.add_argument("--no_gate", action="store_true", help="send every sampled frame to the VLLM")
+    parser.add_argument("--no_cache", action="store_true", help="ignore and don't fill the result cache")
+    parser.add_argument("--station", default=None, help="crop to this station's calibrated ROI")
+    args = parser.parse_args()
+    if not args.videos and not args.manifest:
+        parser.error("give --videos and/or --manifest")
+
+    videos = list_videos(args.videos, args.manifest)
+    run_batch(videos, args.outdir, GOLDEN_STEPS, workers=args.workers,
+              model_path=args.model, device=args.device, warmup=args.warmup,
+              every_n_frames=args.stride, sampler=args.sampler, use_api=args.use_api,
+              detect_batch_size=args.batch, use_cache=not args.no_cache,
+              vlm_gate=GatePolicy(enabled=not args.no_gate),
+              calibration=load_calibration(args.station) if args.station else None)
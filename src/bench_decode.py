@@ -0,0 +1,49 @@
+# src/bench_decode.py
+"""
+Frames/sec of each decode strategy in frame_extractor against the plain read loop.
+
+    python -m src.bench_decode --videos data/*.mp4 --strides 8 30 300 600
+"""
+import glob
+import time
+
+from src.frame_extractor import (DECODE_STRATEGIES, choose_decode_strategy, estimate_gop_size,
+                                 iter_frames)
+
+
+def bench_strategy(video_path: str, stride: int, strategy: str, repeats: int = 3):
+    """
+    Best-of-`repeats` wall time for one full pass; returns (seconds, sampled_frame_count).
+    """
+    best = None
+    count = 0
+    for _ in range(repeats):
+        t0 = time.perf_counter()
+        count = sum(1 for _ in iter_frames(video_path, stride, strategy))
+        dt = time.perf_counter() - t0
+        best = dt if best is None else min(best, dt)
+    return best, count
+
+
+if __name__ == "__main__":
+    import argparse
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--videos", nargs="+", default=sorted(glob.glob("data/*.mp4")))
+    parser.add_argument("--strides", type=int, nargs="+", default=[8, 30, 300, 600])
+    parser.add_argument("--repeats", type=int, default=3)
+    args = parser.parse_args()
+
+    strategies = [s for s in DECODE_STRATEGIES if s != "auto"]
+    for video in args.videos:
+        gop = estimate_gop_size(video)
+        print(f"\n{video} (GOP ~{gop})")
+        print(f"{'stride':>6} {'strategy':>8} {'frames':>6} {'sec':>7} {'frames/s':>9} {'speedup':>8}")
+        for stride in args.strides:
+            auto = choose_decode_strategy(stride, gop)
+            base = None
+            for strategy in strategies:
+                dt, n = bench_strategy(video, stride, strategy, args.repeats)
+                base = dt if strategy == "read" else base
+                mark = " *" if strategy == auto else ""
+                print(f"{stride:>6} {strategy:>8} {n:>6} {dt:>7.3f} {n / dt:>9.1f} {base / dt:>7.2f}x{mark}")
+    print("\n* = strategy picked by strategy='auto'")
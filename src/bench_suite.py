@@ -0,0 +1,339 @@
+# src/bench_suite.py
+"""
+Reproducible end-to-end benchmark of run_pipeline, runnable offline (no YOLO weights, no LLaVA).
+
+    python -m src.bench_suite --save_baseline          # record benchmarks/baseline.json
+    python -m src.bench_suite                          # re-run, compare, exit 1 on a regression
+    python -m src.bench_suite --scenarios stride8_pipelined --detect_ms 20
+
+Everything is synthetic and seeded:
+  - videos: OpenCV-rendered clips of the earbud procedure (coloured blocks for case, earbuds and
+    cable moving through the steps), written once to .cache/bench/
+  - detector: DummyDetector, an Ultralytics-compatible stand-in that finds those blocks by colour,
+    plus a configurable per-image latency (object_detector.set_model_factory)
+  - VLLM: simulated_vllm with a fixed seed and a configurable per-frame latency (set_simulation)
+
+Each scenario runs in a fresh (spawned) process, so peak RSS belongs to that scenario alone.
+Reported per scenario: sampled frames/s, wall time, per-stage p50/p95 (instrumentation.metrics),
+peak RSS and a hash of the verification output (same seed + inputs → same hash).
+"""
+import contextlib
+import hashlib
+import io
+import json
+import multiprocessing as mp
+import os
+import platform
+import sys
+import tempfile
+import time
+import zlib
+
+import cv2
+import numpy as np
+
+from src.detector_backends import Boxes, Result
+
+BENCH_DIR = os.path.join(".cache", "bench")
+BASELINE_PATH = os.path.join("benchmarks", "baseline.json")
+
+# relative slack before a change counts as a regression
+TOLERANCE = {"fps": 0.15, "p95": 0.25, "rss": 0.20}
+
+SCENARIOS = {
+    "stride8_sequential": {"video": "procedure_20s", "every_n_frames": 8, "executor": "sequential"},
+    "stride8_pipelined": {"video": "procedure_20s", "every_n_frames": 8, "executor": "pipelined"},
+    "adaptive": {"video": "procedure_20s", "sampler": "adaptive", "max_per_second": 4},
+    "long_stride30": {"video": "procedure_120s", "every_n_frames": 30, "executor": "pipelined"},
+}
+
+VIDEOS = {
+    "procedure_20s": {"seconds": 20, "fps": 30, "size": (640, 360)},
+    "procedure_120s": {"seconds": 120, "fps": 30, "size": (640, 360)},
+}
+
+# --------------------------
+# Synthetic video
+# --------------------------
+# BGR colour of each object block; DummyDetector reports them under these COCO names
+# (which CLASS_MAP maps to case / left_earbud / right_earbud / cable)
+OBJECT_COLORS = {
+    "cell phone": (40, 40, 200),
+    "remote": (200, 60, 40),
+    "earphone": (40, 200, 60),
+    "tv": (30, 220, 230),
+}
+
+
+def _object_boxes(t: float, w: int, h: int) -> dict:
+    """
+    Where each object block is at fraction t (0..1) of the clip: the earbuds slide into the
+    case one after the other, the case closes (shrinks), then the cable comes in.
+    """
+    case_h = int(h * (0.30 if t < 0.70 else 0.18))
+    boxes = {"cell phone": (int(w * 0.40), int(h * 0.45), int(w * 0.60), int(h * 0.45) + case_h)}
+
+    def slide(t0, t1, start, end):
+        a = min(max((t - t0) / (t1 - t0), 0.0), 1.0)
+        return int(start + a * (end - start))
+
+    if t < 0.45:   # left earbud: from the left edge into the case
+        x = slide(0.25, 0.40, w * 0.08, w * 0.42)
+        boxes["remote"] = (x, int(h * 0.50), x + int(w * 0.05), int(h * 0.58))
+    if t < 0.65:   # right earbud: from the right edge into the case
+        x = slide(0.45, 0.60, w * 0.85, w * 0.53)
+        boxes["earphone"] = (x, int(h * 0.50), x + int(w * 0.05), int(h * 0.58))
+    if t >= 0.80:  # cable plugged in
+        x = slide(0.80, 0.90, w * 0.95, w * 0.60)
+        boxes["tv"] = (x, int(h * 0.62), min(w - 1, x + int(w * 0.25)), int(h * 0.66))
+    return boxes
+
+
+def make_synthetic_video(path: str, seconds: float = 20, fps: int = 30, size=(640, 360), seed: int = 0) -> str:
+    """
+    Render the synthetic procedure clip (mp4v). Background noise is seeded, so the file is
+    identical for the same arguments.
+    """
+    w, h = size
+    rng = np.random.default_rng(seed)
+    background = rng.integers(90, 140, size=(h, w, 3), dtype=np.uint8)
+    n = int(seconds * fps)
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    writer = cv2.VideoWriter(path, cv2.VideoWriter_fourcc(*"mp4v"), fps, (w, h))
+    if not writer.isOpened():
+        raise RuntimeError(f"cannot write {path} (OpenCV without an mp4v encoder?)")
+    for i in range(n):
+        frame = background.copy()
+        # a slow drift of the whole scene keeps consecutive frames from being identical
+        frame[:, :, 0] = np.roll(frame[:, :, 0], i // 4, axis=1)
+        for name, (x1, y1, x2, y2) in _object_boxes(i / max(n - 1, 1), w, h).items():
+            cv2.rectangle(frame, (x1, y1), (x2, y2), OBJECT_COLORS[name], -1)
+        writer.write(frame)
+    writer.release()
+    return path
+
+
+def bench_video(name: str, root: str = BENCH_DIR) -> str:
+    """
+    Path of a named synthetic video, rendered on first use.
+    """
+    spec = VIDEOS[name]
+    path = os.path.join(root, f"{name}_{spec['size'][0]}x{spec['size'][1]}_{spec['fps']}fps.mp4")
+    if not os.path.exists(path):
+        tmp = f"{path}.tmp{os.getpid()}.mp4"
+        make_synthetic_video(tmp, spec["seconds"], spec["fps"], spec["size"])
+        os.replace(tmp, path)
+    return path
+
+
+# --------------------------
+# Detector stand-in
+# --------------------------
+class DummyDetector:
+    """
+    Ultralytics-compatible stand-in: finds the synthetic object blocks by colour (on a 4x
+    downscaled frame) and sleeps latency_ms per image to mimic a real model's cost.
+    Confidences are derived from the frame content and seed, so results are deterministic.
+    """
+
+    def __init__(self, latency_ms: float = 0.0, seed: int = 0, tolerance: int = 30, min_area: int = 6):
+        self.latency_ms = latency_ms
+        self.seed = seed
+        self.tolerance = tolerance
+        self.min_area = min_area
+        self.names = dict(enumerate(OBJECT_COLORS))
+        self._colors = np.array(list(OBJECT_COLORS.values()), dtype=np.int16)
+
+    def __call__(self, source, device=None, verbose=False, classes=None, conf=None, **kwargs):
+        images = source if isinstance(source, list) else [source]
+        if self.latency_ms:
+            time.sleep(self.latency_ms * len(images) / 1000.0)
+        return [self._detect(cv2.imread(img) if isinstance(img, str) else img, classes, conf) for img in images]
+
+    def _detect(self, img, classes=None, conf=None):
+        small = img[::4, ::4].astype(np.int16)
+        jitter = zlib.crc32(small[::8, ::8].tobytes(), self.seed) / 0xFFFFFFFF
+        found = []
+        for cls_id, color in enumerate(self._colors):
+            if classes is not None and cls_id not in classes:
+                continue
+            mask = (np.abs(small - color).max(axis=2) <= self.tolerance)
+            if mask.sum() < self.min_area:
+                continue
+            ys, xs = np.nonzero(mask)
+            score = round(0.55 + 0.4 * ((jitter + 0.17 * cls_id) % 1.0), 4)
+            if conf is None or score >= conf:
+                found.append((cls_id, score, [xs.min() * 4, ys.min() * 4, xs.max() * 4 + 3, ys.max() * 4 + 3]))
+        return Result(Boxes([f[0] for f in found], [f[1] for f in found], [f[2] for f in found]))
+
+
+# --------------------------
+# Running scenarios
+# --------------------------
+def _peak_rss_mb() -> float:
+    try:
+        import resource
+    except ImportError:   # Windows
+        return float("nan")
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return rss / (1024 * 1024) if sys.platform == "darwin" else rss / 1024   # bytes on macOS, KiB on Linux
+
+
+def _result_hash(result: dict) -> str:
+    payload = {
+        "verification": {s: (v.get("status"), v.get("evidence_frame")) for s, v in result["verification"].items()},
+        "frames": result["frames"],
+        "vllm_texts": result["vllm_texts"],
+    }
+    return hashlib.sha256(json.dumps(payload, sort_keys=True).encode("utf-8")).hexdigest()[:16]
+
+
+def run_scenario(name: str, detect_ms: float = 5.0, vlm_ms: float = 2.0, seed: int = 0) -> dict:
+    """
+    Run one scenario in this process (use _run_isolated for a clean peak RSS).
+    """
+    from src import object_detector
+    from src.instrumentation import metrics
+    from src.pipeline import GOLDEN_STEPS, run_pipeline
+    from src.vllm_reasoner import set_simulation
+
+    options = dict(SCENARIOS[name])
+    video = bench_video(options.pop("video"))
+    object_detector.set_model_factory(lambda: DummyDetector(detect_ms, seed),
+                                      f"bench-dummy@{detect_ms}ms/seed{seed}")
+    set_simulation(seed=seed, latency_ms=vlm_ms)
+
+    with tempfile.TemporaryDirectory(prefix="bench_") as out_dir, contextlib.redirect_stdout(io.StringIO()):
+        t0 = time.perf_counter()
+        result = run_pipeline(video, out_dir, GOLDEN_STEPS, use_cache=False, **options)
+        wall = time.perf_counter() - t0
+    timing = metrics.summary()
+    n = len(result["frames"])
+    return {
+        "frames": n,
+        "wall_s": round(wall, 3),
+        "fps": round(n / wall, 2) if wall else 0.0,
+        "stages": {stage: {k: st[k] for k in ("calls", "items", "p50_ms", "p95_ms", "max_ms")}
+                   for stage, st in timing["stages"].items()},
+        "peak_rss_mb": round(_peak_rss_mb(), 1),
+        "result_hash": _result_hash(result),
+    }
+
+
+def _scenario_worker(queue, name, detect_ms, vlm_ms, seed):
+    try:
+        queue.put(("ok", run_scenario(name, detect_ms, vlm_ms, seed)))
+    except Exception as e:   # report instead of hanging the parent on an empty queue
+        queue.put(("error", f"{type(e).__name__}: {e}"))
+
+
+def _run_isolated(name: str, detect_ms: float, vlm_ms: float, seed: int) -> dict:
+    ctx = mp.get_context("spawn")
+    queue = ctx.Queue()
+    proc = ctx.Process(target=_scenario_worker, args=(queue, name, detect_ms, vlm_ms, seed))
+    proc.start()
+    status, payload = queue.get()
+    proc.join()
+    if status != "ok":
+        raise RuntimeError(f"scenario {name} failed: {payload}")
+    return payload
+
+
+def run_suite(names=None, detect_ms: float = 5.0, vlm_ms: float = 2.0, seed: int = 0, repeats: int = 1) -> dict:
+    """
+    Run the scenarios (each `repeats` times, keeping the fastest run) and return a report
+    that can be saved as a baseline.
+    """
+    names = names or list(SCENARIOS)
+    for name in names:   # render the videos up front, outside the timed runs
+        bench_video(SCENARIOS[name]["video"])
+    results = {}
+    for name in names:
+        runs = [_run_isolated(name, detect_ms, vlm_ms, seed) for _ in range(repeats)]
+        results[name] = max(runs, key=lambda r: r["fps"])
+    return {
+        "config": {"detect_ms": detect_ms, "vlm_ms": vlm_ms, "seed": seed, "repeats": repeats},
+        "machine": {"python": platform.python_version(), "platform": platform.platform(),
+                    "cpus": os.cpu_count()},
+        "created": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "scenarios": results,
+    }
+
+
+def compare_to_baseline(report: dict, baseline: dict, tolerance: dict = None) -> list:
+    """
+    Regressions of report against baseline: list of human-readable strings (empty = none).
+    Only scenarios present in both are compared; a config mismatch is reported as a regression.
+    """
+    tol = {**TOLERANCE, **(tolerance or {})}
+    if report["config"] != baseline.get("config"):
+        return [f"config {report['config']} differs from baseline {baseline.get('config')} (re-record it)"]
+    problems = []
+    for name, cur in report["scenarios"].items():
+        base = baseline["scenarios"].get(name)
+        if base is None:
+            continue
+        if cur["result_hash"] != base["result_hash"]:
+            problems.append(f"{name}: output changed (hash {base['result_hash']} → {cur['result_hash']})")
+        if cur["fps"] < base["fps"] * (1 - tol["fps"]):
+            problems.append(f"{name}: {cur['fps']:.1f} frames/s vs {base['fps']:.1f} baseline")
+        for stage, st in cur["stages"].items():
+            b = base["stages"].get(stage)
+            # sub-millisecond stages are mostly timer noise
+            if b and st["p95_ms"] > max(b["p95_ms"] * (1 + tol["p95"]), b["p95_ms"] + 1.0):
+                problems.append(f"{name}: {stage} p95 {st['p95_ms']:.1f} ms vs {b['p95_ms']:.1f} ms baseline")
+        if cur["peak_rss_mb"] > base["peak_rss_mb"] * (1 + tol["rss"]):
+            problems.append(f"{name}: peak RSS {cur['peak_rss_mb']:.0f} MB vs {base['peak_rss_mb']:.0f} MB baseline")
+    return problems
+
+
+def print_report(report: dict, baseline: dict = None):
+    print(f"{'scenario':<20} {'frames':>6} {'wall s':>7} {'fps':>7} {'vs base':>8} "
+          f"{'detect p50/p95 ms':>18} {'vlm p50/p95 ms':>15} {'RSS MB':>7}")
+    for name, r in report["scenarios"].items():
+        base = (baseline or {}).get("scenarios", {}).get(name)
+        delta = f"{r['fps'] / base['fps'] - 1:+.0%}" if base and base["fps"] else "-"
+        det = r["stages"].get("detect", {})
+        vlm = r["stages"].get("vlm", {})
+        print(f"{name:<20} {r['frames']:>6} {r['wall_s']:>7.2f} {r['fps']:>7.1f} {delta:>8} "
+              f"{det.get('p50_ms', 0):>8.1f}/{det.get('p95_ms', 0):<9.1f} "
+              f"{vlm.get('p50_ms', 0):>6.1f}/{vlm.get('p95_ms', 0):<8.1f} {r['peak_rss_mb']:>7.0f}")
+
+
+if __name__ == "__main__":
+    import argparse
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--scenarios", nargs="+", choices=list(SCENARIOS), default=None)
+    parser.add_argument("--detect_ms", type=float, default=5.0, help="stand-in detector latency per image")
+    parser.add_argument("--vlm_ms", type=float, default=2.0, help="simulated VLLM latency per frame")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--repeats", type=int, default=3, help="runs per scenario (fastest is kept)")
+    parser.add_argument("--baseline", default=BASELINE_PATH)
+    parser.add_argument("--save_baseline", action="store_true", help="write this run as the new baseline")
+    parser.add_argument("--out", default=None, help="also write this run's report to a JSON file")
+    args = parser.parse_args()
+
+    report = run_suite(args.scenarios, args.detect_ms, args.vlm_ms, args.seed, args.repeats)
+    baseline = None
+    if not args.save_baseline and os.path.exists(args.baseline):
+        with open(args.baseline, "r", encoding="utf-8") as f:
+            baseline = json.load(f)
+    print_report(report, baseline)
+
+    if args.out:
+        with open(args.out, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2)
+    if args.save_baseline:
+        os.makedirs(os.path.dirname(args.baseline) or ".", exist_ok=True)
+        with open(args.baseline, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2)
+        print(f"📏 Baseline saved → {args.baseline}")
+    elif baseline is None:
+        print(f"ℹ️ No baseline at {args.baseline} (record one with --save_baseline)")
+    else:
+        problems = compare_to_baseline(report, baseline)
+        for p in problems:
+            print(f"❌ {p}")
+        if problems:
+            sys.exit(1)
+        print("✅ No regressions vs baseline")
@@ -1,11 +1,56 @@
 import json
 
-golden = json.load(open("out_golden/verification_result.json"))
-test = json.load(open("out_test/verification_result.json"))
-
-for step, info in golden["verification"].items():
-    test_status = test["verification"].get(step, {}).get("status", "missing")
-    if test_status != "done":
-        print(f"⚠️ {step}: {info['expected']} is MISSING/UNCLEAR in test video")
-    else:
-        print(f"✅ {step}: completed")
+
+def compare_results(golden: dict, test: dict) -> dict:
+    """
+    Status of every golden step in a test run: "done" or "missing".
+    """
+    compared = {}
+    for step, info in golden["verification"].items():
+        test_status = test["verification"].get(step, {}).get("status", "missing")
+        compared[step] = {"expected": info["expected"],
+                          "status": "done" if test_status == "done" else "missing"}
+    return compared
+
+
+def print_comparison(compared: dict):
+    for step, info in compared.items():
+        if info["status"] != "done":
+            print(f"⚠️ {step}: {info['expected']} is MISSING/UNCLEAR in test video")
+        else:
+            print(f"✅ {step}: completed")
+
+
+if __name__ == "__main__":
+    import argparse
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--golden", default="out_golden/verification_result.json")
+    parser.add_argument("--test", nargs="+", default=["out_test/verification_result.json"],
+                        help="one or more verification_result.json files")
+    parser.add_argument("--align", action="store_true",
+                        help="also align each test run with the golden run in time (src/alignment.py)")
+    args = parser.parse_args()
+
+    def load(path):
+        # the per-frame columns (frame store) are only needed for the alignment
+        if args.align:
+            from src.frame_store import load_result
+            return load_result(path)
+        with open(path, "r", encoding="utf-8") as f:
+            return json.load(f)
+
+    golden = load(args.golden)
+    for path in args.test:
+        test = load(path)
+        if len(args.test) > 1:
+            print(f"--- {path}")
+        print_comparison(compare_results(golden, test))
+        if args.align:
+            from src.alignment import align_runs
+            from src.pipeline import GOLDEN_STEPS
+            report = align_runs(golden, test, GOLDEN_STEPS)
+            for step, info in report["steps"].items():
+                if info["offset_s"] is not None:
+                    print(f"   ⏱️ Step {step}: {info['offset_s']:+.2f}s vs golden")
+            for d in report["divergences"]:
+                print(f"   🔀 diverges at golden {d['golden_s'][0]}s / test {d['test_s'][0]}s")
@@ -0,0 +1,369 @@
+# src/detector_backends.py
+"""
+Detector backends behind object_detector's model interface, for CPU-only line PCs.
+
+A backend is anything object_detector can call like an Ultralytics model:
+    model(frames, device=None, verbose=False, imgsz=None, classes=None, conf=None) → one result per
+    frame with result.boxes (.cls (N,), .conf (N,), .xyxy (N, 4) arrays), plus model.names (id → COCO name)
+so detect_objects / detect_objects_batch and the CLASS_MAP remapping run unchanged on top of it.
+
+    ultralytics  YOLO(weights) — PyTorch .pt (default)
+    onnx         OnnxYolo — ONNX Runtime session with tuned intra-op threads; FP32, FP16 or INT8 exports
+
+    python -m src.detector_backends export --weights yolov8n.pt                       # → yolov8n.onnx
+    python -m src.detector_backends export --weights yolov8n.pt --int8 --calib data/golden.mp4
+    python -m src.detector_backends compare --models yolov8n.pt yolov8n.onnx yolov8n_int8.onnx
+    python src/pipeline.py --video data/test.mp4 --model yolov8n_int8.onnx --threads 4
+
+`compare` runs every model over frames of the sample videos and reports ms/frame and agreement with
+the first (reference) model: matched boxes (same class, IoU >= 0.5), precision / recall / F1 and the
+mean confidence difference.
+"""
+import ast
+import glob
+import os
+import time
+
+import cv2
+import numpy as np
+
+
+class Boxes:
+    # column arrays, like Ultralytics' Boxes (.cls, .conf, .xyxy) without torch
+    __slots__ = ("cls", "conf", "xyxy")
+
+    def __init__(self, cls, conf, xyxy):
+        self.cls = np.asarray(cls, dtype=np.float32).reshape(-1)
+        self.conf = np.asarray(conf, dtype=np.float32).reshape(-1)
+        self.xyxy = np.asarray(xyxy, dtype=np.float32).reshape(-1, 4)
+
+    def __len__(self) -> int:
+        return len(self.cls)
+
+
+class Result:
+    def __init__(self, boxes: Boxes):
+        self.boxes = boxes
+
+
+def letterbox(frame: np.ndarray, size: int, pad_value: int = 114):
+    """
+    Resize keeping aspect ratio and pad to size x size (as Ultralytics does).
+    Returns (image, scale, (pad_x, pad_y)).
+    """
+    h, w = frame.shape[:2]
+    scale = min(size / h, size / w)
+    nw, nh = int(round(w * scale)), int(round(h * scale))
+    resized = cv2.resize(frame, (nw, nh), interpolation=cv2.INTER_LINEAR) if (nw, nh) != (w, h) else frame
+    pad_x, pad_y = (size - nw) // 2, (size - nh) // 2
+    out = np.full((size, size, 3), pad_value, dtype=np.uint8)
+    out[pad_y:pad_y + nh, pad_x:pad_x + nw] = resized
+    return out, scale, (pad_x, pad_y)
+
+
+def nms(boxes: np.ndarray, scores: np.ndarray, classes: np.ndarray, iou_threshold: float) -> np.ndarray:
+    """
+    Class-aware non-maximum suppression; indices of kept boxes, best first.
+    """
+    if not len(boxes):
+        return np.zeros(0, dtype=np.int64)
+    # offset boxes per class so boxes of different classes never overlap
+    shifted = boxes + (classes.astype(np.float64) * (boxes.max() + 1))[:, None]
+    order = np.argsort(-scores)
+    x1, y1, x2, y2 = shifted.T
+    area = (x2 - x1) * (y2 - y1)
+    keep = []
+    while len(order):
+        i = order[0]
+        keep.append(i)
+        rest = order[1:]
+        w = np.clip(np.minimum(x2[i], x2[rest]) - np.maximum(x1[i], x1[rest]), 0, None)
+        h = np.clip(np.minimum(y2[i], y2[rest]) - np.maximum(y1[i], y1[rest]), 0, None)
+        inter = w * h
+        iou = inter / np.maximum(area[i] + area[rest] - inter, 1e-9)
+        order = rest[iou <= iou_threshold]
+    return np.array(keep, dtype=np.int64)
+
+
+def decode_yolov8(output: np.ndarray, scale: float, pad, frame_shape, conf_threshold: float = 0.25,
+                  iou_threshold: float = 0.45, max_det: int = 300, classes=None):
+    """
+    One image's raw YOLOv8 head output (4 + classes, anchors) → (xyxy (K, 4), conf (K,), cls (K,))
+    in frame pixels, after confidence / class filtering (classes: ids to keep) and NMS.
+    """
+    pred = output.T.astype(np.float32, copy=False)          # (anchors, 4 + classes)
+    cls_scores = pred[:, 4:]
+    cls = cls_scores.argmax(axis=1)
+    conf = cls_scores[np.arange(len(cls)), cls]
+    keep = conf >= conf_threshold
+    if classes is not None:
+        keep &= np.isin(cls, classes)
+    pred, cls, conf = pred[keep], cls[keep], conf[keep]
+    if not len(pred):
+        return np.zeros((0, 4), np.float32), np.zeros(0, np.float32), np.zeros(0, np.int64)
+
+    cx, cy, w, h = pred[:, 0], pred[:, 1], pred[:, 2], pred[:, 3]
+    boxes = np.stack([cx - w / 2, cy - h / 2, cx + w / 2, cy + h / 2], axis=1)
+    # undo the letterbox
+    boxes[:, [0, 2]] = (boxes[:, [0, 2]] - pad[0]) / scale
+    boxes[:, [1, 3]] = (boxes[:, [1, 3]] - pad[1]) / scale
+    boxes[:, [0, 2]] = boxes[:, [0, 2]].clip(0, frame_shape[1])
+    boxes[:, [1, 3]] = boxes[:, [1, 3]].clip(0, frame_shape[0])
+
+    idx = nms(boxes, conf, cls, iou_threshold)[:max_det]
+    return boxes[idx], conf[idx], cls[idx]
+
+
+def _read_names(session) -> dict:
+    # Ultralytics exports store the class names as a dict literal in the model metadata
+    meta = session.get_modelmeta().custom_metadata_map
+    if "names" not in meta:
+        raise ValueError("ONNX model has no class names in its metadata (export it with Ultralytics / "
+                         "python -m src.detector_backends export)")
+    return {int(k): v for k, v in ast.literal_eval(meta["names"]).items()}
+
+
+class OnnxYolo:
+    """
+    YOLOv8 ONNX export on ONNX Runtime. threads: intra-op threads (0 = ONNX Runtime default,
+    usually all physical cores); providers: e.g. ["OpenVINOExecutionProvider", "CPUExecutionProvider"]
+    when onnxruntime-openvino is installed. FP16 exports take float16 input; INT8 (QDQ) exports
+    take float32 like the original.
+    """
+
+    def __init__(self, path: str, threads: int = 0, providers=None, conf_threshold: float = 0.25,
+                 iou_threshold: float = 0.45):
+        try:
+            import onnxruntime as ort
+        except ImportError as e:
+            raise ImportError("ONNX detector backend needs onnxruntime (pip install onnxruntime)") from e
+
+        opts = ort.SessionOptions()
+        opts.graph_optimization_level = ort.GraphOptimizationLevel.ORT_ENABLE_ALL
+        opts.execution_mode = ort.ExecutionMode.ORT_SEQUENTIAL
+        opts.inter_op_num_threads = 1
+        if threads:
+            opts.intra_op_num_threads = threads
+        self.session = ort.InferenceSession(path, sess_options=opts,
+                                            providers=providers or ["CPUExecutionProvider"])
+        self.path = path
+        self.names = _read_names(self.session)
+        inp = self.session.get_inputs()[0]
+        self.input_name = inp.name
+        self.input_dtype = np.float16 if "float16" in inp.type else np.float32
+        # static exports fix batch and size; dynamic ones report strings / None
+        batch, _, size = inp.shape[0], inp.shape[1], inp.shape[2]
+        self.batch = batch if isinstance(batch, int) else None
+        self.imgsz = size if isinstance(size, int) else 640
+        self.static_size = isinstance(size, int)
+        self.conf_threshold = conf_threshold
+        self.iou_threshold = iou_threshold
+
+    def __call__(self, source, device=None, verbose=False, imgsz=None, classes=None, conf=None, **kwargs):
+        frames = source if isinstance(source, list) else [source]
+        frames = [cv2.imread(f) if isinstance(f, str) else f for f in frames]
+        size = self.imgsz if self.static_size or not imgsz else int(imgsz)
+
+        prepared = [letterbox(f, size) for f in frames]
+        # BGR HWC uint8 → RGB NCHW float in [0, 1]
+        blob = np.stack([p[0] for p in prepared])[..., ::-1].transpose(0, 3, 1, 2)
+        blob = np.ascontiguousarray(blob, dtype=self.input_dtype) / self.input_dtype(255.0)
+
+        step = self.batch or len(frames)
+        outputs = []
+        for start in range(0, len(frames), step):
+            outputs.append(self.session.run(None, {self.input_name: blob[start:start + step]})[0])
+        raw = np.concatenate(outputs)
+
+        results = []
+        for out, frame, (_, scale, pad) in zip(raw, frames, prepared):
+            boxes, scores, cls = decode_yolov8(out, scale, pad, frame.shape,
+                                               self.conf_threshold if conf is None else conf,
+                                               self.iou_threshold, classes=classes)
+            results.append(Result(Boxes(cls, scores, boxes)))
+        return results
+
+
+# --------------------------
+# Export / quantization
+# --------------------------
+def export_onnx(weights: str = "yolov8n.pt", imgsz: int = 640, half: bool = False, batch: int = 8) -> str:
+    """
+    FP32 (or FP16 with half=True → <name>_fp16.onnx) ONNX export of Ultralytics weights, dynamic batch.
+    """
+    from ultralytics import YOLO
+    # Ultralytics always writes <weights>.onnx: keep an earlier FP32 export out of the FP16 one's way
+    fp32 = os.path.splitext(weights)[0] + ".onnx"
+    aside = f"{fp32}.{os.getpid()}.fp32" if half and os.path.exists(fp32) else None
+    if aside:
+        os.replace(fp32, aside)
+    try:
+        path = str(YOLO(weights).export(format="onnx", imgsz=imgsz, half=half, dynamic=True, batch=batch,
+                                        simplify=True))
+        if half:
+            out = path.replace(".onnx", "_fp16.onnx")
+            os.replace(path, out)
+            path = out
+    finally:
+        if aside:
+            os.replace(aside, fp32)
+    if not os.path.exists(path):
+        raise FileNotFoundError(f"ONNX export did not produce {path}")
+    return path
+
+
+class _FrameCalibration:
+    """
+    onnxruntime CalibrationDataReader over letterboxed frames of sample videos.
+    """
+
+    def __init__(self, input_name: str, videos, imgsz: int, n_frames: int):
+        from src.frame_extractor import iter_frames
+        self.items = []
+        per_video = max(1, n_frames // max(1, len(videos)))
+        for video in videos:
+            cap = cv2.VideoCapture(video)
+            total = int(cap.get(cv2.CAP_PROP_FRAME_COUNT) or 0)
+            cap.release()
+            stride = max(1, total // per_video) if total else 30
+            for i, (_, _, frame) in enumerate(iter_frames(video, stride)):
+                if i >= per_video:
+                    break
+                img = letterbox(frame, imgsz)[0][..., ::-1].transpose(2, 0, 1)[None]
+                self.items.append({input_name: np.ascontiguousarray(img, dtype=np.float32) / 255.0})
+        self._iter = iter(self.items)
+
+    def get_next(self):
+        return next(self._iter, None)
+
+    def rewind(self):
+        self._iter = iter(self.items)
+
+
+def quantize_int8(onnx_path: str, out_path: str = None, calibration_videos=None, n_frames: int = 64,
+                  imgsz: int = 640) -> str:
+    """
+    INT8 export. With calibration videos: static QDQ quantization (activations calibrated on real
+    station frames, the faster and more accurate option for conv nets); without: dynamic (weights only).
+    """
+    from onnxruntime.quantization import QuantFormat, QuantType, quantize_dynamic, quantize_static
+    out_path = out_path or onnx_path.replace(".onnx", "_int8.onnx")
+    if calibration_videos:
+        import onnxruntime as ort
+        input_name = ort.InferenceSession(onnx_path, providers=["CPUExecutionProvider"]).get_inputs()[0].name
+        reader = _FrameCalibration(input_name, calibration_videos, imgsz, n_frames)
+        quantize_static(onnx_path, out_path, reader, quant_format=QuantFormat.QDQ,
+                        activation_type=QuantType.QUInt8, weight_type=QuantType.QInt8, per_channel=True)
+    else:
+        quantize_dynamic(onnx_path, out_path, weight_type=QuantType.QUInt8)
+    if not os.path.exists(out_path):
+        raise FileNotFoundError(f"INT8 quantization did not produce {out_path}")
+    return out_path
+
+
+# --------------------------
+# Accuracy vs speed
+# --------------------------
+def _sample_frames(videos, stride: int, max_frames: int) -> list:
+    from src.frame_extractor import iter_frames
+    frames = []
+    for video in videos:
+        for _, _, frame in iter_frames(video, stride):
+            frames.append(frame)
+            if len(frames) >= max_frames:
+                return frames
+    return frames
+
+
+def _agreement(reference: list, candidate: list, iou_threshold: float = 0.5) -> dict:
+    """
+    Match per-frame Detections (same object, IoU >= iou_threshold) against the reference model's.
+    """
+    from src.object_tracker import greedy_match, iou_matrix
+    tp = n_ref = n_cand = 0
+    conf_diff = []
+    for ref, cand in zip(reference, candidate):
+        n_ref += len(ref)
+        n_cand += len(cand)
+        if not ref or not cand:
+            continue
+        iou = iou_matrix(ref.box.astype(np.float64), cand.box.astype(np.float64))
+        same = ref.cls[:, None] == cand.cls[None, :]
+        rows, cols = greedy_match(np.where(same, iou, 0.0), iou_threshold)
+        tp += len(rows)
+        conf_diff.extend(np.abs(ref.conf[rows] - cand.conf[cols]).tolist())
+    precision = tp / n_cand if n_cand else 1.0
+    recall = tp / n_ref if n_ref else 1.0
+    f1 = 2 * precision * recall / (precision + recall) if precision + recall else 0.0
+    return {"detections": n_cand, "precision": round(precision, 3), "recall": round(recall, 3),
+            "f1": round(f1, 3), "mean_conf_diff": round(float(np.mean(conf_diff)), 4) if conf_diff else None}
+
+
+def compare_models(models, videos, stride: int = 30, max_frames: int = 200, batch_size: int = 8,
+                   threads: int = 0, repeats: int = 2) -> list:
+    """
+    ms/frame of each model over sampled frames of `videos`, and agreement with models[0].
+    """
+    from src import object_detector
+    frames = _sample_frames(videos, stride, max_frames)
+    if not frames:
+        raise RuntimeError("no frames to compare on")
+    rows, reference = [], None
+    for path in models:
+        object_detector.configure(model_path=path, threads=threads)
+        object_detector.warmup()
+        model = object_detector.get_model()
+        best, dets = None, None
+        for _ in range(repeats):
+            t0 = time.perf_counter()
+            dets = object_detector.detect_objects_batch(frames, batch_size=batch_size, model=model)
+            dt = time.perf_counter() - t0
+            best = dt if best is None else min(best, dt)
+        row = {"model": path, "frames": len(frames), "ms_per_frame": round(best / len(frames) * 1000, 2)}
+        if reference is None:
+            reference = dets
+        row.update(_agreement(reference, dets))
+        rows.append(row)
+    return rows
+
+
+if __name__ == "__main__":
+    import argparse
+    parser = argparse.ArgumentParser()
+    sub = parser.add_subparsers(dest="cmd", required=True)
+    e = sub.add_parser("export", help="export Ultralytics weights to ONNX (FP32 / FP16 / INT8)")
+    e.add_argument("--weights", default="yolov8n.pt")
+    e.add_argument("--imgsz", type=int, default=640)
+    e.add_argument("--fp16", action="store_true", help="also write an FP16 export")
+    e.add_argument("--int8", action="store_true", help="also write an INT8 export")
+    e.add_argument("--calib", nargs="*", default=None,
+                   help="videos for static INT8 calibration (default: dynamic quantization)")
+    c = sub.add_parser("compare", help="accuracy vs speed of detector models on the sample videos")
+    c.add_argument("--models", nargs="+", required=True, help="first one is the reference, e.g. yolov8n.pt")
+    c.add_argument("--videos", nargs="+", default=sorted(glob.glob("data/*.mp4")))
+    c.add_argument("--stride", type=int, default=30)
+    c.add_argument("--max_frames", type=int, default=200)
+    c.add_argument("--batch", type=int, default=8)
+    c.add_argument("--threads", type=int, default=0, help="ONNX Runtime intra-op threads (0 = default)")
+    args = parser.parse_args()
+
+    if args.cmd == "export":
+        path = export_onnx(args.weights, args.imgsz)
+        print(f"📦 FP32 → {path}")
+        # INT8 is quantized from the FP32 export, so it goes before the FP16 export
+        if args.int8:
+            print(f"📦 INT8 → {quantize_int8(path, calibration_videos=args.calib, imgsz=args.imgsz)}")
+        if args.fp16:
+            print(f"📦 FP16 → {export_onnx(args.weights, args.imgsz, half=True)}")
+        if not os.path.exists(path):
+            raise FileNotFoundError(f"FP32 export {path} went missing")
+    else:
+        rows = compare_models(args.models, args.videos, args.stride, args.max_frames, args.batch, args.threads)
+        print(f"{'model':<28} {'frames':>6} {'ms/frame':>9} {'speedup':>8} {'dets':>5} {'prec':>6} "
+              f"{'recall':>6} {'F1':>6} {'Δconf':>7}")
+        base = rows[0]["ms_per_frame"]
+        for r in rows:
+            dconf = "-" if r["mean_conf_diff"] is None else f"{r['mean_conf_diff']:.3f}"
+            print(f"{os.path.basename(r['model']):<28} {r['frames']:>6} {r['ms_per_frame']:>9.2f} "
+                  f"{base / r['ms_per_frame']:>7.2f}x {r['detections']:>5} {r['precision']:>6.3f} "
+                  f"{r['recall']:>6.3f} {r['f1']:>6.3f} {dconf:>7}")
@@ -0,0 +1,146 @@
+# src/evidence_renderer.py
+"""
+Lazy evidence rendering: annotated evidence frames are only decoded and drawn when the UI or a
+report asks for them, not on every pipeline run.
+
+    renderer = EvidenceRenderer.from_result(result, out_dir)
+    img = renderer.render("3")                 # BGR array: status banner + stored YOLO boxes
+    path = renderer.annotated_path("3")        # same, written once to <out_dir>/annotated_step3.jpg
+    renderer.annotated_path("3", boxes=False)  # banner only → <out_dir>/annotated_step3_plain.jpg
+
+Frames are looked up through a dict frame key → (video index, timestamp) and decoded with one
+seek each; decoded and annotated images are kept in a small LRU (count-bounded). Boxes come from
+the detections stored with the run (their "box" field), so YOLO never runs again.
+"""
+import os
+import threading
+from collections import OrderedDict
+
+import cv2
+import numpy as np
+
+from src.frame_extractor import parse_frame_name, read_frame_at
+from src.object_detector import as_detections
+
+STATUS_COLORS = {"done": (0, 200, 0), "out_of_order": (0, 165, 255), "uncertain": (0, 215, 255)}
+MISSING_COLOR = (0, 0, 255)
+BOX_COLOR = (255, 160, 0)
+
+
+class _LRU:
+    def __init__(self, max_items: int):
+        self.max_items = max_items
+        self._items = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            if key in self._items:
+                self._items.move_to_end(key)
+                return self._items[key]
+        return None
+
+    def put(self, key, value):
+        with self._lock:
+            self._items[key] = value
+            self._items.move_to_end(key)
+            while len(self._items) > self.max_items:
+                self._items.popitem(last=False)
+
+
+class EvidenceRenderer:
+    def __init__(self, video_path: str, verification: dict, frame_index: dict, detections: dict = None,
+                 out_dir: str = None, max_items: int = 32):
+        """
+        frame_index: frame key → {"index": video frame index, "timestamp": seconds}.
+        """
+        self.video_path = video_path
+        self.verification = verification
+        self.frame_index = frame_index
+        self.detections = detections or {}
+        self.out_dir = out_dir
+        self._frames = _LRU(max_items)
+        self._rendered = _LRU(max_items)
+        self._written = {}   # (step, boxes) → path already written by this renderer
+
+    @classmethod
+    def from_result(cls, result: dict, out_dir: str = None, **kwargs):
+        """
+        Renderer for a verification_result dict (as returned / written by run_pipeline).
+        """
+        index = {key: {"index": parse_frame_name(key), "timestamp": ts}
+                 for key, ts in result.get("timestamps", {}).items()}
+        return cls(result["video"], result["verification"], index, result.get("detections"), out_dir, **kwargs)
+
+    def evidence_key(self, step: str):
+        key = self.verification.get(step, {}).get("evidence_frame")
+        return key if key in self.frame_index else None
+
+    def timestamp(self, step: str):
+        key = self.evidence_key(step)
+        return None if key is None else self.frame_index[key]["timestamp"]
+
+    def frame(self, key: str):
+        img = self._frames.get(key)
+        if img is None:
+            img = read_frame_at(self.video_path, self.frame_index[key]["index"])
+            if img is not None:
+                self._frames.put(key, img)
+        return img
+
+    def render(self, step: str, boxes: bool = True):
+        """
+        Annotated evidence frame of a step (BGR), or None if the step has no evidence frame.
+        """
+        key = self.evidence_key(step)
+        if key is None:
+            return None
+        status = self.verification[step]["status"]
+        cache_key = (key, step, status, boxes)
+        img = self._rendered.get(cache_key)
+        if img is not None:
+            return img
+
+        frame = self.frame(key)
+        if frame is None:
+            return None
+        img = frame.copy()
+        if boxes:
+            dets = as_detections(self.detections.get(key))
+            for obj, conf, box in zip(dets.objects(), dets.conf.tolist(), dets.box):
+                if np.isnan(box[0]):   # detections cached before boxes were stored
+                    continue
+                x1, y1, x2, y2 = (int(v) for v in box)
+                cv2.rectangle(img, (x1, y1), (x2, y2), BOX_COLOR, 2)
+                cv2.putText(img, f"{obj} {conf:.2f}", (x1, max(12, y1 - 4)),
+                            cv2.FONT_HERSHEY_SIMPLEX, 0.45, BOX_COLOR, 1)
+        cv2.putText(img, f"Step {step}: {status}",
+                    (20, 40), cv2.FONT_HERSHEY_SIMPLEX,
+                    1, STATUS_COLORS.get(status, MISSING_COLOR), 2)
+        self._rendered.put(cache_key, img)
+        return img
+
+    def annotated_path(self, step: str, boxes: bool = True):
+        """
+        Path of annotated_step{N}.jpg (annotated_step{N}_plain.jpg without boxes) in out_dir,
+        written on first request. None without evidence.
+        """
+        if (step, boxes) in self._written:
+            return self._written[(step, boxes)]
+        img = self.render(step, boxes)
+        if img is None:
+            return None
+        os.makedirs(self.out_dir, exist_ok=True)
+        # one file per variant: the cached path must keep pointing at the image it names
+        name = f"annotated_step{step}.jpg" if boxes else f"annotated_step{step}_plain.jpg"
+        path = os.path.join(self.out_dir, name)
+        cv2.imwrite(path, img)
+        self._written[(step, boxes)] = path
+        return path
+
+    def render_all(self, boxes: bool = True) -> dict:
+        """
+        Eagerly write every step's annotated frame (reports / CLI --annotate). step → path.
+        """
+        return {step: self.annotated_path(step, boxes) for step in self.verification
+                if self.evidence_key(step) is not None}
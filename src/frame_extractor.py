@@ -1,37 +1,281 @@
 import cv2
 import os
-from typing import List, Tuple
+import time
+from typing import Iterator, List, Optional, Tuple
 
-def extract_frames(video_path: str, out_dir: str, every_n_frames: int = 10) -> Tuple[List[str], List[float]]:
+import numpy as np
+
+from src.instrumentation import metrics
+
+
+def frame_name(idx: int) -> str:
     """
-    Extract frames from a video and return both the frame file paths and their timestamps (in seconds).
+    File name used for the frame at video index `idx` (also the key of its results).
+    """
+    return f"frame_{idx:04d}.jpg"
+
+
+def parse_frame_name(name: str) -> int:
+    """
+    Video index from a frame_name() key (or a path ending in one).
+    """
+    return int(os.path.splitext(os.path.basename(name))[0].rsplit("_", 1)[1])
+
+
+DECODE_STRATEGIES = ("auto", "read", "grab", "seek")
+
+# Fallback keyframe interval when the container can't be probed (x264's default keyint).
+DEFAULT_GOP_SIZE = 250
+
+
+def estimate_gop_size(video_path: str, max_packets: int = 1000) -> int:
+    """
+    Estimate the keyframe interval by demuxing packets without decoding them
+    (OpenCV raw-stream mode). Returns DEFAULT_GOP_SIZE if the backend can't report keyframes.
     """
-    os.makedirs(out_dir, exist_ok=True)
     cap = cv2.VideoCapture(video_path)
-    if not cap.isOpened():
-        raise RuntimeError(f"Cannot open video: {video_path}")
+    try:
+        if not cap.isOpened() or not cap.set(cv2.CAP_PROP_FORMAT, -1):
+            return DEFAULT_GOP_SIZE
 
-    frames = []
-    timestamps = []
+        keyframes = []
+        idx = 0
+        while idx < max_packets and cap.grab():
+            if cap.get(cv2.CAP_PROP_LRF_HAS_KEY_FRAME):
+                keyframes.append(idx)
+            idx += 1
+    finally:
+        cap.release()
+
+    if len(keyframes) < 2:
+        # a single keyframe in the probed range: the GOP is at least that long
+        return max(idx, DEFAULT_GOP_SIZE) if keyframes else DEFAULT_GOP_SIZE
+    gaps = [b - a for a, b in zip(keyframes, keyframes[1:])]
+    return max(1, round(sum(gaps) / len(gaps)))
+
+
+def choose_decode_strategy(every_n_frames: int, gop_size: int) -> str:
+    """
+    Pick the cheapest way to visit every Nth frame:
+      - read: stride 1, every frame is kept anyway
+      - grab: demux+decode skipped frames but skip the colour conversion/copy (retrieve)
+      - seek: stride spans several GOPs, so jumping to each target (decoder restarts
+              at the preceding keyframe) decodes fewer frames than walking there.
+              OpenCV's seek also backs up and re-decodes up to a GOP, so it only pays
+              off from about two GOPs per stride.
+    """
+    if every_n_frames <= 1:
+        return "read"
+    if every_n_frames >= 2 * gop_size:
+        return "seek"
+    return "grab"
+
+
+def _iter_sequential(cap, every_n_frames: int, use_grab: bool):
     idx = 0
+    while True:
+        if idx % every_n_frames == 0:
+            ret, frame = cap.read()
+            if not ret:
+                break
+            # actual timestamp in seconds
+            ts = cap.get(cv2.CAP_PROP_POS_MSEC) / 1000.0
+            yield idx, round(ts, 2), frame
+        elif use_grab:
+            if not cap.grab():
+                break
+        else:
+            ret, _ = cap.read()
+            if not ret:
+                break
+        idx += 1
 
+
+def _iter_seek(cap, every_n_frames: int):
+    idx = 0
     while True:
+        if idx > 0:
+            cap.set(cv2.CAP_PROP_POS_FRAMES, idx)
         ret, frame = cap.read()
         if not ret:
             break
+        ts = cap.get(cv2.CAP_PROP_POS_MSEC) / 1000.0
+        yield idx, round(ts, 2), frame
+        idx += every_n_frames
 
-        if idx % every_n_frames == 0:
-            fname = os.path.join(out_dir, f"frame_{idx:04d}.jpg")
-            cv2.imwrite(fname, frame)
-            frames.append(fname)
 
-            # actual timestamp in seconds
-            ts = cap.get(cv2.CAP_PROP_POS_MSEC) / 1000.0
-            timestamps.append(round(ts, 2))
+def iter_frames(video_path: str, every_n_frames: int = 10,
+                strategy: str = "auto", calibration=None) -> Iterator[Tuple[int, float, np.ndarray]]:
+    """
+    Stream sampled frames straight from the decoder as (frame_index, timestamp_sec, frame) tuples.
+    Nothing is written to disk; frames are BGR arrays as returned by OpenCV.
 
-        idx += 1
+    strategy: one of DECODE_STRATEGIES; "auto" picks from the stride and the container's GOP size.
+    calibration: a StationCalibration; sampled frames come out cropped to its ROI and downscaled.
+    """
+    if strategy not in DECODE_STRATEGIES:
+        raise ValueError(f"Unknown decode strategy: {strategy} (expected one of {DECODE_STRATEGIES})")
+    if strategy == "auto":
+        gop_size = estimate_gop_size(video_path) if every_n_frames > 1 else DEFAULT_GOP_SIZE
+        strategy = choose_decode_strategy(every_n_frames, gop_size)
+
+    cap = cv2.VideoCapture(video_path)
+    if not cap.isOpened():
+        raise RuntimeError(f"Cannot open video: {video_path}")
+
+    try:
+        if strategy == "seek":
+            frames = _iter_seek(cap, every_n_frames)
+        else:
+            frames = _iter_sequential(cap, every_n_frames, use_grab=(strategy == "grab"))
+
+        # time spent inside the decoder only (not in the consumer between yields)
+        t0 = time.perf_counter()
+        for idx, ts, frame in frames:
+            if calibration is not None:
+                frame = calibration.apply(frame)
+            metrics.record("decode", time.perf_counter() - t0)
+            yield idx, ts, frame
+            t0 = time.perf_counter()
+    finally:
+        cap.release()
+
+
+def _activity_thumb(frame: np.ndarray, size: int = 64) -> np.ndarray:
+    small = cv2.resize(frame, (size, size), interpolation=cv2.INTER_AREA)
+    return cv2.cvtColor(small, cv2.COLOR_BGR2GRAY).astype(np.int16)
+
+
+def _pick_window(candidates, budget: int, min_gap: int):
+    """
+    Highest-scoring frames of one window, at most `budget`, at least `min_gap` frames apart.
+    """
+    picked = []
+    for score, idx, ts, frame in sorted(candidates, key=lambda c: -c[0]):
+        if len(picked) >= budget:
+            break
+        if all(abs(idx - p[1]) >= min_gap for p in picked):
+            picked.append((score, idx, ts, frame))
+    return sorted(picked, key=lambda c: c[1])
+
+
+def iter_frames_adaptive(video_path: str, max_per_second: int = 4, min_per_second: int = 1,
+                         probe_every: int = 2, activity_threshold: float = 3.0, calibration=None
+                         ) -> Iterator[Tuple[int, float, np.ndarray]]:
+    """
+    Motion-adaptive sampling. Every `probe_every`-th frame is decoded and scored by the mean
+    absolute difference of a 64x64 grayscale thumbnail against the previous probe. Within each
+    one-second window the highest-scoring frames (activity peaks) are kept; the per-second
+    budget grows with the window's peak score (one frame per `activity_threshold`), clamped to
+    [min_per_second, max_per_second], so idle stretches keep `min_per_second`.
+    Yields (frame_index, timestamp_sec, frame) like iter_frames, with at most one second of latency.
+    calibration: as in iter_frames (activity is then scored inside the ROI only).
+    """
+    cap = cv2.VideoCapture(video_path)
+    if not cap.isOpened():
+        raise RuntimeError(f"Cannot open video: {video_path}")
+
+    fps = cap.get(cv2.CAP_PROP_FPS) or 30.0
+    window = max(1, int(round(fps)))
+    min_gap = max(1, window // (2 * max_per_second))
+    # keep pixels only for the best few candidates of a window
+    max_candidates = 3 * max_per_second
+
+    def flush(candidates):
+        peak = max((c[0] for c in candidates), default=0.0)
+        budget = int(min(max_per_second, max(min_per_second, peak // activity_threshold)))
+        for _, idx, ts, frame in _pick_window(candidates, budget, min_gap):
+            yield idx, ts, frame
+
+    idx = 0
+    prev_thumb = None
+    candidates = []
+    try:
+        t0 = time.perf_counter()
+        while True:
+            if idx % window == 0 and candidates:
+                for item in flush(candidates):
+                    metrics.record("decode", time.perf_counter() - t0)
+                    yield item
+                    t0 = time.perf_counter()
+                candidates = []
+
+            if idx % probe_every:
+                if not cap.grab():
+                    break
+                idx += 1
+                continue
+
+            ret, frame = cap.read()
+            if not ret:
+                break
+            ts = round(cap.get(cv2.CAP_PROP_POS_MSEC) / 1000.0, 2)
+            if calibration is not None:
+                frame = calibration.apply(frame)
+            thumb = _activity_thumb(frame)
+            if prev_thumb is None:
+                # the very first frame always makes it in (initial workstation state)
+                prev_thumb = thumb
+                metrics.record("decode", time.perf_counter() - t0)
+                yield idx, ts, frame
+                t0 = time.perf_counter()
+                idx += 1
+                continue
+            score = float(np.abs(thumb - prev_thumb).mean())
+            prev_thumb = thumb
+
+            candidates.append((score, idx, ts, frame))
+            if len(candidates) > max_candidates:
+                candidates.remove(min(candidates, key=lambda c: c[0]))
+            idx += 1
+
+        for item in flush(candidates):
+            metrics.record("decode", time.perf_counter() - t0)
+            yield item
+            t0 = time.perf_counter()
+    finally:
+        cap.release()
+
+
+def read_frame_at(video_path: str, frame_index: int) -> Optional[np.ndarray]:
+    """
+    Decode a single frame by index (used for evidence frames after a streamed run).
+    """
+    cap = cv2.VideoCapture(video_path)
+    if not cap.isOpened():
+        return None
+    try:
+        cap.set(cv2.CAP_PROP_POS_FRAMES, frame_index)
+        ret, frame = cap.read()
+        return frame if ret else None
+    finally:
+        cap.release()
+
+
+def save_frame(frame: np.ndarray, out_dir: str, idx: int) -> str:
+    """
+    Write a frame as JPEG into `out_dir` and return its path.
+    """
+    os.makedirs(out_dir, exist_ok=True)
+    fname = os.path.join(out_dir, frame_name(idx))
+    cv2.imwrite(fname, frame)
+    return fname
+
+
+def extract_frames(video_path: str, out_dir: str, every_n_frames: int = 10,
+                   strategy: str = "auto", calibration=None) -> Tuple[List[str], List[float]]:
+    """
+    Extract frames from a video and return both the frame file paths and their timestamps (in seconds).
+    calibration: write the station ROI crops (see iter_frames) instead of full frames.
+    """
+    os.makedirs(out_dir, exist_ok=True)
+
+    frames = []
+    timestamps = []
+    for idx, ts, frame in iter_frames(video_path, every_n_frames, strategy, calibration):
+        frames.append(save_frame(frame, out_dir, idx))
+        timestamps.append(ts)
 
-    cap.release()
     return frames, timestamps
 
 if __name__ == "__main__":
@@ -40,7 +284,13 @@ if __name__ == "__main__":
     parser.add_argument("--video", required=True)
     parser.add_argument("--out", default="frames_out")
     parser.add_argument("--stride", type=int, default=10)
+    parser.add_argument("--strategy", choices=DECODE_STRATEGIES, default="auto")
+    parser.add_argument("--station", default=None, help="crop to a calibrated station ROI (src/station_calibration.py)")
     args = parser.parse_args()
-    frames, timestamps = extract_frames(args.video, args.out, args.stride)
+    calibration = None
+    if args.station:
+        from src.station_calibration import load_calibration
+        calibration = load_calibration(args.station)
+    frames, timestamps = extract_frames(args.video, args.out, args.stride, args.strategy, calibration)
     print(f"Saved {len(frames)} frames to {args.out}")
     print("Timestamps:", timestamps[:10], "...")
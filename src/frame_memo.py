@@ -0,0 +1,102 @@
+# src/frame_memo.py
+"""
+Per-frame memo of detections and raw VLLM answers, keyed by frame content hash.
+
+Detections are keyed by (frame hash, detector id), answers by (frame hash, answer model id,
+PROMPT_VERSION[, prompt hash]). A real VLLM sees the golden steps in its prompt (and the
+constrained answer grammar is sized to them), so its answers are also keyed by a hash of that
+per-run prompt. Simulated answers don't depend on the prompt: the golden steps stay out of
+their key, so editing the steps re-verifies from memoized evidence instead of re-querying. Bump PROMPT_VERSION whenever the prompt template itself changes.
+
+Stored in one SQLite file (stdlib, safe across threads/processes, compact JSON values).
+"""
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+from typing import Dict, Iterable
+
+import numpy as np
+
+from src.object_detector import Detections, as_detections
+
+PROMPT_VERSION = "v2"
+MEMO_PATH = os.environ.get("FRAME_MEMO_PATH", os.path.join(".cache", "frame_memo.sqlite"))
+
+# SQLite limits bound parameters per statement; look keys up in chunks
+_LOOKUP_CHUNK = 500
+
+
+def frame_hash(frame: np.ndarray) -> str:
+    """
+    Content hash of a decoded frame (pixels + shape).
+    """
+    h = hashlib.blake2b(digest_size=16)
+    h.update(str(frame.shape).encode())
+    h.update(np.ascontiguousarray(frame).data)
+    return h.hexdigest()
+
+
+def answer_model_id(vlm_id: str, detector_id: str, prompt: str = None) -> str:
+    """
+    Answers depend on the VLLM, the detector (its evidence line is in the prompt) and the prompt template.
+    prompt: the per-run part of the prompt the VLLM sees (None: the answers don't depend on it).
+    """
+    base = f"{vlm_id}|{detector_id}|{PROMPT_VERSION}"
+    if prompt is None:
+        return base
+    return f"{base}|{hashlib.blake2b(prompt.encode('utf-8'), digest_size=8).hexdigest()}"
+
+
+class FrameMemo:
+    def __init__(self, path: str = MEMO_PATH):
+        self.path = path
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        self._local = threading.local()
+        with self._conn() as conn:
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("CREATE TABLE IF NOT EXISTS detections ("
+                         "frame_hash TEXT, model TEXT, data TEXT, PRIMARY KEY (frame_hash, model)) WITHOUT ROWID")
+            conn.execute("CREATE TABLE IF NOT EXISTS answers ("
+                         "frame_hash TEXT, model TEXT, data TEXT, PRIMARY KEY (frame_hash, model)) WITHOUT ROWID")
+
+    def _conn(self) -> sqlite3.Connection:
+        # one connection per thread (sqlite3 connections aren't shareable across threads)
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=30)
+            self._local.conn = conn
+        return conn
+
+    def _get_many(self, table: str, hashes: Iterable[str], model: str) -> Dict[str, object]:
+        hashes = [h for h in dict.fromkeys(hashes) if h]
+        found = {}
+        conn = self._conn()
+        for start in range(0, len(hashes), _LOOKUP_CHUNK):
+            chunk = hashes[start:start + _LOOKUP_CHUNK]
+            marks = ",".join("?" * len(chunk))
+            rows = conn.execute(f"SELECT frame_hash, data FROM {table} "
+                                f"WHERE model = ? AND frame_hash IN ({marks})", [model, *chunk])
+            for h, data in rows:
+                found[h] = json.loads(data)
+        return found
+
+    def _put_many(self, table: str, items: Dict[str, object], model: str) -> None:
+        if not items:
+            return
+        with self._conn() as conn:
+            conn.executemany(f"INSERT OR REPLACE INTO {table} (frame_hash, model, data) VALUES (?, ?, ?)",
+                             [(h, model, json.dumps(v, separators=(",", ":"))) for h, v in items.items()])
+
+    def get_detections(self, hashes: Iterable[str], detector_id: str) -> Dict[str, Detections]:
+        return {h: Detections.from_list(v) for h, v in self._get_many("detections", hashes, detector_id).items()}
+
+    def put_detections(self, items: Dict[str, Detections], detector_id: str) -> None:
+        self._put_many("detections", {h: as_detections(v).to_list() for h, v in items.items()}, detector_id)
+
+    def get_answers(self, hashes: Iterable[str], model_id: str) -> Dict[str, str]:
+        return self._get_many("answers", hashes, model_id)
+
+    def put_answers(self, items: Dict[str, str], model_id: str) -> None:
+        self._put_many("answers", items, model_id)
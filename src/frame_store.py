@@ -0,0 +1,164 @@
+# src/frame_store.py
+"""
+Columnar per-frame store written next to the (now small) verification_result.json.
+
+<out_dir>/frames/ holds one .npy per column, loaded with mmap_mode="r":
+  frame_index.npy   (N,) int32     video frame index (frame key = frame_name(index))
+  timestamp.npy     (N,) float64   seconds, ascending → time range = two binary searches
+  det_offsets.npy   (N+1,) int64   detections of frame i are rows det_offsets[i]:det_offsets[i+1]
+  det_class.npy     (D,) uint8     index into meta.json "classes"
+  det_conf.npy      (D,) float32
+  det_box.npy       (D, 4) float32 x1, y1, x2, y2 (NaN when not stored)
+  answer_id.npy     (N,) int32     index of the frame's VLLM answer (answers are deduplicated:
+                                   gated frames share the answer they reuse)
+  answer_offsets.npy (U+1,) int64  byte range of answer u in answers.bin (UTF-8)
+  answers.bin
+  meta.json         classes, N, column versions
+
+Queries decode only the rows (and answer bytes) they touch:
+
+    store = FrameStore("out_test/frames")
+    store.query(10.0, 20.0)        # {"frames", "timestamps", "detections", "vllm_texts"} for 10 s ≤ t < 20 s
+    load_result("out_test/verification_result.json")    # summary + all columns, as run_pipeline returns it
+"""
+import json
+import os
+
+import numpy as np
+
+from src.alignment import CLASSES
+from src.frame_extractor import frame_name
+from src.object_detector import LABELS, Detections, as_detections
+
+STORE_VERSION = 1
+STORE_DIR = "frames"
+
+
+def write_frame_store(path: str, frame_meta: dict, detections: dict, answers: dict) -> str:
+    """
+    frame_meta: frame key → {"index", "timestamp"} (run order); detections (Detections) / answers
+    keyed the same way.
+    """
+    os.makedirs(path, exist_ok=True)
+    keys = sorted(frame_meta, key=lambda k: (frame_meta[k]["timestamp"], frame_meta[k]["index"]))
+    n = len(keys)
+    per_frame = [as_detections(detections.get(k)) for k in keys]
+    extra = {name for d in per_frame for name in d.labels} - set(CLASSES)
+    classes = list(CLASSES) + sorted(extra)
+    cls_id = {c: i for i, c in enumerate(classes)}
+    # Detections index their own label tuple: translate to the store's class list per tuple
+    tables = {}
+    for d in per_frame:
+        if id(d.labels) not in tables:
+            tables[id(d.labels)] = np.array([cls_id[name] for name in d.labels], dtype=np.uint8)
+
+    frame_index = np.array([frame_meta[k]["index"] for k in keys], dtype=np.int32)
+    timestamp = np.array([frame_meta[k]["timestamp"] for k in keys], dtype=np.float64)
+
+    counts = np.array([len(d) for d in per_frame], dtype=np.int64)
+    det_offsets = np.zeros(n + 1, dtype=np.int64)
+    np.cumsum(counts, out=det_offsets[1:])
+    n_det = int(det_offsets[-1])
+    det_class = np.concatenate([tables[id(d.labels)][d.cls] for d in per_frame] + [np.zeros(0, np.uint8)])
+    det_conf = np.concatenate([d.conf for d in per_frame] + [np.zeros(0, np.float32)])
+    det_box = np.concatenate([d.box for d in per_frame] + [np.zeros((0, 4), np.float32)])
+
+    table, answer_id = {}, np.empty(n, dtype=np.int32)
+    for i, k in enumerate(keys):
+        answer_id[i] = table.setdefault(answers.get(k, ""), len(table))
+    blobs = [text.encode("utf-8") for text in table]
+    answer_offsets = np.zeros(len(blobs) + 1, dtype=np.int64)
+    np.cumsum([len(b) for b in blobs], out=answer_offsets[1:])
+
+    columns = {"frame_index": frame_index, "timestamp": timestamp, "det_offsets": det_offsets,
+               "det_class": det_class, "det_conf": det_conf, "det_box": det_box,
+               "answer_id": answer_id, "answer_offsets": answer_offsets}
+    for name, arr in columns.items():
+        np.save(os.path.join(path, f"{name}.npy"), arr)
+    with open(os.path.join(path, "answers.bin"), "wb") as f:
+        for b in blobs:
+            f.write(b)
+    with open(os.path.join(path, "meta.json"), "w", encoding="utf-8") as f:
+        json.dump({"version": STORE_VERSION, "frames": n, "detections": n_det, "answers": len(blobs),
+                   "classes": classes}, f)
+    return path
+
+
+class FrameStore:
+    def __init__(self, path: str):
+        self.path = path
+        with open(os.path.join(path, "meta.json"), "r", encoding="utf-8") as f:
+            self.meta = json.load(f)
+        if self.meta.get("version") != STORE_VERSION:
+            raise ValueError(f"{path}: frame store version {self.meta.get('version')}, expected {STORE_VERSION}")
+        self.classes = self.meta["classes"]
+        # the label tuple Detections index (shared with the detector's when the classes match)
+        self.labels = LABELS if tuple(self.classes) == LABELS else tuple(self.classes)
+        for name in ("frame_index", "timestamp", "det_offsets", "det_class", "det_conf", "det_box",
+                     "answer_id", "answer_offsets"):
+            setattr(self, name, np.load(os.path.join(path, f"{name}.npy"), mmap_mode="r"))
+        blob_path = os.path.join(path, "answers.bin")
+        # np.memmap can't map an empty file
+        self._blob = np.memmap(blob_path, dtype=np.uint8, mode="r") if os.path.getsize(blob_path) else b""
+
+    def __len__(self):
+        return self.meta["frames"]
+
+    def time_slice(self, t0: float = None, t1: float = None) -> slice:
+        """
+        Rows with t0 <= timestamp < t1 (open ends when None).
+        """
+        lo = 0 if t0 is None else int(np.searchsorted(self.timestamp, t0, side="left"))
+        hi = len(self) if t1 is None else int(np.searchsorted(self.timestamp, t1, side="left"))
+        return slice(lo, max(lo, hi))
+
+    def keys(self, rows: slice) -> list:
+        return [frame_name(int(i)) for i in self.frame_index[rows]]
+
+    def detections(self, rows: slice) -> dict:
+        offsets = np.asarray(self.det_offsets[rows.start:rows.stop + 1])
+        if not len(offsets):
+            return {}
+        lo, hi = int(offsets[0]), int(offsets[-1])
+        cls = np.asarray(self.det_class[lo:hi])
+        conf = np.asarray(self.det_conf[lo:hi])
+        box = np.asarray(self.det_box[lo:hi])
+        return {key: Detections(cls[a:b], conf[a:b], box[a:b], self.labels)
+                for key, a, b in zip(self.keys(rows), offsets[:-1] - lo, offsets[1:] - lo)}
+
+    def answer(self, answer_id: int) -> str:
+        a, b = int(self.answer_offsets[answer_id]), int(self.answer_offsets[answer_id + 1])
+        return bytes(self._blob[a:b]).decode("utf-8")
+
+    def answers(self, rows: slice) -> dict:
+        ids = np.asarray(self.answer_id[rows])
+        texts = {int(u): self.answer(int(u)) for u in np.unique(ids)}
+        return {key: texts[int(u)] for key, u in zip(self.keys(rows), ids)}
+
+    def query(self, t0: float = None, t1: float = None) -> dict:
+        """
+        Per-frame fields (as in run_pipeline's result) for frames with t0 <= timestamp < t1.
+        """
+        rows = self.time_slice(t0, t1)
+        keys = self.keys(rows)
+        return {
+            "frames": keys,
+            "timestamps": {k: round(float(t), 2) for k, t in zip(keys, self.timestamp[rows])},
+            "detections": self.detections(rows),
+            "vllm_texts": self.answers(rows),
+        }
+
+
+def load_result(path: str, t0: float = None, t1: float = None) -> dict:
+    """
+    A verification_result.json (path or its directory) with its per-frame fields filled in from
+    the frame store (optionally only t0 <= t < t1). Older monolithic JSON files load as they are.
+    """
+    if os.path.isdir(path):
+        path = os.path.join(path, "verification_result.json")
+    with open(path, "r", encoding="utf-8") as f:
+        result = json.load(f)
+    store_dir = result.get("frame_store")
+    if store_dir:
+        result.update(FrameStore(os.path.join(os.path.dirname(path), store_dir)).query(t0, t1))
+    return result
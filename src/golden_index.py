@@ -0,0 +1,194 @@
+# src/golden_index.py
+"""
+Precomputed golden reference index, one per procedure / product variant.
+
+    python -m src.golden_index build --video data/golden.mp4 --procedure earbuds
+    python -m src.golden_index list
+    python src/pipeline.py --video data/test.mp4 --procedure earbuds
+
+Layout of <GOLDEN_INDEX_DIR>/<procedure>/ (plain .npy files, loaded with mmap_mode="r"):
+  meta.json        golden steps, rule overrides, classes, per-step status and evidence frame, source video hash
+  times.npy        (N,) float64      timestamp of every sampled golden frame
+  features.npy     (N, F) float32    per-frame alignment features (alignment.sequence_features)
+  signatures.npy   (S, C) float32    mean detection confidence per class over the frames matching each step
+  envelopes.npy    (S, 2) float32    first / last time each step's rule matched (NaN if never)
+  thumbs.npy       (S, T, T, 3) uint8  evidence thumbnail per step (zeros if none)
+
+Loading touches only meta.json and the .npy headers, and loaded indexes are kept per process,
+so test runs compare against the golden run without re-reading its verification JSON.
+"""
+import json
+import os
+import shutil
+import time
+
+import cv2
+import numpy as np
+
+from src.alignment import CLASSES, align_sequences, sequence_features
+from src.frame_extractor import parse_frame_name, read_frame_at
+from src.result_cache import hash_file
+from src.step_rules import compile_rules
+
+INDEX_DIR = os.environ.get("GOLDEN_INDEX_DIR", "golden_index")
+INDEX_VERSION = 1
+THUMB_SIZE = 96
+_ARRAYS = ("times", "features", "signatures", "envelopes", "thumbs")
+
+_loaded = {}
+
+
+def index_path(procedure: str, root: str = INDEX_DIR) -> str:
+    return os.path.join(root, procedure)
+
+
+def build_index(result: dict, procedure: str, golden_steps, step_rules: dict = None,
+                root: str = INDEX_DIR) -> str:
+    """
+    Compile a golden run (a verification_result dict from run_pipeline) into an index.
+    Replaces an existing index of the same procedure.
+    """
+    rules = compile_rules(golden_steps, step_rules)
+    times, feats = sequence_features(result, rules)
+    frames = result["frames"]
+    n_cls = len(CLASSES)
+    matched = feats[:, n_cls:] > 0
+
+    signatures = np.zeros((len(rules), n_cls), dtype=np.float32)
+    envelopes = np.full((len(rules), 2), np.nan, dtype=np.float32)
+    thumbs = np.zeros((len(rules), THUMB_SIZE, THUMB_SIZE, 3), dtype=np.uint8)
+    verification = result.get("verification", {})
+    # golden_frame of a comparison = the golden run's own evidence frame, as with the golden JSON
+    evidence = {r.step: verification.get(r.step, {}).get("evidence_frame") for r in rules}
+    video = result.get("video")
+    for s, rule in enumerate(rules):
+        hits = np.flatnonzero(matched[:, s])
+        if len(hits):
+            signatures[s] = feats[hits, :n_cls].mean(axis=0)
+            envelopes[s] = (times[hits[0]], times[hits[-1]])
+        key = evidence[rule.step]
+        img = read_frame_at(video, parse_frame_name(key)) if key and video and os.path.exists(video) else None
+        if img is not None:
+            thumbs[s] = cv2.resize(img, (THUMB_SIZE, THUMB_SIZE), interpolation=cv2.INTER_AREA)
+
+    meta = {
+        "version": INDEX_VERSION,
+        "procedure": procedure,
+        "video": video,
+        "video_sha256": hash_file(video) if video and os.path.exists(video) else None,
+        "golden_steps": list(golden_steps),
+        "step_rules": step_rules,
+        "steps": [r.step for r in rules],
+        "classes": CLASSES,
+        "status": {r.step: verification.get(r.step, {}).get("status", "missing") for r in rules},
+        "evidence_frames": evidence,
+        "frames": len(frames),
+        "created": time.strftime("%Y-%m-%dT%H:%M:%S"),
+    }
+
+    # write next to the final location, then swap in
+    path = index_path(procedure, root)
+    tmp = f"{path}.tmp{os.getpid()}"
+    shutil.rmtree(tmp, ignore_errors=True)
+    os.makedirs(tmp)
+    for name, arr in zip(_ARRAYS, (times, feats, signatures, envelopes, thumbs)):
+        np.save(os.path.join(tmp, f"{name}.npy"), np.ascontiguousarray(arr))
+    with open(os.path.join(tmp, "meta.json"), "w", encoding="utf-8") as f:
+        json.dump(meta, f, indent=2, ensure_ascii=False)
+    shutil.rmtree(path, ignore_errors=True)
+    os.replace(tmp, path)
+    _loaded.pop(os.path.abspath(path), None)
+    return path
+
+
+class GoldenIndex:
+    def __init__(self, path: str):
+        self.path = path
+        with open(os.path.join(path, "meta.json"), "r", encoding="utf-8") as f:
+            self.meta = json.load(f)
+        if self.meta.get("version") != INDEX_VERSION:
+            raise ValueError(f"{path}: index version {self.meta.get('version')}, expected {INDEX_VERSION} "
+                             "(rebuild it with python -m src.golden_index build)")
+        for name in _ARRAYS:
+            setattr(self, name, np.load(os.path.join(path, f"{name}.npy"), mmap_mode="r"))
+        self.golden_steps = self.meta["golden_steps"]
+        self.rules = compile_rules(self.golden_steps, self.meta.get("step_rules"))
+
+    def compare(self, verification: dict, test_result: dict = None) -> tuple:
+        """
+        Per-step comparison of a test run's verification with the golden run, plus
+        (if test_result has per-frame data) the temporal alignment. Returns (compared, alignment).
+        """
+        compared = {}
+        for s, step in enumerate(self.meta["steps"]):
+            t_info = verification.get(step, {})
+            start, end = (float(x) for x in self.envelopes[s])
+            compared[step] = {
+                "expected": self.golden_steps[s],
+                "status": t_info.get("status", "missing"),
+                "note": t_info.get("note"),
+                "timestamp": t_info.get("timestamp"),
+                "evidence_frame": t_info.get("evidence_frame"),
+                "annotated_frame": t_info.get("annotated_frame"),
+                "golden_frame": self.meta["evidence_frames"].get(step),
+                "golden_status": self.meta["status"][step],
+                "golden_window_s": None if np.isnan(start) else [round(start, 2), round(end, 2)],
+            }
+
+        alignment = None
+        if test_result is not None:
+            t_times, t_feats = sequence_features(test_result, self.rules)
+            alignment = align_sequences(np.asarray(self.times), np.asarray(self.features), t_times, t_feats,
+                                        self.rules)
+        return compared, alignment
+
+
+def load_index(procedure_or_path: str, root: str = INDEX_DIR) -> GoldenIndex:
+    """
+    Index by procedure name (under root) or directory path; cached per process.
+    """
+    path = procedure_or_path if os.path.isdir(procedure_or_path) else index_path(procedure_or_path, root)
+    key = os.path.abspath(path)
+    if key not in _loaded:
+        if not os.path.exists(os.path.join(path, "meta.json")):
+            raise FileNotFoundError(f"no golden index at {path} (build it with python -m src.golden_index build)")
+        _loaded[key] = GoldenIndex(path)
+    return _loaded[key]
+
+
+def list_indexes(root: str = INDEX_DIR) -> list:
+    if not os.path.isdir(root):
+        return []
+    return sorted(name for name in os.listdir(root) if os.path.exists(os.path.join(root, name, "meta.json")))
+
+
+if __name__ == "__main__":
+    import argparse
+    parser = argparse.ArgumentParser()
+    sub = parser.add_subparsers(dest="cmd", required=True)
+    b = sub.add_parser("build", help="run the pipeline on a golden video and index it")
+    b.add_argument("--video", required=True)
+    b.add_argument("--procedure", required=True, help="index name, e.g. the product variant")
+    b.add_argument("--outdir", default="out_golden")
+    b.add_argument("--stride", type=int, default=8)
+    b.add_argument("--rules", default=None, help="JSON step-rule overrides (see src/step_rules.py)")
+    b.add_argument("--steps", default=None, help="text file with one golden step per line (default: built-in)")
+    sub.add_parser("list", help="list built indexes")
+    args = parser.parse_args()
+
+    if args.cmd == "list":
+        for name in list_indexes():
+            idx = load_index(name)
+            print(f"📚 {name}: {len(idx.meta['steps'])} steps, {idx.meta['frames']} frames "
+                  f"from {idx.meta['video']} ({idx.meta['created']})")
+    else:
+        from src.pipeline import GOLDEN_STEPS, run_pipeline
+        from src.step_rules import load_rule_spec
+        golden_steps = GOLDEN_STEPS
+        if args.steps:
+            with open(args.steps, "r", encoding="utf-8") as f:
+                golden_steps = [line.strip() for line in f if line.strip()]
+        spec = load_rule_spec(args.rules) if args.rules else None
+        result = run_pipeline(args.video, args.outdir, golden_steps, args.stride, step_rules=spec)
+        path = build_index(result, args.procedure, golden_steps, spec)
+        print(f"📚 Golden index for '{args.procedure}' → {path}")
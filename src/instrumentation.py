@@ -0,0 +1,133 @@
+# src/instrumentation.py
+"""
+Low-overhead hot-path instrumentation: per-stage timers and counters plus sampled debug logging.
+
+    from src.instrumentation import metrics, log_sampled
+
+    with metrics.timer("detect", n=len(batch)):
+        ...
+    metrics.incr("vlm_calls")
+    log_sampled("detect", "frame %s: %s", key, labels)
+
+Stages used by the pipeline: decode, detect, vlm, verify.
+Set PIPELINE_DEBUG_SAMPLE=N to log every Nth event per stage (0 / unset = off).
+"""
+import json
+import logging
+import os
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+
+logger = logging.getLogger("assembly_verifier")
+
+# Raw durations kept per stage for percentiles (bounded so long runs stay O(1) in memory)
+MAX_SAMPLES = 4096
+
+
+class _StageStats:
+    __slots__ = ("calls", "items", "total", "max", "samples")
+
+    def __init__(self):
+        self.calls = 0
+        self.items = 0
+        self.total = 0.0
+        self.max = 0.0
+        self.samples = deque(maxlen=MAX_SAMPLES)
+
+    def to_dict(self):
+        samples = sorted(self.samples)
+        def pct(q):
+            return samples[min(len(samples) - 1, int(q * len(samples)))] * 1000 if samples else 0.0
+        return {
+            "calls": self.calls,
+            "items": self.items,
+            "total_s": round(self.total, 4),
+            "mean_ms": round(self.total / self.calls * 1000, 3) if self.calls else 0.0,
+            "per_item_ms": round(self.total / self.items * 1000, 3) if self.items else 0.0,
+            "p50_ms": round(pct(0.50), 3),
+            "p95_ms": round(pct(0.95), 3),
+            "max_ms": round(self.max * 1000, 3),
+        }
+
+
+class Instrumentation:
+    """
+    Thread-safe collection of stage timers and counters for one pipeline run.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        with self._lock:
+            self._stages = {}
+            self._counters = {}
+            self._started = time.perf_counter()
+
+    def record(self, stage: str, seconds: float, n: int = 1):
+        with self._lock:
+            st = self._stages.get(stage)
+            if st is None:
+                st = self._stages[stage] = _StageStats()
+            st.calls += 1
+            st.items += n
+            st.total += seconds
+            if seconds > st.max:
+                st.max = seconds
+            st.samples.append(seconds)
+
+    @contextmanager
+    def timer(self, stage: str, n: int = 1):
+        t0 = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.record(stage, time.perf_counter() - t0, n)
+
+    def incr(self, counter: str, n: int = 1):
+        with self._lock:
+            self._counters[counter] = self._counters.get(counter, 0) + n
+
+    def summary(self) -> dict:
+        with self._lock:
+            return {
+                "wall_s": round(time.perf_counter() - self._started, 4),
+                "stages": {name: st.to_dict() for name, st in self._stages.items()},
+                "counters": dict(self._counters),
+            }
+
+    def write_json(self, path: str) -> dict:
+        data = self.summary()
+        with open(path, "w", encoding="utf-8") as f:
+            json.dump(data, f, indent=2)
+        return data
+
+
+metrics = Instrumentation()
+
+# --------------------------
+# Sampled debug logging
+# --------------------------
+_sample_every = int(os.environ.get("PIPELINE_DEBUG_SAMPLE", "0") or 0)
+_sample_counts = {}
+
+
+def set_debug_sampling(every_n: int):
+    """
+    Log every Nth event per stage at DEBUG level (0 disables).
+    """
+    global _sample_every
+    _sample_every = max(0, int(every_n))
+    _sample_counts.clear()
+
+
+def log_sampled(stage: str, msg: str, *args):
+    if not _sample_every:
+        return
+    n = _sample_counts.get(stage, 0)
+    _sample_counts[stage] = n + 1
+    if n % _sample_every == 0:
+        logger.debug("[%s #%d] " + msg, stage, n, *args)
@@ -0,0 +1,264 @@
+# src/job_runner.py
+"""
+Background verification jobs for the Streamlit app (or any long-lived server process).
+
+    runner = JobRunner(workers=1)                  # once per process (st.cache_resource in the app)
+    path = save_upload(uploaded_file, "data/uploads")
+    job = runner.submit(path, "out_jobs/test1", remove_video=True)   # returns at once; waits in the queue
+    job.snapshot()                                 # status, per-stage frame counts, progress 0..1
+
+Each job runs in a worker process (spawned once, reused for later jobs): a worker loads its own
+YOLO / VLLM models and owns its stage timers, so workers=N runs N jobs in parallel at the cost of N
+copies of the models. Progress reports come back over a queue and are applied to the Job objects
+here; a session only polls its jobs' snapshots, nothing in the UI thread waits for a pipeline run.
+remove_video=True deletes the uploaded copy once the job has finished (done or failed).
+"""
+import itertools
+import multiprocessing
+import os
+import shutil
+import threading
+import time
+import traceback
+import uuid
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+
+import cv2
+
+UPLOAD_CHUNK = 4 * 1024 * 1024
+STAGES = ("decode", "detect", "vlm")
+
+
+def save_upload(uploaded, upload_dir: str, chunk_size: int = UPLOAD_CHUNK) -> str:
+    """
+    Copy an uploaded file object (e.g. Streamlit's UploadedFile) to upload_dir in chunks, under a
+    unique name so concurrent uploads of the same file name don't overwrite each other.
+    """
+    os.makedirs(upload_dir, exist_ok=True)
+    name = os.path.basename(getattr(uploaded, "name", "upload.mp4"))
+    stem, ext = os.path.splitext(name)
+    path = os.path.join(upload_dir, f"{stem}_{uuid.uuid4().hex[:8]}{ext}")
+    tmp = f"{path}.part"
+    if hasattr(uploaded, "seek"):
+        uploaded.seek(0)
+    with open(tmp, "wb") as f:
+        shutil.copyfileobj(uploaded, f, chunk_size)
+    os.replace(tmp, path)
+    return path
+
+
+def expected_frames(video_path: str, every_n_frames: int = 8, sampler: str = "stride",
+                    max_per_second: int = 4) -> int:
+    """
+    Number of frames a run will sample (an upper bound for the adaptive sampler; 0 if unknown).
+    """
+    cap = cv2.VideoCapture(video_path)
+    try:
+        count = int(cap.get(cv2.CAP_PROP_FRAME_COUNT) or 0)
+        fps = cap.get(cv2.CAP_PROP_FPS) or 0.0
+    finally:
+        cap.release()
+    if count <= 0:
+        return 0
+    if sampler == "adaptive":
+        return int(count / fps * max_per_second) if fps > 0 else 0
+    return -(-count // max(1, every_n_frames))
+
+
+# --------------------------
+# Worker process side
+# --------------------------
+_events = None   # queue back to the server process, set by _init_worker
+
+
+def _init_worker(events, initializer=None, initargs=()):
+    global _events
+    _events = events
+    if initializer is not None:
+        initializer(*initargs)
+
+
+def _warmup(use_api: bool):
+    from src import object_detector, vllm_reasoner
+    try:
+        object_detector.warmup()
+        if use_api:
+            vllm_reasoner.ensure_model_loaded()
+    except Exception as e:
+        # the first job reports the real error
+        print("⚠️ Model warmup failed:", e)
+
+
+def _run_job(job_id: str, video_path: str, out_dir: str, golden_steps: list, options: dict) -> dict:
+    from src.pipeline import run_pipeline
+    _events.put((job_id, "start", time.time()))
+    try:
+        return run_pipeline(video_path, out_dir, golden_steps,
+                            progress=lambda stage, n: _events.put((job_id, stage, n)), **options)
+    except Exception:
+        traceback.print_exc()
+        raise
+
+
+# --------------------------
+# Server process side
+# --------------------------
+class Job:
+    def __init__(self, job_id: str, video_path: str, out_dir: str, options: dict, name: str = None,
+                 remove_video: bool = False):
+        self.id = job_id
+        self.video_path = video_path
+        self.out_dir = out_dir
+        self.options = options
+        self.name = name or os.path.basename(video_path)
+        self.remove_video = remove_video
+        self.status = "queued"          # queued → running → done | failed
+        self.submitted = time.time()
+        self.started = None
+        self.finished = None
+        self.total = 0                  # expected sampled frames (0 = unknown)
+        self.counts = {stage: 0 for stage in STAGES}
+        self.stage = None               # stage that reported last
+        self.result = None
+        self.error = None
+        self._lock = threading.Lock()
+
+    def report(self, stage: str, n: int):
+        # progress of run_pipeline, relayed from the worker process
+        with self._lock:
+            self.counts[stage] = self.counts.get(stage, 0) + n
+            self.stage = stage
+
+    def progress(self) -> float:
+        if self.status == "done":
+            return 1.0
+        if not self.total:
+            return 0.0
+        # the last stage (vlm + verify) is what's actually finished
+        return min(0.99, self.counts["vlm"] / self.total)
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            counts = dict(self.counts)
+        end = self.finished or time.time()
+        return {
+            "id": self.id,
+            "name": self.name,
+            "status": self.status,
+            "stage": self.stage,
+            "counts": counts,
+            "total": self.total,
+            "progress": round(self.progress(), 3),
+            "elapsed_s": round(end - self.started, 1) if self.started else 0.0,
+            "queued_s": round((self.started or end) - self.submitted, 1),
+            "error": self.error,
+        }
+
+
+class JobRunner:
+    def __init__(self, workers: int = 1, golden_steps=None, warmup: bool = True, initializer=None,
+                 initargs=(), **pipeline_options):
+        """
+        workers: worker processes, i.e. jobs running at the same time (each loads its own models).
+        pipeline_options: defaults for run_pipeline (stride, executor, use_api, ...); submit() can override.
+        warmup: load the models in a worker before the first job instead of inside it.
+        initializer(*initargs): run once in every worker process before its first job.
+        """
+        from src.pipeline import GOLDEN_STEPS
+        self.golden_steps = golden_steps or GOLDEN_STEPS
+        self.pipeline_options = pipeline_options
+        self.workers = workers
+        # spawn, not fork: the server process may already hold torch / CUDA state and threads
+        self._ctx = multiprocessing.get_context("spawn")
+        self._events = self._ctx.Queue()
+        self._init = (self._events, initializer, initargs)
+        self._pool = self._new_pool()
+        self._jobs = {}
+        self._ids = itertools.count(1)
+        self._lock = threading.Lock()
+        self._listener = threading.Thread(target=self._listen, name="job-events", daemon=True)
+        self._listener.start()
+        if warmup:
+            self._pool.submit(_warmup, bool(pipeline_options.get("use_api")))
+
+    def _new_pool(self):
+        return ProcessPoolExecutor(max_workers=self.workers, mp_context=self._ctx,
+                                   initializer=_init_worker, initargs=self._init)
+
+    def _listen(self):
+        while True:
+            event = self._events.get()
+            if event is None:
+                return
+            job_id, stage, n = event
+            job = self._jobs.get(job_id)
+            if job is None:
+                continue
+            if stage == "start":
+                job.started = n
+                if job.status == "queued":
+                    job.status = "running"
+            else:
+                job.report(stage, n)
+
+    def submit(self, video_path: str, out_dir: str, name: str = None, remove_video: bool = False,
+               **options) -> Job:
+        """
+        remove_video: delete video_path (e.g. a save_upload copy) once the job has finished.
+        """
+        options = {**self.pipeline_options, **options}
+        with self._lock:
+            job = Job(f"job{next(self._ids)}", video_path, out_dir, options, name, remove_video)
+            self._jobs[job.id] = job
+        job.total = expected_frames(video_path, options.get("every_n_frames", 8), options.get("sampler", "stride"),
+                                    options.get("max_per_second", 4))
+        args = (_run_job, job.id, video_path, out_dir, self.golden_steps, options)
+        with self._lock:
+            try:
+                future = self._pool.submit(*args)
+            except BrokenProcessPool:
+                # a worker died (e.g. out of memory) and took the pool with it: start a fresh one
+                self._pool = self._new_pool()
+                future = self._pool.submit(*args)
+        future.add_done_callback(lambda f: self._finish(job, f))
+        return job
+
+    def _finish(self, job: Job, future):
+        if future.cancelled():
+            job.error = "cancelled"
+            job.status = "failed"
+        elif future.exception() is None:
+            job.result = future.result()
+            job.status = "done"
+        else:
+            error = future.exception()
+            job.error = f"{type(error).__name__}: {error}"
+            job.status = "failed"
+        job.finished = time.time()
+        if job.remove_video:
+            try:
+                os.remove(job.video_path)
+            except FileNotFoundError:
+                pass
+
+    def get(self, job_id: str) -> Job:
+        return self._jobs.get(job_id)
+
+    def jobs(self) -> list:
+        """
+        All jobs of this process, newest first.
+        """
+        with self._lock:
+            return sorted(self._jobs.values(), key=lambda j: j.submitted, reverse=True)
+
+    def queue_position(self, job: Job) -> int:
+        """
+        Jobs submitted before this one that haven't started yet (0 = next / running).
+        """
+        with self._lock:
+            return sum(1 for j in self._jobs.values() if j.status == "queued" and j.submitted < job.submitted)
+
+    def shutdown(self, wait: bool = True):
+        self._pool.shutdown(wait=wait, cancel_futures=True)
+        self._events.put(None)
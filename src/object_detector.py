@@ -1,9 +1,106 @@
 # src/object_detector.py
-from ultralytics import YOLO
+import os
+import threading
+
 import cv2
+import numpy as np
+
+from src.instrumentation import log_sampled, metrics
+
+# Configurable via env or configure(); the model itself is only loaded on first use.
+MODEL_PATH = os.environ.get("YOLO_MODEL_PATH", "yolov8n.pt")
+DEVICE = os.environ.get("YOLO_DEVICE") or None   # e.g. "cpu", "cuda:0"; None = Ultralytics default
+CONF_THRESHOLD = 0.25   # lowered threshold
+# "auto": ONNX Runtime for .onnx weights, Ultralytics otherwise (see src/detector_backends.py)
+BACKEND = os.environ.get("YOLO_BACKEND", "auto")
+THREADS = int(os.environ.get("YOLO_THREADS", "0"))   # ONNX Runtime intra-op threads; 0 = its default
+
+# --------------------------
+# Lazy, shared YOLO loader (thread-safe; one model per process)
+# --------------------------
+_model = None
+_model_lock = threading.Lock()
+_model_factory = None   # set_model_factory(): stand-in models (benchmarks) instead of Ultralytics YOLO
+
+
+def configure(model_path: str = None, device: str = None, backend: str = None, threads: int = None):
+    """
+    Set the YOLO weights / device / backend ("auto", "ultralytics", "onnx") / ONNX Runtime threads.
+    Drops an already loaded model if any of them changes.
+    """
+    global MODEL_PATH, DEVICE, BACKEND, THREADS, _model, _model_factory
+    with _model_lock:
+        if model_path and model_path != MODEL_PATH:
+            MODEL_PATH = model_path
+            _model = None
+            _model_factory = None
+        if backend and backend != BACKEND:
+            BACKEND = backend
+            _model = None
+        if threads is not None and threads != THREADS:
+            THREADS = threads
+            _model = None
+        if device is not None:
+            DEVICE = device
+
+
+def set_model_factory(factory, model_id: str):
+    """
+    Build detector instances with factory() instead of loading YOLO weights. The instances must
+    follow the Ultralytics call interface (model(frames, device=..., verbose=...) → results with
+    .boxes, plus .names). model_id stands in for the weights path in detector_id() / caches.
+    """
+    global MODEL_PATH, _model, _model_factory
+    with _model_lock:
+        MODEL_PATH = model_id
+        _model = None
+        _model_factory = factory
+
+
+def get_model():
+    global _model
+    if _model is None:
+        with _model_lock:
+            if _model is None:
+                print("🔄 Loading YOLO (lazy):", MODEL_PATH)
+                _model = new_model()
+                print("✅ YOLO Loaded (lazy)")
+    return _model
+
+
+def new_model():
+    """
+    A private YOLO instance (Ultralytics models must not run predict() concurrently,
+    so each detection worker thread gets its own).
+    """
+    if _model_factory is not None:
+        return _model_factory()
+    if BACKEND == "onnx" or (BACKEND == "auto" and MODEL_PATH.lower().endswith(".onnx")):
+        from src.detector_backends import OnnxYolo
+        return OnnxYolo(MODEL_PATH, threads=THREADS)
+    from ultralytics import YOLO
+    return YOLO(MODEL_PATH)
+
 
-MODEL_PATH = "yolov8n.pt"
-model = YOLO(MODEL_PATH)
+def detector_id(calibration=None) -> str:
+    """
+    Identifier of the detection setup (weights + threshold [+ station ROI]) for caches.
+    """
+    base = f"{MODEL_PATH}@{CONF_THRESHOLD}"
+    # boxes of ROI crops are stored in full-frame coordinates, which depend on the ROI
+    return base if calibration is None else f"{base}|roi={calibration.cache_id()}"
+
+
+def ensure_model_loaded():
+    get_model()
+
+
+def warmup(imgsz: int = 640):
+    """
+    Load the model and run one dummy inference so the first real frame doesn't pay
+    for weight loading, device transfer and kernel setup.
+    """
+    get_model()(np.zeros((imgsz, imgsz, 3), dtype=np.uint8), device=DEVICE, verbose=False)
 
 # Expand mapping (multiple COCO labels → your objects)
 CLASS_MAP = {
@@ -16,33 +113,204 @@ CLASS_MAP = {
     "laptop": "case",  # add extra fallbacks
 }
 
-def detect_objects(image_input, threshold: float = 0.25):  # lowered threshold
+# our object names; Detections.cls indexes into this
+LABELS = tuple(sorted(set(CLASS_MAP.values())))
+
+
+class Detections:
+    """
+    One frame's detections as parallel arrays (no per-box Python objects):
+      cls   (N,) int16       index into labels (LABELS unless read from an older store / cache)
+      conf  (N,) float32
+      box   (N, 4) float32   x1, y1, x2, y2 in full-frame pixels (NaN when not stored)
+    Frames from the object tracker add track (N,) int32 ids (-1 = none); propagated frames have
+    tracked=True and the decayed track_conf (N,).
+    Iterating yields the {"object", "confidence", "box"} dicts stored in the memo / cache JSON.
+    """
+    __slots__ = ("cls", "conf", "box", "labels", "track", "track_conf", "tracked")
+
+    def __init__(self, cls=(), conf=(), box=None, labels=LABELS, track=None, track_conf=None,
+                 tracked: bool = False):
+        self.cls = np.asarray(cls, dtype=np.int16).reshape(-1)
+        self.conf = np.asarray(conf, dtype=np.float32).reshape(-1)
+        n = len(self.cls)
+        self.box = np.full((n, 4), np.nan, dtype=np.float32) if box is None \
+            else np.asarray(box, dtype=np.float32).reshape(n, 4)
+        self.labels = labels
+        self.track = None if track is None else np.asarray(track, dtype=np.int32).reshape(-1)
+        self.track_conf = None if track_conf is None else np.asarray(track_conf, dtype=np.float32).reshape(-1)
+        self.tracked = tracked
+
+    def __len__(self) -> int:
+        return len(self.cls)
+
+    def __iter__(self):
+        return iter(self.to_list())
+
+    def __repr__(self) -> str:
+        items = ", ".join(f"{o} {c:.2f}" for o, c in zip(self.objects(), self.conf))
+        return f"Detections({items}{', tracked' if self.tracked else ''})"
+
+    def objects(self) -> list:
+        return [self.labels[c] for c in self.cls]
+
+    def object_set(self) -> frozenset:
+        return frozenset(self.labels[c] for c in np.unique(self.cls))
+
+    def best_conf(self) -> dict:
+        """
+        Highest confidence per detected object.
+        """
+        if not len(self.cls):
+            return {}
+        best = np.zeros(len(self.labels), dtype=np.float32)
+        np.maximum.at(best, self.cls, self.conf)
+        return {self.labels[c]: float(best[c]) for c in np.unique(self.cls)}
+
+    def select(self, mask) -> "Detections":
+        return Detections(self.cls[mask], self.conf[mask], self.box[mask], self.labels,
+                          None if self.track is None else self.track[mask],
+                          None if self.track_conf is None else self.track_conf[mask], self.tracked)
+
+    def to_list(self) -> list:
+        """
+        JSON form: [{"object", "confidence", "box"[, "track", "track_conf", "tracked"]}].
+        """
+        conf = np.round(self.conf.astype(np.float64), 4).tolist()
+        boxes = np.round(self.box.astype(np.float64), 1).tolist()
+        out = []
+        for i, (c, b) in enumerate(zip(self.cls.tolist(), boxes)):
+            d = {"object": self.labels[c], "confidence": conf[i]}
+            if b[0] == b[0]:   # not NaN
+                d["box"] = b
+            if self.track is not None and self.track[i] >= 0:
+                d["track"] = int(self.track[i])
+            if self.tracked:
+                d["track_conf"] = round(float(self.track_conf[i]), 4)
+                d["tracked"] = True
+            out.append(d)
+        return out
+
+    @classmethod
+    def from_list(cls, items, labels=LABELS) -> "Detections":
+        """
+        From the JSON form (memo / cache entries, older results). Unknown object names extend labels.
+        """
+        items = list(items or [])
+        index = {name: i for i, name in enumerate(labels)}
+        for d in items:
+            if d["object"] not in index:
+                index[d["object"]] = len(index)
+        if len(index) > len(labels):
+            labels = tuple(index)
+        track = [d.get("track", -1) for d in items] if any("track" in d for d in items) else None
+        tracked = any(d.get("tracked") for d in items)
+        return cls([index[d["object"]] for d in items], [d["confidence"] for d in items],
+                   [d.get("box") or [np.nan] * 4 for d in items], labels, track,
+                   [d.get("track_conf", d["confidence"]) for d in items] if tracked else None, tracked)
+
+
+def as_detections(detections) -> Detections:
+    """
+    Detections as they are, JSON lists (or None → empty) converted.
+    """
+    if isinstance(detections, Detections):
+        return detections
+    return Detections.from_list(detections)
+
+
+def load_frame(image_input):
     if isinstance(image_input, str):
-        frame = cv2.imread(image_input)
-    else:
-        frame = image_input
-
-    if frame is None:
-        return []
-
-    results = model(frame)
-    detections = []
-
-    for r in results:
-        for box in r.boxes:
-            conf = float(box.conf[0])
-            cls_id = int(box.cls[0])
-            coco_name = model.names[cls_id]
-
-            # Debug print
-            print(f"YOLO saw: {coco_name} ({conf:.2f})")
-
-            # remap to your labels
-            name = CLASS_MAP.get(coco_name, None)
-            if name and conf >= threshold:
-                detections.append({
-                    "object": name,
-                    "confidence": conf
-                })
-
-    return detections
+        return cv2.imread(image_input)
+    return image_input
+
+
+_class_tables = {}
+
+
+def _class_table(names) -> tuple:
+    """
+    (COCO class ids worth detecting, COCO id → index into LABELS or -1) for a model's names.
+    """
+    key = id(names)
+    cached = _class_tables.get(key)
+    if cached is not None and cached[0] is names:
+        return cached[1], cached[2]
+    items = list(names.items() if isinstance(names, dict) else enumerate(names))
+    table = np.full(max((int(i) for i, _ in items), default=-1) + 1, -1, dtype=np.int16)
+    index = {name: i for i, name in enumerate(LABELS)}
+    for i, coco_name in items:
+        if CLASS_MAP.get(coco_name) in index:
+            table[int(i)] = index[CLASS_MAP[coco_name]]
+    wanted = np.flatnonzero(table >= 0).tolist()
+    _class_tables[key] = (names, wanted, table)
+    return wanted, table
+
+
+def _as_numpy(values) -> np.ndarray:
+    # Ultralytics boxes hold torch tensors, other backends numpy arrays
+    return values.cpu().numpy() if hasattr(values, "cpu") else np.asarray(values)
+
+
+def _remap_detections(result, threshold: float, names) -> Detections:
+    """
+    One result's boxes → Detections of our objects (whole-array class lookup + confidence filter).
+    """
+    boxes = result.boxes
+    coco = _as_numpy(boxes.cls).astype(np.int64).reshape(-1)
+    conf = _as_numpy(boxes.conf).astype(np.float32).reshape(-1)
+    xyxy = _as_numpy(boxes.xyxy).astype(np.float32).reshape(-1, 4)
+    _, table = _class_table(names)
+    known = (coco >= 0) & (coco < len(table))
+    cls = np.full(len(coco), -1, dtype=np.int16)
+    cls[known] = table[coco[known]]
+    keep = (cls >= 0) & (conf >= threshold)
+    log_sampled("yolo", "YOLO saw: classes %s conf %s", coco, conf)
+    # x1, y1, x2, y2 (for evidence rendering)
+    return Detections(cls[keep], conf[keep], np.round(xyxy[keep], 1))
+
+
+def _pushdown(model, threshold: float) -> dict:
+    # only our classes above the threshold come back from the model (skips their NMS and transfer)
+    wanted, _ = _class_table(model.names)
+    return {"classes": wanted, "conf": threshold}
+
+
+def detect_objects(image_input, threshold: float = CONF_THRESHOLD, calibration=None) -> Detections:
+    """
+    Detections of one frame; same boxes as detect_objects_batch (calibration included).
+    """
+    return detect_objects_batch([image_input], batch_size=1, threshold=threshold, calibration=calibration)[0]
+
+
+def detect_objects_batch(image_inputs, batch_size: int = 8, threshold: float = CONF_THRESHOLD, model=None,
+                         calibration=None) -> list:
+    """
+    Detect objects on many frames, sending up to `batch_size` frames through YOLO per call.
+    image_inputs: file paths or BGR frames. Returns one Detections per input, in order
+    (empty for frames that could not be read). model: a specific instance (default: shared one).
+    calibration: the inputs are station ROI crops (StationCalibration.apply); YOLO runs at the
+    calibrated size and boxes are mapped back to the pixels of the frame each crop was cut from
+    (crops read from files: source_size).
+    """
+    model = model or get_model()
+    frames = [load_frame(p) for p in image_inputs]
+    out = [Detections() for _ in frames]
+    call_kwargs = _pushdown(model, threshold)
+    if calibration is not None:
+        # crops are already at the calibrated size: don't let YOLO letterbox them up to 640
+        call_kwargs["imgsz"] = -(-calibration.infer_size // 32) * 32
+
+    valid = [i for i, f in enumerate(frames) if f is not None]
+    for start in range(0, len(valid), batch_size):
+        chunk = valid[start:start + batch_size]
+        with metrics.timer("detect", n=len(chunk)):
+            results = model([frames[i] for i in chunk], device=DEVICE, verbose=False, **call_kwargs)
+            for i, r in zip(chunk, results):
+                dets = out[i] = _remap_detections(r, threshold, model.names)
+                if calibration is not None and len(dets):
+                    dets.box = calibration.to_source(dets.box, frames[i].shape,
+                                                     getattr(frames[i], "frame_size", None)).astype(np.float32)
+                metrics.incr("detections", len(dets))
+
+    return out
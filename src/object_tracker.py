@@ -0,0 +1,309 @@
+# src/object_tracker.py
+"""
+Lightweight multi-object tracker that amortizes detection across sampled frames.
+
+    tracker = ObjectTracker(detect_every=4)
+    for key, t, frame in frames:
+        dets = detect_objects(frame) if tracker.wants_detection() else None
+        frame_dets = tracker.step(key, t, dets)     # Detections with track ids (propagated if dets is None)
+    tracker.tracks()                                # per-object trajectories
+    infer_motion_events(tracker.tracks())           # insert / open / close from motion
+
+State is a handful of NumPy arrays (one row per live track): boxes and per-frame velocities
+(constant-velocity alpha-beta filter, the steady-state form of a Kalman filter), class, last
+detection confidence and how many steps ago the track was last matched. Detections are matched
+to the predicted boxes by IoU (vectorized matrix, greedy by best overlap, same class only).
+
+YOLO is needed when `detect_every` sampled frames have passed since the last detection, or when
+a track's confidence (last detection confidence decayed per propagated step) falls below
+`min_confidence`. Propagated boxes keep the track's last detection confidence in conf, so the
+VLLM gate and the step rules see stable values; the decayed value is track_conf.
+"""
+from typing import Optional
+
+import numpy as np
+
+from src.object_detector import LABELS, Detections
+
+
+def iou_matrix(a: np.ndarray, b: np.ndarray) -> np.ndarray:
+    """
+    IoU of every box in a (N, 4) with every box in b (M, 4), boxes as x1, y1, x2, y2.
+    """
+    if not len(a) or not len(b):
+        return np.zeros((len(a), len(b)))
+    x1 = np.maximum(a[:, None, 0], b[None, :, 0])
+    y1 = np.maximum(a[:, None, 1], b[None, :, 1])
+    x2 = np.minimum(a[:, None, 2], b[None, :, 2])
+    y2 = np.minimum(a[:, None, 3], b[None, :, 3])
+    inter = np.clip(x2 - x1, 0, None) * np.clip(y2 - y1, 0, None)
+    area_a = (a[:, 2] - a[:, 0]) * (a[:, 3] - a[:, 1])
+    area_b = (b[:, 2] - b[:, 0]) * (b[:, 3] - b[:, 1])
+    return inter / np.maximum(area_a[:, None] + area_b[None, :] - inter, 1e-9)
+
+
+def center_distance(a: np.ndarray, b: np.ndarray) -> np.ndarray:
+    """
+    Distance between box centers of a (N, 4) and b (M, 4), in units of the larger box diagonal.
+    """
+    if not len(a) or not len(b):
+        return np.zeros((len(a), len(b)))
+    ca = (a[:, :2] + a[:, 2:]) / 2
+    cb = (b[:, :2] + b[:, 2:]) / 2
+    dist = np.linalg.norm(ca[:, None, :] - cb[None, :, :], axis=2)
+    diag_a = np.linalg.norm(a[:, 2:] - a[:, :2], axis=1)
+    diag_b = np.linalg.norm(b[:, 2:] - b[:, :2], axis=1)
+    return dist / np.maximum(np.maximum(diag_a[:, None], diag_b[None, :]), 1e-9)
+
+
+def greedy_match(score: np.ndarray, threshold: float, rows=(), cols=()):
+    """
+    (rows, cols) pairs by descending score, each row / col used once, score >= threshold.
+    rows / cols: pairs matched earlier (kept, and their rows / cols not reused).
+    """
+    rows, cols = list(rows), list(cols)
+    if score.size == 0:
+        return rows, cols
+    order = np.argsort(-score, axis=None)
+    used_r, used_c = set(rows), set(cols)
+    for flat in order:
+        r, c = divmod(int(flat), score.shape[1])
+        if score[r, c] < threshold:
+            break
+        if r in used_r or c in used_c:
+            continue
+        used_r.add(r)
+        used_c.add(c)
+        rows.append(r)
+        cols.append(c)
+    return rows, cols
+
+
+class ObjectTracker:
+    def __init__(self, detect_every: int = 4, min_confidence: float = 0.2, decay: float = 0.9,
+                 iou_threshold: float = 0.3, max_distance: float = 2.0, max_missed: int = 2,
+                 alpha: float = 0.6, beta: float = 0.2):
+        """
+        detect_every: run the detector at least every K sampled frames.
+        decay: track confidence multiplier per propagated frame; below min_confidence → detect.
+        iou_threshold: matches by overlap with the predicted box first; fast movers that no
+        longer overlap are then matched by center distance (< max_distance box diagonals).
+        max_missed: detections in a row a track may be absent from before it is dropped.
+        alpha / beta: filter gains for position / velocity (higher = trust detections more).
+        """
+        self.detect_every = max(1, int(detect_every))
+        self.min_confidence = min_confidence
+        self.decay = decay
+        self.iou_threshold = iou_threshold
+        self.max_distance = max_distance
+        self.max_missed = max_missed
+        self.alpha = alpha
+        self.beta = beta
+
+        self.boxes = np.zeros((0, 4))        # filtered box at last_t
+        self.velocity = np.zeros((0, 4))     # per unit of t (video frames)
+        self.last_t = np.zeros(0)
+        self.conf = np.zeros(0)              # last detection confidence
+        self.steps = np.zeros(0, dtype=np.int64)     # steps since last matched
+        self.missed = np.zeros(0, dtype=np.int64)
+        self.ids = np.zeros(0, dtype=np.int64)
+        self.cls = np.zeros(0, dtype=np.int16)       # index into self.labels per row
+        self.labels = LABELS
+
+        self.since_detection = None          # None: nothing detected yet
+        self._next_id = 1
+        self._paths = {}                     # track id → {"object", "frames", "t", "boxes"} (matched frames)
+
+    # --------------------------
+    # Scheduling
+    # --------------------------
+    def track_confidence(self) -> np.ndarray:
+        return self.conf * self.decay ** self.steps
+
+    def wants_detection(self) -> bool:
+        """
+        Whether the next frame should go through the detector.
+        """
+        if self.since_detection is None or self.since_detection + 1 >= self.detect_every:
+            return True
+        # confidence the tracks would have after one more propagated step
+        return bool(np.any(self.conf * self.decay ** (self.steps + 1) < self.min_confidence))
+
+    def plan(self, known) -> list:
+        """
+        Positions in the next len(known) frames to detect, assuming detections reset the schedule.
+        known[j] = True when frame j already has detections (cache / memo). Low track confidence
+        can still ask for extra detections while stepping (wants_detection).
+        """
+        out = []
+        since = self.since_detection
+        for j, have in enumerate(known):
+            if have or since is None or since + 1 >= self.detect_every:
+                if not have:
+                    out.append(j)
+                since = 0
+            else:
+                since += 1
+        return out
+
+    # --------------------------
+    # Update / propagate
+    # --------------------------
+    def _predict(self, t: float) -> np.ndarray:
+        return self.boxes + self.velocity * (t - self.last_t)[:, None]
+
+    def step(self, key: str, t: float, detections: Optional[Detections] = None) -> Detections:
+        """
+        Advance to frame `key` at time t (video frame index or seconds). detections: detector
+        output for this frame, or None to propagate the tracks. Returns the frame's Detections.
+        """
+        pred = self._predict(t)
+        if detections is None:
+            self.steps += 1
+            if self.since_detection is not None:
+                self.since_detection += 1
+            # tracks the last detection didn't confirm are kept for matching, but not reported
+            live = self.missed == 0
+            return Detections(self.cls[live], self.conf[live], np.round(pred[live], 1), self.labels,
+                              self.ids[live], self.track_confidence()[live], tracked=True)
+
+        self.since_detection = 0
+        if len(detections.labels) > len(self.labels):
+            self.labels = detections.labels   # older entries with extra names extend the label tuple
+        det_boxes = detections.box.astype(np.float64)
+        boxes = np.nan_to_num(det_boxes)
+        iou = iou_matrix(pred, boxes)
+        rows, cols = [], []
+        if iou.size:
+            same = self.cls[:, None] == detections.cls[None, :]
+            rows, cols = greedy_match(np.where(same, iou, 0.0), self.iou_threshold)
+            closeness = np.where(same, -center_distance(pred, boxes), -np.inf)
+            rows, cols = greedy_match(closeness, -self.max_distance, rows, cols)
+
+        track = np.full(len(detections), -1, dtype=np.int32)
+        if rows:
+            r, c = np.array(rows), np.array(cols)
+            dt = np.maximum(t - self.last_t[r], 1e-9)[:, None]
+            residual = det_boxes[c] - pred[r]
+            self.boxes[r] = pred[r] + self.alpha * residual
+            self.velocity[r] = self.velocity[r] + self.beta * residual / dt
+            self.last_t[r] = t
+            self.conf[r] = detections.conf[c]
+            self.steps[r] = 0
+            self.missed[r] = 0
+            track[c] = self.ids[r]
+            for i, j in zip(rows, cols):
+                self._record(int(self.ids[i]), key, t, det_boxes[j])
+
+        # tracks without a detection: missed (dropped after max_missed), kept at their prediction
+        unmatched = np.setdiff1d(np.arange(len(self.ids)), np.array(rows, dtype=np.int64))
+        if len(unmatched):
+            self.boxes[unmatched] = pred[unmatched]
+            self.last_t[unmatched] = t
+            self.missed[unmatched] += 1
+            self.steps[unmatched] += 1
+        keep = self.missed <= self.max_missed
+        if not keep.all():
+            self._select(keep)
+
+        # new tracks for detections nobody claimed (boxless detections can't be tracked)
+        unclaimed = np.ones(len(detections), dtype=bool)
+        unclaimed[cols] = False
+        new = np.flatnonzero(unclaimed & ~np.isnan(det_boxes[:, 0]))
+        if len(new):
+            n = len(new)
+            ids = np.arange(self._next_id, self._next_id + n)
+            self._next_id += n
+            self.boxes = np.vstack([self.boxes, det_boxes[new]])
+            self.velocity = np.vstack([self.velocity, np.zeros((n, 4))])
+            self.last_t = np.concatenate([self.last_t, np.full(n, float(t))])
+            self.conf = np.concatenate([self.conf, detections.conf[new]])
+            self.steps = np.concatenate([self.steps, np.zeros(n, dtype=np.int64)])
+            self.missed = np.concatenate([self.missed, np.zeros(n, dtype=np.int64)])
+            self.ids = np.concatenate([self.ids, ids])
+            self.cls = np.concatenate([self.cls, detections.cls[new]])
+            track[new] = ids
+            for j, tid in zip(new, ids):
+                self._record(int(tid), key, t, det_boxes[j], self.labels[detections.cls[j]])
+        return Detections(detections.cls, detections.conf, detections.box, detections.labels, track)
+
+    def _select(self, mask: np.ndarray):
+        self.boxes, self.velocity = self.boxes[mask], self.velocity[mask]
+        self.last_t, self.conf = self.last_t[mask], self.conf[mask]
+        self.steps, self.missed, self.ids = self.steps[mask], self.missed[mask], self.ids[mask]
+        self.cls = self.cls[mask]
+
+    def _record(self, tid: int, key: str, t: float, box, label: str = None):
+        path = self._paths.get(tid)
+        if path is None:
+            path = self._paths[tid] = {"object": label, "frames": [], "t": [], "boxes": []}
+        path["frames"].append(key)
+        path["t"].append(float(t))
+        path["boxes"].append([round(float(v), 1) for v in box])
+
+    def tracks(self) -> list:
+        """
+        Every track seen so far: {"id", "object", "frames", "t", "boxes"} (frames where it was detected).
+        """
+        return [{"id": tid, **path} for tid, path in sorted(self._paths.items())]
+
+
+# --------------------------
+# Motion events
+# --------------------------
+INSERTABLE = ("left_earbud", "right_earbud")
+CONTAINER = "case"
+
+
+def _centers(boxes: np.ndarray) -> np.ndarray:
+    return np.stack([(boxes[:, 0] + boxes[:, 2]) / 2, (boxes[:, 1] + boxes[:, 3]) / 2], axis=1)
+
+
+def infer_motion_events(tracks: list, min_travel: float = 0.5, area_change: float = 0.25) -> list:
+    """
+    Assembly events read from trajectories:
+      insert  an earbud track ends inside the case box after travelling >= min_travel box widths
+      close   the case box shrinks by more than area_change and stays smaller (lid down)
+      open    the case box grows by more than area_change and stays larger
+    Returns [{"event", "object", "track", "frame", "t"}] sorted by t.
+    """
+    events = []
+    cases = [tr for tr in tracks if tr["object"] == CONTAINER and len(tr["t"]) >= 2]
+
+    for tr in cases:
+        boxes = np.asarray(tr["boxes"], dtype=np.float64)
+        area = (boxes[:, 2] - boxes[:, 0]) * (boxes[:, 3] - boxes[:, 1])
+        ref = area[0]
+        for i in range(1, len(area)):
+            rest = area[i:]
+            if np.all(rest < ref * (1 - area_change)):
+                events.append({"event": "close", "object": CONTAINER, "track": tr["id"],
+                               "frame": tr["frames"][i], "t": tr["t"][i]})
+                break
+            if np.all(rest > ref * (1 + area_change)):
+                events.append({"event": "open", "object": CONTAINER, "track": tr["id"],
+                               "frame": tr["frames"][i], "t": tr["t"][i]})
+                break
+
+    for tr in tracks:
+        if tr["object"] not in INSERTABLE or not tr["t"]:
+            continue
+        boxes = np.asarray(tr["boxes"], dtype=np.float64)
+        centers = _centers(boxes)
+        width = max(float(np.median(boxes[:, 2] - boxes[:, 0])), 1.0)
+        travel = float(np.linalg.norm(centers[-1] - centers[0])) / width
+        if travel < min_travel:
+            continue
+        t_end, (cx, cy) = tr["t"][-1], centers[-1]
+        for case in cases:
+            # case box at (or just before) the earbud's last sighting
+            ct = np.asarray(case["t"])
+            k = int(np.searchsorted(ct, t_end, side="right")) - 1
+            if k < 0:
+                continue
+            x1, y1, x2, y2 = case["boxes"][k]
+            if x1 <= cx <= x2 and y1 <= cy <= y2:
+                events.append({"event": "insert", "object": tr["object"], "track": tr["id"],
+                               "frame": tr["frames"][-1], "t": t_end})
+                break
+    return sorted(events, key=lambda e: e["t"])
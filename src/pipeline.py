@@ -1,57 +1,166 @@
 import os
 import json
-import cv2
-from src.frame_extractor import extract_frames
-from src.vllm_reasoner import run_vllm_verification
+from src.evidence_renderer import EvidenceRenderer
+from src.frame_extractor import DECODE_STRATEGIES, iter_frames, iter_frames_adaptive, save_frame
+from src import object_detector
+from src.alignment import align_runs
+from src.frame_memo import FrameMemo
+from src.frame_store import STORE_DIR, load_result, write_frame_store
+from src.golden_index import load_index
+from src.instrumentation import metrics, set_debug_sampling
+from src.object_tracker import infer_motion_events
+from src.pipelined_executor import run_pipelined_verification
+from src.result_cache import ResultCache, cache_key, hash_file
+from src.station_calibration import load_calibration
+from src.step_rules import compile_rules, load_rule_spec
+from src.vlm_gate import GatePolicy
+from src.vllm_reasoner import reverify_from_memo, run_vllm_verification, vlm_model_id
+
+GOLDEN_STEPS = [
+    "Step 1: Preparation – ensure case, left earbud, right earbud, and cable are present on workstation",
+    "Step 2: Open the charging case fully, verify slots empty",
+    "Step 3: Insert left earbud into left slot, align correctly",
+    "Step 4: Insert right earbud into right slot, align correctly",
+    "Step 5: Close the charging case fully, no gaps",
+    "Step 6: Plug in charging cable, verify LED indicator ON"
+]
+
+
+def _tee_to_disk(frame_stream, out_dir):
+    """
+    Pass streamed frames through unchanged while also writing each one as JPEG (opt-in side output).
+    """
+    for idx, ts, frame in frame_stream:
+        save_frame(frame, out_dir, idx)
+        yield idx, ts, frame
 
 
 def run_pipeline(video_path: str, out_dir: str, golden_steps: list,
-                 every_n_frames: int = 8, use_api: bool = False, api_key: str = None):
+                 every_n_frames: int = 8, use_api: bool = False, api_key: str = None,
+                 save_frames: bool = False, decode_strategy: str = "auto", detect_batch_size: int = 8,
+                 use_cache: bool = True, vlm_gate: GatePolicy = None,
+                 sampler: str = "stride", max_per_second: int = 4,
+                 executor: str = "sequential", detect_workers: int = 1, step_rules: dict = None,
+                 golden_index: str = None, annotate: bool = False, progress=None, calibration=None,
+                 track_every: int = 0):
+    """
+    progress(stage, n): optional callback as frames pass decode / detect / vlm (see VerificationRun),
+    then ("save", 1) once the results are written.
+    calibration: StationCalibration; frames are cropped to the station ROI and downscaled at decode
+    (detections keep full-frame boxes, evidence frames are rendered from the full-resolution video).
+    track_every: K > 0 runs YOLO on every Kth sampled frame and tracks objects in between
+    (src/object_tracker.py); tracks go to tracks.json and motion events into the summary.
+    """
     os.makedirs(out_dir, exist_ok=True)
     out_path = os.path.join(out_dir, "verification_result.json")
+    timing_path = os.path.join(out_dir, "timing_summary.json")
+    metrics.reset()
+
+    # --- Content-addressed stage cache (frames → detections → VLLM answers) ---
+    # Keys chain through the stages, so e.g. new golden steps reuse frames + detections.
+    cache = ResultCache() if use_cache else None
+    memo = FrameMemo() if use_cache else None
+    # optional settings only join the keys when used, so earlier cache entries stay valid
+    roi = {"roi": calibration.cache_id()} if calibration is not None else {}
+    if sampler == "adaptive":
+        frames_key = cache_key(video=hash_file(video_path), sampler=sampler, max_per_second=max_per_second, **roi)
+    else:
+        frames_key = cache_key(video=hash_file(video_path), stride=every_n_frames, **roi)
+    tracking = {"track_every": track_every} if track_every else {}
+    det_key = cache_key(frames=frames_key, detector=object_detector.detector_id(calibration), **tracking)
+    vlm_gate = vlm_gate or GatePolicy()
+    ans_key = cache_key(detections=det_key, vlm=vlm_model_id(use_api), golden_steps=golden_steps,
+                        gate=vlm_gate.to_dict(), step_rules=step_rules)
+    rules = compile_rules(golden_steps, step_rules)
+
+    cached_meta = cache.get("frames", frames_key) if cache else None
+    cached_dets = cache.get("detections", det_key) if cache and cached_meta is not None else None
+    if cached_dets is not None:
+        cached_dets = {key: object_detector.Detections.from_list(dets) for key, dets in cached_dets.items()}
+    cached_answers = cache.get("answers", ans_key) if cache and cached_dets is not None else None
 
-    # --- If cached result exists → load and return ---
-    if os.path.exists(out_path):
-       
-        with open(out_path, "r", encoding="utf-8") as f:
-            return json.load(f)
+    result = None
+    if cached_meta is not None and cached_answers is None and not save_frames and not track_every:
+        # e.g. only the golden steps changed: re-verify from per-frame memoized evidence
+        # (not when tracking: the memo holds untracked detections and no tracks)
+        result = reverify_from_memo(cached_meta, golden_steps, memo, use_api=use_api, gate_policy=vlm_gate,
+                                    rules=rules, calibration=calibration)
+        if result is not None:
+            print("♻️ Re-verified from memoized detections + VLLM answers")
 
-    # --- Otherwise run the pipeline ---
-    print("Extracting frames...")
-    frames, timestamps = extract_frames(video_path, out_dir, every_n_frames)
-    print(f"Extracted {len(frames)} frames to {out_dir}")
+    if result is None:
+        if cached_dets is not None and not use_api and not save_frames:
+            # Simulated VLLM doesn't look at pixels: no need to decode the video at all
+            print("♻️ Reusing cached frames + detections")
+            frame_stream = ((m["index"], m["timestamp"], None) for m in cached_meta.values())
+        else:
+            # Frames are streamed from the decoder straight into detection + VLLM;
+            # JPEGs are only written for evidence frames (or every frame with save_frames=True).
+            print("Streaming frames + running VLLM verification...")
+            if calibration is not None:
+                print(f"📐 Station '{calibration.station}': ROI {list(calibration.roi)} at {calibration.infer_size}px "
+                      f"({calibration.pixel_ratio():.0%} of the pixels per frame)")
+            if sampler == "adaptive":
+                frame_stream = iter_frames_adaptive(video_path, max_per_second=max_per_second,
+                                                    calibration=calibration)
+            else:
+                frame_stream = iter_frames(video_path, every_n_frames, decode_strategy, calibration)
+            if save_frames:
+                frame_stream = _tee_to_disk(frame_stream, out_dir)
+        run_kwargs = dict(use_api=use_api, api_key=api_key, detect_batch_size=detect_batch_size,
+                          known_detections=cached_dets, known_answers=cached_answers,
+                          known_meta=cached_meta, memo=memo, gate_policy=vlm_gate, rules=rules,
+                          progress=progress, calibration=calibration, track_every=track_every)
+        if executor == "pipelined":
+            # decode / detect / VLLM overlap in separate threads with bounded queues
+            result = run_pipelined_verification(frame_stream, golden_steps, detect_workers=detect_workers,
+                                                **run_kwargs)
+        else:
+            result = run_vllm_verification(frame_stream, golden_steps, **run_kwargs)
 
-    print("Running VLLM verification...")
-    result = run_vllm_verification(frames, golden_steps, use_api=use_api, api_key=api_key)
+    if cache:
+        if cached_meta is None:
+            cache.put("frames", frames_key, result["frame_meta"])
+        if cached_dets is None:
+            cache.put("detections", det_key, {key: dets.to_list() for key, dets in result["detections"].items()})
+        if cached_answers is None:
+            cache.put("answers", ans_key, result["answers"])
+
+    frame_meta = result["frame_meta"]
+    frames = list(frame_meta)
+    timestamps = {k: m["timestamp"] for k, m in frame_meta.items()}
+    print(f"Processed {len(frames)} frames from {video_path}")
+    gate_stats = result["vlm_gate"]
+    print(f"🚦 VLLM calls: {gate_stats['vlm_calls']}, saved by detector gate: {gate_stats['vlm_calls_saved']}")
 
     verification = result["verification"]
 
-    # Add timestamps + annotate frames
+    # Add timestamps (dict lookup per step). Annotated evidence frames are rendered lazily by
+    # EvidenceRenderer when the UI / a report asks for them; annotate=True writes them all now.
     for step, info in verification.items():
-        frame_file = info.get("evidence_frame")
-        if frame_file and frame_file in frames:
-            try:
-                frame_idx = frames.index(frame_file)
-                timestamp = timestamps[frame_idx]
-                info["timestamp"] = f"{timestamp} sec"
-
-                img = cv2.imread(frame_file)
-                if img is not None:
-                    cv2.putText(img, f"Step {step}: {info['status']}",
-                                (20, 40), cv2.FONT_HERSHEY_SIMPLEX,
-                                1, (0, 0, 255) if info['status'] != "done" else (0, 255, 0), 2)
-                    annotated_path = os.path.join(out_dir, f"annotated_step{step}.jpg")
-                    cv2.imwrite(annotated_path, img)
-                    info["annotated_frame"] = annotated_path
-            except Exception as e:
-                print(f"⚠️ Could not annotate frame for step {step}: {e}")
+        meta = frame_meta.get(info.get("evidence_frame"))
+        if meta is not None:
+            info["timestamp"] = f"{meta['timestamp']} sec"
+    if annotate:
+        renderer = EvidenceRenderer(video_path, verification, frame_meta, result["detections"], out_dir)
+        for step, path in renderer.render_all().items():
+            if path:
+                verification[step]["annotated_frame"] = path
 
     # --- Compare with golden reference ---
     golden_path = "out_golden/verification_result.json"
-    if os.path.exists(golden_path):
+    alignment = None
+    if golden_index:
+        # precomputed reference (src/golden_index.py): no golden JSON to parse
+        index = load_index(golden_index)
+        print(f"🔗 Comparing with golden index '{index.meta['procedure']}'...")
+        verification, alignment = index.compare(
+            verification, {"video": video_path, "frames": frames, "timestamps": timestamps,
+                           "vllm_texts": result["answers"], "detections": result["detections"]})
+        print(f"🧭 Aligned with golden run: {len(alignment['divergences'])} divergence(s)")
+    elif os.path.exists(golden_path):
         print("🔗 Comparing with golden reference...")
-        with open(golden_path, "r", encoding="utf-8") as f:
-            golden = json.load(f)
+        golden = load_result(golden_path)
 
         compared = {}
         for step, g_info in golden["verification"].items():
@@ -61,22 +170,56 @@ def run_pipeline(video_path: str, out_dir: str, golden_steps: list,
                 "status": t_info.get("status", "missing"),
                 "note": t_info.get("note"),
                 "timestamp": t_info.get("timestamp"),
+                "evidence_frame": t_info.get("evidence_frame"),
                 "annotated_frame": t_info.get("annotated_frame"),
                 "golden_frame": g_info.get("evidence_frame")
             }
         verification = compared
 
-    # --- Save result JSON ---
-    out_json = {
+        # where in time the test run diverges (needs the golden run's per-frame data)
+        if "vllm_texts" in golden and os.path.abspath(golden.get("video", "")) != os.path.abspath(video_path):
+            alignment = align_runs(golden, {"video": video_path, "frames": frames, "timestamps": timestamps,
+                                            "vllm_texts": result["answers"], "detections": result["detections"]},
+                                   golden_steps, rules=rules)
+            print(f"🧭 Aligned with golden run: {len(alignment['divergences'])} divergence(s)")
+
+    # --- Save results: small summary JSON + columnar per-frame store (src/frame_store.py) ---
+    summary = {
         "video": video_path,
-        "frames": frames,
+        "n_frames": len(frames),
         "verification": verification,
-        "vllm_texts": result["answers"]
+        "vlm_gate": gate_stats,
+        "frame_store": STORE_DIR,
     }
+    if alignment is not None:
+        summary["alignment"] = alignment
+    if result.get("tracks") is not None:
+        # insert / open / close read from object trajectories (t = video frame index)
+        motion = infer_motion_events(result["tracks"])
+        for ev in motion:
+            meta = frame_meta.get(ev["frame"])
+            ev["timestamp"] = meta["timestamp"] if meta else None
+        summary["motion_events"] = motion
+        summary["tracks"] = "tracks.json"
+        with open(os.path.join(out_dir, "tracks.json"), "w", encoding="utf-8") as f:
+            json.dump(result["tracks"], f)
+        print(f"🛰️ {len(result['tracks'])} object tracks, motion events: "
+              f"{', '.join(e['event'] + ' ' + e['object'] for e in motion) or 'none'}")
+    write_frame_store(os.path.join(out_dir, STORE_DIR), frame_meta, result["detections"], result["answers"])
     with open(out_path, "w", encoding="utf-8") as f:
-        json.dump(out_json, f, indent=2)
+        json.dump(summary, f, indent=2, ensure_ascii=False)
+
+    print(f"✅ Saved verification result to {out_path} (per-frame data in {STORE_DIR}/)")
+    if progress:
+        progress("save", 1)
+
+    # callers get the per-frame fields in memory, as load_result() would rebuild them
+    out_json = dict(summary, frames=frames, timestamps=timestamps, vllm_texts=result["answers"],
+                    detections=result["detections"])
 
-    print(f"✅ Saved verification result to {out_path}")
+    timing = metrics.write_json(timing_path)
+    stage_line = ", ".join(f"{k} {v['total_s']:.2f}s" for k, v in timing["stages"].items())
+    print(f"⏱️ {timing['wall_s']:.2f}s total ({stage_line}) → {timing_path}")
     return out_json
 
 
@@ -87,35 +230,64 @@ if __name__ == "__main__":
     parser.add_argument("--outdir", default="out_frames")
     parser.add_argument("--stride", type=int, default=8)
     parser.add_argument("--use_api", action="store_true")
+    parser.add_argument("--annotate", action="store_true",
+                        help="write annotated_step{N}.jpg evidence images now (default: rendered on demand)")
+    parser.add_argument("--save_frames", action="store_true",
+                        help="also write every sampled frame as JPEG into --outdir")
+    parser.add_argument("--decode", choices=DECODE_STRATEGIES, default="auto",
+                        help="frame decode strategy (auto picks from stride and GOP size)")
+    parser.add_argument("--sampler", choices=["stride", "adaptive"], default="stride",
+                        help="fixed --stride, or motion-adaptive sampling around activity peaks")
+    parser.add_argument("--max_fps", type=int, default=4, help="adaptive sampler: max frames kept per second")
+    parser.add_argument("--executor", choices=["sequential", "pipelined"], default="sequential",
+                        help="pipelined overlaps decode, detection and VLLM in separate threads")
+    parser.add_argument("--detect_workers", type=int, default=1, help="pipelined: detection threads")
+    parser.add_argument("--batch", type=int, default=8, help="frames per YOLO call")
+    parser.add_argument("--model", default=None, help="YOLO weights (default: $YOLO_MODEL_PATH or yolov8n.pt)")
+    parser.add_argument("--device", default=None, help="YOLO device, e.g. cpu or cuda:0")
+    parser.add_argument("--threads", type=int, default=None,
+                        help="ONNX Runtime intra-op threads for .onnx weights (default: $YOLO_THREADS or all cores)")
+    parser.add_argument("--warmup", action="store_true", help="load + warm up YOLO before streaming frames")
+    parser.add_argument("--no_gate", action="store_true", help="send every sampled frame to the VLLM")
+    parser.add_argument("--gate_max_gap", type=int, default=GatePolicy.max_gap,
+                        help="max consecutive frames the detector gate may skip")
+    parser.add_argument("--gate_conf", type=float, default=GatePolicy.conf_threshold,
+                        help="confidence threshold whose crossing triggers a VLLM call")
+    parser.add_argument("--procedure", default=None,
+                        help="compare against this golden index (python -m src.golden_index build) "
+                             "and use its golden steps / rules")
+    parser.add_argument("--rules", default=None,
+                        help="JSON step-rule overrides: ordering, time windows... (see src/step_rules.py)")
+    parser.add_argument("--track_every", type=int, default=0,
+                        help="run YOLO on every Kth sampled frame and track objects in between (0 = off)")
+    parser.add_argument("--station", default=None,
+                        help="crop frames to this station's calibrated ROI (python -m src.station_calibration)")
+    parser.add_argument("--no_cache", action="store_true", help="ignore and don't fill the result cache")
+    parser.add_argument("--debug_sample", type=int, default=0,
+                        help="log every Nth detection/VLLM event at DEBUG level (0 = off)")
     args = parser.parse_args()
 
-    golden_steps = [
-        "Step 1: Preparation – ensure case, left earbud, right earbud, and cable are present on workstation",
-        "Step 2: Open the charging case fully, verify slots empty",
-        "Step 3: Insert left earbud into left slot, align correctly",
-        "Step 4: Insert right earbud into right slot, align correctly",
-        "Step 5: Close the charging case fully, no gaps",
-        "Step 6: Plug in charging cable, verify LED indicator ON"
-    ]
+    if args.debug_sample:
+        import logging
+        logging.basicConfig(level=logging.DEBUG, format="%(message)s")
+        set_debug_sampling(args.debug_sample)
 
-    run_pipeline(args.video, args.outdir, golden_steps, args.stride, use_api=args.use_api, api_key=None)
-
-if __name__ == "__main__":
-    import argparse
-    parser = argparse.ArgumentParser()
-    parser.add_argument("--video", required=True)
-    parser.add_argument("--outdir", default="out_frames")
-    parser.add_argument("--stride", type=int, default=8)
-    parser.add_argument("--use_api", action="store_true")
-    args = parser.parse_args()
+    object_detector.configure(model_path=args.model, device=args.device, threads=args.threads)
+    if args.warmup:
+        object_detector.warmup()
 
-    golden_steps = [
-        "Step 1: Preparation – ensure case, left earbud, right earbud, and cable are present on workstation",
-        "Step 2: Open the charging case fully, verify slots empty",
-        "Step 3: Insert left earbud into left slot, align correctly",
-        "Step 4: Insert right earbud into right slot, align correctly",
-        "Step 5: Close the charging case fully, no gaps",
-        "Step 6: Plug in charging cable, verify LED indicator ON"
-    ]
+    golden_steps, step_rules = GOLDEN_STEPS, load_rule_spec(args.rules) if args.rules else None
+    if args.procedure:
+        index = load_index(args.procedure)
+        golden_steps, step_rules = index.golden_steps, step_rules or index.meta.get("step_rules")
+    calibration = load_calibration(args.station) if args.station else None
 
-    run_pipeline(args.video, args.outdir, golden_steps, args.stride, use_api=args.use_api, api_key=None)
+    run_pipeline(args.video, args.outdir, golden_steps, args.stride, use_api=args.use_api, api_key=None,
+                 save_frames=args.save_frames, decode_strategy=args.decode,
+                 detect_batch_size=args.batch, use_cache=not args.no_cache,
+                 vlm_gate=GatePolicy(enabled=not args.no_gate, conf_threshold=args.gate_conf,
+                                     max_gap=args.gate_max_gap),
+                 sampler=args.sampler, max_per_second=args.max_fps,
+                 executor=args.executor, detect_workers=args.detect_workers,
+                 step_rules=step_rules, golden_index=args.procedure, annotate=args.annotate,
+                 calibration=calibration, track_every=args.track_every)
@@ -0,0 +1,103 @@
+# src/pipelined_executor.py
+"""
+Pipelined executor: overlaps frame decoding, YOLO detection and VLLM reasoning.
+
+    decode thread ──batches──▶ detection pool (N workers) ──futures, in order──▶ VLLM stage (caller thread)
+
+Both hand-offs are bounded queues, so a slow stage back-pressures the ones before it
+(at most `queue_size` batches waiting per hop). The VLLM stage consumes batches in frame
+order, so answers, gate decisions and the verification match run_vllm_verification.
+"""
+import queue
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
+
+from src import object_detector
+from src.vllm_reasoner import VerificationRun, _iter_batches
+
+_DONE = object()
+
+
+def run_pipelined_verification(frames, golden_steps, detect_workers: int = 1, queue_size: int = 4, **kwargs):
+    """
+    Same inputs/outputs as run_vllm_verification (extra kwargs are passed through to it).
+    detect_workers > 1 gives every detection thread its own YOLO instance.
+    """
+    run = VerificationRun(golden_steps, **kwargs)
+    if run.tracker is not None and detect_workers > 1:
+        # the tracker needs batches in frame order
+        print("ℹ️ Object tracking on: using one detection worker")
+        detect_workers = 1
+    decoded = queue.Queue(maxsize=queue_size)
+    detected = queue.Queue(maxsize=queue_size)
+    stop = threading.Event()
+
+    def put(q, item) -> bool:
+        # blocking put that gives up once the run is aborted
+        while not stop.is_set():
+            try:
+                q.put(item, timeout=0.1)
+                return True
+            except queue.Full:
+                continue
+        return False
+
+    def decode():
+        try:
+            start = 0
+            for batch in _iter_batches(frames, run.detect_batch_size):
+                prepared = run.prepare(batch, start)
+                start += len(batch)
+                if not put(decoded, prepared):
+                    return
+            put(decoded, _DONE)
+        except BaseException as e:
+            put(decoded, e)
+
+    worker = threading.local()
+
+    def detect(prepared):
+        keys, images, hashes, metas = prepared
+        detect_fn = None
+        if detect_workers > 1:
+            if not hasattr(worker, "model"):
+                worker.model = object_detector.new_model()
+            detect_fn = partial(object_detector.detect_objects_batch, model=worker.model)
+        return prepared, run.detect(keys, images, hashes, detect_fn=detect_fn)
+
+    pool = ThreadPoolExecutor(max_workers=detect_workers, thread_name_prefix="detect")
+
+    def dispatch():
+        while not stop.is_set():
+            try:
+                item = decoded.get(timeout=0.1)
+            except queue.Empty:
+                continue
+            if item is _DONE or isinstance(item, BaseException):
+                put(detected, item)
+                return
+            if not put(detected, pool.submit(detect, item)):
+                return
+
+    threads = [threading.Thread(target=decode, name="decode", daemon=True),
+               threading.Thread(target=dispatch, name="dispatch", daemon=True)]
+    for t in threads:
+        t.start()
+
+    try:
+        while True:
+            item = detected.get()
+            if item is _DONE:
+                break
+            if isinstance(item, BaseException):
+                raise item
+            prepared, batch_detections = item.result()
+            run.answer(*prepared, batch_detections)
+    finally:
+        stop.set()
+        pool.shutdown(wait=True, cancel_futures=True)
+        for t in threads:
+            t.join(timeout=5)
+
+    return run.finish()
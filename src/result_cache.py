@@ -0,0 +1,147 @@
+# src/result_cache.py
+"""
+Content-addressed, size-bounded cache for pipeline stage outputs.
+
+Entries live in <root>/<stage>/<key>.json, where the key hashes everything the stage
+output depends on (video content hash, stride, model IDs, thresholds, golden steps...).
+Stages chain their keys, so a changed golden step list only misses the stages that
+depend on it and reuses the cached frames and detections.
+Eviction is LRU by file mtime (bumped on every hit) once the cache exceeds max_bytes.
+The total size is tracked per process (one directory scan per root, then updated on every
+put), so a put only scans the cache when the tracked size passes max_bytes; that scan also
+picks up what other processes wrote in the meantime.
+"""
+import hashlib
+import json
+import os
+import threading
+from typing import Optional
+
+CACHE_DIR = os.environ.get("PIPELINE_CACHE_DIR", os.path.join(".cache", "pipeline"))
+MAX_CACHE_BYTES = int(os.environ.get("PIPELINE_CACHE_MAX_MB", "512")) * 1024 * 1024
+
+_hash_memo = {}
+_hash_lock = threading.Lock()
+
+_sizes = {}              # cache root → tracked total bytes of its entries
+_size_lock = threading.Lock()
+
+
+def hash_file(path: str, chunk_size: int = 1 << 20) -> str:
+    """
+    SHA-256 of a file's content. Memoized per (path, size, mtime) within the process.
+    """
+    st = os.stat(path)
+    memo_key = (os.path.abspath(path), st.st_size, st.st_mtime_ns)
+    with _hash_lock:
+        if memo_key in _hash_memo:
+            return _hash_memo[memo_key]
+
+    h = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(chunk_size), b""):
+            h.update(block)
+    digest = h.hexdigest()
+
+    with _hash_lock:
+        _hash_memo[memo_key] = digest
+    return digest
+
+
+def cache_key(**parts) -> str:
+    """
+    Stable key for a stage: hash of its (JSON-serialisable) inputs.
+    """
+    blob = json.dumps(parts, sort_keys=True, ensure_ascii=False, default=str)
+    return hashlib.sha256(blob.encode("utf-8")).hexdigest()[:32]
+
+
+class ResultCache:
+    def __init__(self, root: str = CACHE_DIR, max_bytes: int = MAX_CACHE_BYTES):
+        self.root = root
+        self.max_bytes = max_bytes
+        self._size_key = os.path.abspath(root)
+
+    def _path(self, stage: str, key: str) -> str:
+        return os.path.join(self.root, stage, f"{key}.json")
+
+    def get(self, stage: str, key: str) -> Optional[dict]:
+        path = self._path(stage, key)
+        try:
+            with open(path, "r", encoding="utf-8") as f:
+                value = json.load(f)
+        except (OSError, ValueError):
+            return None
+        try:
+            os.utime(path)   # mark as recently used
+        except OSError:
+            pass
+        return value
+
+    def put(self, stage: str, key: str, value) -> None:
+        path = self._path(stage, key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump(value, f, separators=(",", ":"))
+        try:
+            replaced = os.path.getsize(path)
+        except OSError:
+            replaced = 0
+        size = os.path.getsize(tmp)
+        os.replace(tmp, path)   # atomic: readers never see a half-written entry
+        if self._track(size - replaced) > self.max_bytes:
+            self.evict()
+
+    def _track(self, delta: int) -> int:
+        # tracked total after adding delta (the first call per root scans the directory)
+        with _size_lock:
+            total = _sizes.get(self._size_key)
+            if total is None:
+                total = sum(size for _, size, _ in self._entries()) - delta   # the scan already sees the new entry
+            total = _sizes[self._size_key] = max(0, total + delta)
+        return total
+
+    def size_bytes(self) -> int:
+        return sum(size for _, size, _ in self._entries())
+
+    def _entries(self):
+        for dirpath, _, filenames in os.walk(self.root):
+            for name in filenames:
+                if not name.endswith(".json"):
+                    continue
+                path = os.path.join(dirpath, name)
+                try:
+                    st = os.stat(path)
+                except OSError:
+                    continue
+                yield path, st.st_size, st.st_mtime
+
+    def evict(self) -> int:
+        """
+        Drop least recently used entries until the cache fits in max_bytes. Returns entries removed.
+        """
+        entries = list(self._entries())
+        total = sum(size for _, size, _ in entries)
+        removed = 0
+        for path, size, _ in sorted(entries, key=lambda e: e[2]):
+            if total <= self.max_bytes:
+                break
+            try:
+                os.remove(path)
+            except OSError:
+                continue
+            total -= size
+            removed += 1
+        with _size_lock:
+            _sizes[self._size_key] = total
+        return removed
+
+    def clear(self) -> None:
+        for path, _, _ in list(self._entries()):
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+        with _size_lock:
+            _sizes.pop(self._size_key, None)
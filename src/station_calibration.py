@@ -0,0 +1,201 @@
+# src/station_calibration.py
+"""
+Per-station calibration: the workstation region (ROI) of a station camera and the size the
+detector / VLLM should see it at.
+
+    python -m src.station_calibration --station line1 --video data/golden.mp4            # ROI from motion
+    python -m src.station_calibration --station line1 --video data/golden.mp4 --roi 420 180 1500 980
+    python src/pipeline.py --video data/test.mp4 --station line1
+
+Stored as <STATION_DIR>/<station>.json:
+  {"station": "line1", "source_size": [1920, 1080], "roi": [420, 180, 1500, 980], "infer_size": 640}
+
+Sampled frames are cropped to the ROI and downscaled (long side → infer_size) right after decode,
+so detection, the VLLM, hashing and the frame memo only touch the workstation pixels. Each crop
+(RoiCrop) remembers the size of the frame it was cut from, so detection boxes are mapped back to
+that frame's pixels whatever the video resolution; evidence frames are re-decoded at full
+resolution when rendered (EvidenceRenderer), so only they keep every pixel.
+"""
+import json
+import os
+from dataclasses import asdict, dataclass
+from typing import Tuple
+
+import cv2
+import numpy as np
+
+STATION_DIR = os.environ.get("STATION_DIR", "stations")
+
+
+class RoiCrop(np.ndarray):
+    """
+    An apply()-ed frame: a plain BGR array plus frame_size, the (width, height) of the decoded
+    frame it was cut from (kept by views and slices; cv2 results are plain arrays again).
+    """
+
+    def __array_finalize__(self, obj):
+        self.frame_size = getattr(obj, "frame_size", None)
+
+
+@dataclass
+class StationCalibration:
+    station: str
+    source_size: Tuple[int, int]          # (width, height) of the frames the ROI was drawn on
+    roi: Tuple[int, int, int, int]        # x1, y1, x2, y2 in source_size pixels
+    infer_size: int = 640                 # long side of the cropped image (never upscaled)
+
+    def roi_for(self, width: int, height: int) -> Tuple[int, int, int, int]:
+        """
+        ROI in pixels of a frame of the given size (the ROI scales with the capture resolution).
+        """
+        sx, sy = width / self.source_size[0], height / self.source_size[1]
+        x1, y1, x2, y2 = self.roi
+        x1, y1 = max(0, int(round(x1 * sx))), max(0, int(round(y1 * sy)))
+        x2, y2 = min(width, int(round(x2 * sx))), min(height, int(round(y2 * sy)))
+        return x1, y1, max(x2, x1 + 1), max(y2, y1 + 1)
+
+    def apply(self, frame: np.ndarray) -> np.ndarray:
+        """
+        Crop a decoded frame to the ROI and downscale it to infer_size (INTER_AREA).
+        """
+        h, w = frame.shape[:2]
+        x1, y1, x2, y2 = self.roi_for(w, h)
+        crop = frame[y1:y2, x1:x2]
+        scale = self.infer_size / max(x2 - x1, y2 - y1)
+        if scale >= 1.0:
+            crop = np.ascontiguousarray(crop)
+        else:
+            size = (max(1, int(round((x2 - x1) * scale))), max(1, int(round((y2 - y1) * scale))))
+            crop = cv2.resize(crop, size, interpolation=cv2.INTER_AREA)
+        crop = crop.view(RoiCrop)
+        crop.frame_size = (w, h)
+        return crop
+
+    def to_source(self, boxes, image_shape, frame_size=None) -> np.ndarray:
+        """
+        Boxes (..., 4) x1, y1, x2, y2 on an apply()-ed image of image_shape → pixels of the decoded
+        frame of frame_size (width, height) it was cut from (default: source_size).
+        """
+        x1, y1, x2, y2 = self.roi_for(*(frame_size or self.source_size))
+        sx = (x2 - x1) / image_shape[1]
+        sy = (y2 - y1) / image_shape[0]
+        scale = np.array([sx, sy, sx, sy])
+        offset = np.array([x1, y1, x1, y1])
+        return np.round(offset + np.asarray(boxes, dtype=np.float64) * scale, 1)
+
+    def capture_size(self) -> Tuple[int, int]:
+        """
+        Smallest capture resolution (same aspect as source_size) at which the ROI still has
+        infer_size pixels on its long side. Live cameras can be asked for it directly.
+        """
+        x1, y1, x2, y2 = self.roi
+        scale = min(1.0, self.infer_size / max(x2 - x1, y2 - y1))
+        return int(round(self.source_size[0] * scale)), int(round(self.source_size[1] * scale))
+
+    def pixel_ratio(self) -> float:
+        """
+        Pixels per frame after apply() relative to the full source frame.
+        """
+        x1, y1, x2, y2 = self.roi
+        scale = min(1.0, self.infer_size / max(x2 - x1, y2 - y1))
+        return (x2 - x1) * (y2 - y1) * scale * scale / (self.source_size[0] * self.source_size[1])
+
+    def cache_id(self) -> str:
+        # part of result cache keys: other ROI / size → other frames
+        return f"{self.station}:{list(self.source_size)}:{list(self.roi)}@{self.infer_size}"
+
+    def to_dict(self) -> dict:
+        return asdict(self)
+
+    @classmethod
+    def from_dict(cls, data: dict):
+        return cls(station=data["station"], source_size=tuple(data["source_size"]), roi=tuple(data["roi"]),
+                   infer_size=int(data.get("infer_size", 640)))
+
+
+def calibration_path(station: str, root: str = STATION_DIR) -> str:
+    return os.path.join(root, f"{station}.json")
+
+
+def load_calibration(station_or_path: str, root: str = STATION_DIR) -> StationCalibration:
+    """
+    Calibration by station name (under root) or JSON file path.
+    """
+    path = station_or_path if station_or_path.endswith(".json") else calibration_path(station_or_path, root)
+    if not os.path.exists(path):
+        raise FileNotFoundError(f"no station calibration at {path} (create it with python -m src.station_calibration)")
+    with open(path, "r", encoding="utf-8") as f:
+        return StationCalibration.from_dict(json.load(f))
+
+
+def save_calibration(calibration: StationCalibration, root: str = STATION_DIR) -> str:
+    os.makedirs(root, exist_ok=True)
+    path = calibration_path(calibration.station, root)
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump(calibration.to_dict(), f, indent=2)
+    return path
+
+
+def roi_from_motion(video_path: str, every_n_frames: int = 15, thumb_width: int = 320,
+                    threshold: float = 12.0, margin: float = 0.15):
+    """
+    Suggest an ROI from where things move in a recording of the station (e.g. the golden video):
+    bounding box of pixels whose frame-to-frame change exceeds threshold, plus a margin.
+    Returns ((width, height), (x1, y1, x2, y2)).
+    """
+    from src.frame_extractor import iter_frames
+    activity, prev, size = None, None, None
+    for _, _, frame in iter_frames(video_path, every_n_frames):
+        h, w = frame.shape[:2]
+        size = (w, h)
+        scale = thumb_width / w
+        gray = cv2.cvtColor(cv2.resize(frame, (thumb_width, max(1, int(h * scale))), interpolation=cv2.INTER_AREA),
+                            cv2.COLOR_BGR2GRAY).astype(np.int16)
+        if prev is not None:
+            moved = np.abs(gray - prev) > threshold
+            activity = moved if activity is None else activity | moved
+        prev = gray
+    if size is None:
+        raise RuntimeError(f"Cannot read frames from {video_path}")
+    w, h = size
+    if activity is None or not activity.any():
+        return size, (0, 0, w, h)
+    ys, xs = np.nonzero(activity)
+    scale = w / thumb_width
+    x1, x2 = xs.min() * scale, (xs.max() + 1) * scale
+    y1, y2 = ys.min() * scale, (ys.max() + 1) * scale
+    mx, my = (x2 - x1) * margin, (y2 - y1) * margin
+    return size, (max(0, int(x1 - mx)), max(0, int(y1 - my)), min(w, int(x2 + mx)), min(h, int(y2 + my)))
+
+
+if __name__ == "__main__":
+    import argparse
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--station", required=True)
+    parser.add_argument("--video", required=True, help="a recording of the station camera")
+    parser.add_argument("--roi", type=int, nargs=4, metavar=("X1", "Y1", "X2", "Y2"), default=None,
+                        help="workstation region in video pixels (default: from motion in --video)")
+    parser.add_argument("--select", action="store_true", help="draw the ROI on the first frame (needs a display)")
+    parser.add_argument("--size", type=int, default=640, help="long side of the image the detector sees")
+    args = parser.parse_args()
+
+    if args.roi or args.select:
+        from src.frame_extractor import read_frame_at
+        first = read_frame_at(args.video, 0)
+        if first is None:
+            raise SystemExit(f"Cannot read {args.video}")
+        size = (first.shape[1], first.shape[0])
+        if args.select:
+            x, y, w, h = cv2.selectROI("station ROI", first, showCrosshair=False)
+            cv2.destroyAllWindows()
+            roi = (x, y, x + w, y + h)
+        else:
+            roi = tuple(args.roi)
+    else:
+        size, roi = roi_from_motion(args.video)
+
+    calibration = StationCalibration(args.station, size, roi, args.size)
+    path = save_calibration(calibration)
+    print(f"📐 Station '{args.station}': ROI {list(roi)} of {size[0]}x{size[1]}, detector input "
+          f"{calibration.apply(np.zeros((size[1], size[0], 3), np.uint8)).shape[1::-1]} "
+          f"({calibration.pixel_ratio():.0%} of the pixels) → {path}")
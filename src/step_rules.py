@@ -0,0 +1,259 @@
+# src/step_rules.py
+"""
+Declarative, order-aware step verification.
+
+Rules are compiled once from the golden steps, then evaluated incrementally per frame:
+
+    engine = RuleEngine(compile_rules(golden_steps))
+    for key, text in answers:                      # frames in order
+        events = engine.update(key, text, detections[key], ts)
+    engine.result()                                # {"1": {"expected", "status", "evidence_frame", "note"}, ...}
+
+A frame is reduced once to a feature set (detected object classes + stemmed words of the
+VLLM answer's note + the step number the answer names); each pending rule then checks small
+set inclusions, so a frame costs O(rules) whatever the answer length. Answers arrive typed
+(vlm_answer.VlmAnswer) or as raw text, which is parsed the same way.
+
+Rule fields (all optional; a JSON spec can override any of them per step key):
+  objects             object classes that must be detected in the frame
+  text                words that must appear in the VLLM answer (stemmed: "opened" ~ "open")
+  cumulative_objects  classes that must each have been seen in some frame so far (inventory checks)
+  inventory           an inventory step: checked cumulatively, never ordered, no evidence frame
+  after               steps that must be completed first; earlier evidence → "out_of_order"
+                      (upgraded to "done" if the step is seen again in order)
+  max_gap_s           evidence later than this after the last `after` step → "uncertain"
+  hold_frames         consecutive matching frames needed (debounces single-frame flickers)
+
+Without a spec, compile_rules infers rules from the step wording (objects named, action verb)
+and orders every action step after the previous one; inventory steps ("Preparation",
+"present") are unordered and, if they name no objects, expect every detector class.
+"""
+import json
+import re
+from dataclasses import dataclass
+from typing import Dict, FrozenSet, List, Optional, Tuple
+
+from src.object_detector import LABELS, as_detections
+from src.vlm_answer import STATUSES, VlmAnswer, parse_answer  # noqa: F401  (STATUSES re-exported)
+
+# phrases naming detector classes (longest first, so "left earbud" isn't read as "earbud")
+OBJECT_PHRASES = {
+    "left earbud": "left_earbud",
+    "right earbud": "right_earbud",
+    "case": "case",
+    "cable": "cable",
+}
+INVENTORY_WORDS = ("preparation", "present")
+# action verb → which evidence proves it: objects in view, or the VLLM describing it
+ACTION_EVIDENCE = {
+    "open": "objects+verb",     # case visible and the answer says it's open
+    "close": "text",            # a closed case hides its content: trust the answer text
+    "insert": "objects",
+    "plug": "objects",
+}
+
+_WORD = re.compile(r"[a-z]+")
+
+
+def stem(word: str) -> str:
+    """
+    Crude suffix stripper, applied to rule words and answer words alike.
+    """
+    for suffix in ("ing", "ed", "es", "s", "e"):
+        if word.endswith(suffix) and len(word) - len(suffix) >= 3:
+            word = word[:-len(suffix)]
+            break
+    if len(word) > 3 and word[-1] == word[-2] and word[-1] not in "aeiou":
+        word = word[:-1]   # plugged → plugg → plug
+    return word
+
+
+def frame_features(answer, detections=None) -> Tuple[FrozenSet[str], FrozenSet[str], Optional[str]]:
+    """
+    (object classes, answer word stems, step number named by the answer) — computed once per frame.
+    answer: VlmAnswer or raw answer text. Words come from the note (all of a free-text answer); a
+    "missing" / "uncertain" answer names no step.
+    """
+    if not isinstance(answer, VlmAnswer):
+        answer = parse_answer(answer or "")
+    objs = as_detections(detections).object_set()
+    words = frozenset(stem(w) for w in _WORD.findall(answer.note.lower()))
+    return objs, words, answer.named_step()
+
+
+@dataclass
+class StepRule:
+    step: str
+    expected: str
+    objects: FrozenSet[str] = frozenset()
+    text: FrozenSet[str] = frozenset()
+    cumulative_objects: FrozenSet[str] = frozenset()
+    after: Tuple[str, ...] = ()
+    max_gap_s: Optional[float] = None
+    hold_frames: int = 1
+    note: Optional[str] = None    # fixed note; None → the VLLM answer
+    inventory: bool = False
+
+    def matches(self, objs, words, named_step, seen_objects) -> bool:
+        if not (self.objects or self.text or self.cumulative_objects):
+            # nothing recognisable in the wording: rely on the VLLM naming the step
+            return named_step == self.step
+        return (self.objects <= objs and self.text <= words
+                and self.cumulative_objects <= seen_objects)
+
+
+def _mentioned_objects(low: str) -> List[str]:
+    found = []
+    for phrase in sorted(OBJECT_PHRASES, key=len, reverse=True):
+        if phrase in low:
+            found.append(OBJECT_PHRASES[phrase])
+            low = low.replace(phrase, " ")
+    return sorted(found)
+
+
+def infer_rule(step_key: str, step_text: str) -> StepRule:
+    """
+    Rule from the wording of one golden step (see OBJECT_PHRASES / ACTION_EVIDENCE).
+    """
+    low = step_text.lower()
+    objects = _mentioned_objects(low)
+    words = {stem(w) for w in _WORD.findall(low)}
+
+    if any(w in low for w in INVENTORY_WORDS):
+        # "place all items on table": no object named → every class the detector knows
+        return StepRule(step_key, step_text, cumulative_objects=frozenset(objects or LABELS),
+                        note="All required objects present", inventory=True)
+    for verb, evidence in ACTION_EVIDENCE.items():
+        if stem(verb) not in words:
+            continue
+        if evidence == "text":
+            return StepRule(step_key, step_text, text=frozenset([stem(verb)] + [stem(o) for o in objects]))
+        if evidence == "objects+verb":
+            return StepRule(step_key, step_text, objects=frozenset(objects), text=frozenset([stem(verb)]))
+        return StepRule(step_key, step_text, objects=frozenset(objects),
+                        note=f"{verb.capitalize()} observed: {', '.join(objects)}")
+    return StepRule(step_key, step_text, objects=frozenset(objects))
+
+
+def compile_rules(golden_steps: List[str], spec: Optional[Dict[str, dict]] = None) -> List[StepRule]:
+    """
+    One rule per golden step (keys "1".."N"). spec: optional per-step overrides,
+    e.g. {"3": {"objects": ["left_earbud"], "after": ["2"], "max_gap_s": 30, "hold_frames": 2}}.
+    """
+    spec = spec or {}
+    rules, prev_ordered = [], None
+    for i, step_text in enumerate(golden_steps, start=1):
+        key = str(i)
+        rule = infer_rule(key, step_text)
+        if not rule.inventory and prev_ordered is not None:
+            rule.after = (prev_ordered,)
+        for name, value in spec.get(key, {}).items():
+            if name in ("objects", "cumulative_objects"):
+                value = frozenset(value)
+            elif name == "text":
+                value = frozenset(stem(w) for w in value)
+            elif name == "after":
+                value = tuple(str(v) for v in value)
+            elif name not in ("max_gap_s", "hold_frames", "note", "inventory"):
+                raise ValueError(f"unknown rule field for step {key}: {name}")
+            setattr(rule, name, value)
+        if rule.inventory and "after" not in spec.get(key, {}):
+            rule.after = ()
+        if not rule.inventory:
+            prev_ordered = key
+        rules.append(rule)
+
+    known = {r.step for r in rules}
+    for r in rules:
+        missing = [a for a in r.after if a not in known]
+        if missing:
+            raise ValueError(f"step {r.step} is ordered after unknown step(s) {missing}")
+    return rules
+
+
+def load_rule_spec(path: str) -> Dict[str, dict]:
+    with open(path, "r", encoding="utf-8") as f:
+        return json.load(f)
+
+
+class RuleEngine:
+    """
+    Incremental evaluation of compiled rules. State is per step plus the set of classes seen,
+    so memory is bounded however many frames stream through. Only steps not yet completed are
+    evaluated: "done" / "uncertain" are final, while an "out_of_order" step stays pending and
+    turns "done" when it is seen again once its prerequisites are completed. An out-of-order
+    step never counts as a completed prerequisite.
+    """
+
+    def __init__(self, rules: List[StepRule]):
+        self.rules = rules
+        self.out = {
+            r.step: {"expected": r.expected, "status": "missing", "evidence_frame": None, "note": None}
+            for r in rules
+        }
+        self.resolved_at = {}       # step → timestamp it was completed ("done" / "uncertain")
+        self.streak = {r.step: 0 for r in rules}
+        self.pending = list(rules)
+        self.seen_objects = set()
+        self.n_frames = 0
+
+    def _resolve(self, rule: StepRule, status: str, frame, ts, note, events):
+        info = self.out[rule.step]
+        if info["status"] == status:
+            return                        # still out of order: keep the first evidence
+        info.update({"status": status, "note": note})
+        if not rule.inventory:   # no single frame shows the whole inventory
+            info["evidence_frame"] = frame
+        if status != "out_of_order":
+            self.resolved_at[rule.step] = ts
+        events.append({"step": rule.step, "expected": rule.expected, "status": status, "frame": frame,
+                       "note": note})
+
+    def update(self, frame, answer, detections=None, ts: float = None) -> list:
+        """
+        Feed one frame (in order); answer: VlmAnswer or raw answer text. Returns the steps
+        resolved by it as events.
+        """
+        ts = self.n_frames if ts is None else ts
+        self.n_frames += 1
+        if not isinstance(answer, VlmAnswer):
+            answer = parse_answer(answer or "")
+        text = answer.note
+        objs, words, named_step = frame_features(answer, detections)
+        self.seen_objects |= objs
+
+        events = []
+        still_pending = []
+        completed = dict(self.resolved_at)    # prerequisites as of the start of this frame
+        for rule in self.pending:
+            if not rule.matches(objs, words, named_step, self.seen_objects):
+                self.streak[rule.step] = 0
+                still_pending.append(rule)
+                continue
+            self.streak[rule.step] += 1
+            if self.streak[rule.step] < rule.hold_frames:
+                still_pending.append(rule)
+                continue
+
+            note = rule.note or text
+            blocking = [a for a in rule.after if a not in completed]
+            if blocking:
+                self._resolve(rule, "out_of_order", frame, ts,
+                              f"Observed before step {', '.join(blocking)}: {note}", events)
+                still_pending.append(rule)
+            elif rule.max_gap_s is not None and rule.after and \
+                    ts - max(completed[a] for a in rule.after) > rule.max_gap_s:
+                gap = ts - max(completed[a] for a in rule.after)
+                self._resolve(rule, "uncertain", frame, ts,
+                              f"Observed {gap:.1f}s after step {', '.join(rule.after)} "
+                              f"(limit {rule.max_gap_s}s): {note}", events)
+            else:
+                self._resolve(rule, "done", frame, ts, note, events)
+        self.pending = still_pending
+        return events
+
+    def finished(self) -> bool:
+        return not self.pending
+
+    def result(self) -> dict:
+        return self.out
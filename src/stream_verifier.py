@@ -0,0 +1,294 @@
+# src/stream_verifier.py
+"""
+Streaming verification for live sources: webcam index, RTSP/HTTP URL or a file that is still
+being written. Frames are read incrementally from cv2.VideoCapture and step status is updated
+online; every completed step is emitted as an event as soon as its evidence frame is verified.
+
+    python -m src.stream_verifier --source 0                       # webcam
+    python -m src.stream_verifier --source rtsp://cam-3/stream
+    python -m src.stream_verifier --source data/golden.mp4 --realtime   # replay a file as if live
+    python -m src.stream_verifier --source recording.mp4 --follow       # growing file
+
+Bounded latency: a capture thread keeps decoding at the source rate and only the newest frame
+is kept; the verifier samples up to --fps frames per second from it and drops frames it has no
+time for. An event is therefore at most one batch of detection + VLLM work behind the camera.
+Bounded memory: VerificationRun(history=False) keeps per-step state only.
+"""
+import json
+import os
+import threading
+import time
+
+import cv2
+
+from src.instrumentation import metrics
+from src.vlm_gate import GatePolicy
+from src.vllm_reasoner import VerificationRun
+
+
+def open_capture(source, calibration=None) -> cv2.VideoCapture:
+    """
+    "0" / 0 → webcam index, anything else → path or stream URL.
+    calibration: ask a webcam for the smallest resolution that still gives the station ROI its
+    inference size (cameras scale in hardware; files and streams decode at their own size).
+    """
+    if isinstance(source, str) and source.isdigit():
+        source = int(source)
+    cap = cv2.VideoCapture(source)
+    if calibration is not None and isinstance(source, int) and cap.isOpened():
+        w, h = calibration.capture_size()
+        cap.set(cv2.CAP_PROP_FRAME_WIDTH, w)
+        cap.set(cv2.CAP_PROP_FRAME_HEIGHT, h)
+    return cap
+
+
+def _is_file(source) -> bool:
+    return isinstance(source, str) and os.path.exists(source)
+
+
+class LiveCapture:
+    """
+    Decodes a source on a background thread and keeps only the newest frame.
+
+    realtime: pace a file at its own frame rate (stand-in for a live camera).
+    follow: on end-of-file, wait for a growing file to get new frames (reopen + seek).
+    Live URLs are reconnected the same way. Gives up after idle_timeout seconds without frames.
+    calibration: see open_capture; frames are published uncropped (only sampled ones get cropped).
+    """
+
+    def __init__(self, source, realtime: bool = False, follow: bool = False, idle_timeout: float = 5.0,
+                 calibration=None):
+        self.source = source
+        self.calibration = calibration
+        self.realtime = realtime
+        self.follow = follow
+        self.idle_timeout = idle_timeout
+        self._cond = threading.Condition()
+        self._latest = None        # (index, timestamp, frame, captured_at)
+        self._ended = False
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="capture", daemon=True)
+        self.frames_read = 0
+
+    def start(self):
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._stop.set()
+        self._thread.join(timeout=5)
+
+    def _publish(self, item):
+        with self._cond:
+            self._latest = item
+            self._cond.notify_all()
+
+    def _run(self):
+        cap = open_capture(self.source, self.calibration)
+        try:
+            fps = 0.0
+            live = not _is_file(self.source)
+            t0 = time.perf_counter()
+            idx = 0
+            last_frame_at = time.perf_counter()
+            while not self._stop.is_set():
+                ret, frame = cap.read()
+                if not ret:
+                    if not (self.follow or (live and not isinstance(self.source, int))) \
+                            or time.perf_counter() - last_frame_at > self.idle_timeout:
+                        break
+                    # growing file / dropped stream: reopen and continue after the last frame
+                    # (skip with grab: a file still being written has no index to seek with)
+                    time.sleep(0.2)
+                    cap.release()
+                    cap = open_capture(self.source, self.calibration)
+                    if not live:
+                        for _ in range(idx):
+                            if not cap.grab():
+                                break
+                    continue
+                last_frame_at = now = time.perf_counter()
+                if fps <= 0:
+                    fps = cap.get(cv2.CAP_PROP_FPS)
+                    fps = fps if fps > 0 else 30.0
+
+                if live:
+                    ts = now - t0
+                else:
+                    ts = idx / fps
+                    if self.realtime:
+                        delay = t0 + ts - now
+                        if delay > 0:
+                            time.sleep(delay)
+                            now = time.perf_counter()
+                self._publish((idx, round(ts, 2), frame, now))
+                self.frames_read += 1
+                idx += 1
+        finally:
+            cap.release()
+            with self._cond:
+                self._ended = True
+                self._cond.notify_all()
+
+    def next_frame(self, min_ts: float):
+        """
+        Newest frame with timestamp >= min_ts (blocks until there is one). None once the source ended.
+        """
+        with self._cond:
+            while True:
+                item = self._latest
+                if item is not None and item[1] >= min_ts:
+                    self._latest = None
+                    return item
+                if self._ended:
+                    return None
+                self._cond.wait(timeout=0.5)
+
+
+def _file_frames(source, every_n_frames: int, calibration=None):
+    # offline file: every sampled frame, no drops (deterministic, same frames as run_pipeline)
+    from src.frame_extractor import iter_frames
+    for idx, ts, frame in iter_frames(source, every_n_frames, calibration=calibration):
+        yield idx, ts, frame, time.perf_counter()
+
+
+def _live_frames(capture: LiveCapture, sample_fps: float):
+    interval = 1.0 / sample_fps if sample_fps > 0 else 0.0
+    next_ts = 0.0
+    while True:
+        item = capture.next_frame(next_ts)
+        if item is None:
+            return
+        if capture.calibration is not None:
+            idx, ts, frame, captured_at = item
+            item = idx, ts, capture.calibration.apply(frame), captured_at
+        yield item
+        next_ts = item[1] + interval
+
+
+def run_stream(source, golden_steps, out_dir: str = None, sample_fps: float = 2.0, realtime: bool = False,
+               follow: bool = False, every_n_frames: int = 8, batch_size: int = 1, use_api: bool = False,
+               api_key: str = None, gate_policy: GatePolicy = None, stop_when_done: bool = True,
+               max_seconds: float = None, on_event=None, rules=None, calibration=None) -> dict:
+    """
+    Verify a source incrementally. on_event(event) is called for every completed step;
+    events carry the step, its status (done / out_of_order / uncertain), evidence frame, stream
+    timestamp and latency_s (frame capture → event); an out_of_order step gets a second event if
+    it is later seen in order. rules: compiled step rules (see step_rules).
+    calibration: StationCalibration; frames are cropped to the station ROI before detection.
+    Files without realtime/follow are read in full at every_n_frames (no frames dropped);
+    other sources are sampled at sample_fps from the newest decoded frame.
+    Returns {"verification", "events", "frames", "vlm_gate"}; with out_dir, events are appended to
+    step_events.jsonl as they happen and the final state goes to verification_result.json.
+    """
+    metrics.reset()
+    run = VerificationRun(golden_steps, use_api=use_api, api_key=api_key, detect_batch_size=batch_size,
+                          gate_policy=gate_policy, history=False, rules=rules, calibration=calibration)
+    capture = None
+    if _is_file(source) and not (realtime or follow):
+        frames = _file_frames(source, every_n_frames, calibration)
+    else:
+        capture = LiveCapture(source, realtime=realtime, follow=follow, calibration=calibration).start()
+        frames = _live_frames(capture, sample_fps)
+
+    events_file = None
+    if out_dir:
+        os.makedirs(out_dir, exist_ok=True)
+        events_file = open(os.path.join(out_dir, "step_events.jsonl"), "w", encoding="utf-8")
+
+    events, t0 = [], time.perf_counter()
+    n_frames = 0
+
+    def process(batch):
+        keys, images, hashes, metas = run.prepare([item for item, _ in batch], n_frames)
+        batch_events = run.answer(keys, images, hashes, metas, run.detect(keys, images, hashes))
+        done_at = time.perf_counter()
+        for ev in batch_events:
+            j = keys.index(ev["frame"])
+            ev.update(timestamp=metas[j]["timestamp"], latency_s=round(done_at - batch[j][1], 3))
+            metrics.record("event_latency", ev["latency_s"])
+            mark = "✅" if ev["status"] == "done" else "⚠️"
+            print(f"{mark} Step {ev['step']} {ev['status']} at {ev['timestamp']}s (frame {ev['frame']}, "
+                  f"{ev['latency_s'] * 1000:.0f} ms behind capture)")
+            if events_file:
+                events_file.write(json.dumps(ev, ensure_ascii=False) + "\n")
+                events_file.flush()
+            if on_event:
+                on_event(ev)
+        events.extend(batch_events)
+
+    try:
+        batch = []
+        for idx, ts, frame, captured_at in frames:
+            batch.append(((idx, ts, frame), captured_at))
+            out_of_time = max_seconds is not None and time.perf_counter() - t0 > max_seconds
+            if len(batch) < batch_size and not out_of_time:
+                continue
+            # a full batch, or time is up: the frames buffered so far are still verified
+            process(batch)
+            n_frames += len(batch)
+            batch = []
+
+            if stop_when_done and run.verifier.finished():
+                print("🏁 Every step resolved")
+                break
+            if out_of_time:
+                break
+        if batch:   # the source ended mid-batch
+            process(batch)
+            n_frames += len(batch)
+    finally:
+        if capture is not None:
+            capture.stop()
+        if events_file:
+            events_file.close()
+
+    result = {"source": str(source), "verification": run.verifier.result(), "events": events,
+              "frames": n_frames, "vlm_gate": run.gate.stats()}
+    if capture is not None:
+        result["frames_decoded"] = capture.frames_read
+    if out_dir:
+        with open(os.path.join(out_dir, "verification_result.json"), "w", encoding="utf-8") as f:
+            json.dump(result, f, indent=2, ensure_ascii=False)
+        metrics.write_json(os.path.join(out_dir, "timing_summary.json"))
+    return result
+
+
+if __name__ == "__main__":
+    import argparse
+    from src import object_detector
+    from src.pipeline import GOLDEN_STEPS
+    from src.station_calibration import load_calibration
+    from src.step_rules import compile_rules, load_rule_spec
+
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--source", required=True, help="webcam index, stream URL or video file")
+    parser.add_argument("--outdir", default="out_stream")
+    parser.add_argument("--fps", type=float, default=2.0, help="frames verified per second of live video")
+    parser.add_argument("--realtime", action="store_true", help="replay a file at its real frame rate")
+    parser.add_argument("--follow", action="store_true", help="keep reading a file that is still being written")
+    parser.add_argument("--stride", type=int, default=8, help="offline file: every Nth frame")
+    parser.add_argument("--batch", type=int, default=1, help="frames per detection/VLLM round (latency vs throughput)")
+    parser.add_argument("--use_api", action="store_true")
+    parser.add_argument("--max_seconds", type=float, default=None, help="stop after this many seconds")
+    parser.add_argument("--keep_going", action="store_true", help="don't stop once every step is resolved")
+    parser.add_argument("--rules", default=None, help="JSON step-rule overrides (see src/step_rules.py)")
+    parser.add_argument("--model", default=None, help="YOLO weights (default: $YOLO_MODEL_PATH or yolov8n.pt)")
+    parser.add_argument("--device", default=None, help="YOLO device, e.g. cpu or cuda:0")
+    parser.add_argument("--threads", type=int, default=None,
+                        help="ONNX Runtime intra-op threads for .onnx weights (default: $YOLO_THREADS or all cores)")
+    parser.add_argument("--station", default=None, help="crop to this station's calibrated ROI")
+    args = parser.parse_args()
+
+    object_detector.configure(model_path=args.model, device=args.device, threads=args.threads)
+    # load before opening the source: a live feed shouldn't wait for weights
+    object_detector.warmup()
+
+    result = run_stream(args.source, GOLDEN_STEPS, out_dir=args.outdir, sample_fps=args.fps,
+                        realtime=args.realtime, follow=args.follow, every_n_frames=args.stride,
+                        batch_size=args.batch, use_api=args.use_api, stop_when_done=not args.keep_going,
+                        max_seconds=args.max_seconds,
+                        rules=compile_rules(GOLDEN_STEPS, load_rule_spec(args.rules) if args.rules else None),
+                        calibration=load_calibration(args.station) if args.station else None)
+    done = sum(1 for info in result["verification"].values() if info["status"] == "done")
+    print(f"📊 {done}/{len(result['verification'])} steps verified from {result['frames']} frames")
@@ -2,16 +2,44 @@
 import os
 import json
 import random
+import re
+import threading
+import time
+from itertools import islice
 from typing import List, Dict
 
+from src.frame_extractor import frame_name, parse_frame_name
+from src.frame_memo import FrameMemo, answer_model_id, frame_hash
+from src.instrumentation import log_sampled, metrics
+from src.object_detector import as_detections, detect_objects_batch, detector_id, load_frame
+from src.object_tracker import ObjectTracker
+from src.step_rules import RuleEngine, compile_rules
+from src.vlm_answer import PRIMER, AnswerGrammar, parse_answer
+from src.vlm_gate import GatePolicy, VlmGate
+
 # --------------------------
 # SIMULATED VLLM (for demo)
+_sim_rng = random.Random()
+_sim_latency_s = 0.0
+
+
+def set_simulation(seed: int = None, latency_ms: float = 0.0):
+    """
+    Make simulated_vllm reproducible (seed) and/or as slow as a real model (latency per frame).
+    """
+    global _sim_latency_s
+    _sim_rng.seed(seed)
+    _sim_latency_s = latency_ms / 1000.0
+
+
 def simulated_vllm(image_inputs, prompt, mode="basic"):
     responses = {}
     for i, p in enumerate(image_inputs):
         key = os.path.basename(p) if isinstance(p, str) else f"frame_{i}"
+        if _sim_latency_s:
+            time.sleep(_sim_latency_s)
 
-        r = random.random()
+        r = _sim_rng.random()
         if r < 0.2:
             txt = "Case, cable and both earbuds present on workstation."
         elif r < 0.35:
@@ -39,22 +67,34 @@ _model_loaded = False
 _processor = None
 _model = None
 _MODEL_ID = "llava-hf/llava-1.5-7b-hf"
+_model_lock = threading.Lock()
 
 def ensure_model_loaded():
     global _model_loaded, _processor, _model
     if _model_loaded:
         return
-    print("🔄 Loading VLLM (lazy):", _MODEL_ID)
-    from transformers import LlavaForConditionalGeneration, LlavaProcessor
-    import torch
-    _processor = LlavaProcessor.from_pretrained(_MODEL_ID)
-    _model = LlavaForConditionalGeneration.from_pretrained(
-        _MODEL_ID,
-        device_map="auto",
-        torch_dtype="auto"
-    )
-    _model_loaded = True
-    print("✅ VLLM Loaded (lazy)")
+    with _model_lock:
+        if _model_loaded:
+            return
+        print("🔄 Loading VLLM (lazy):", _MODEL_ID)
+        from transformers import LlavaForConditionalGeneration, LlavaProcessor
+        import torch
+        _processor = LlavaProcessor.from_pretrained(_MODEL_ID)
+        _model = LlavaForConditionalGeneration.from_pretrained(
+            _MODEL_ID,
+            device_map="auto",
+            torch_dtype="auto"
+        )
+        _model_loaded = True
+        print("✅ VLLM Loaded (lazy)")
+
+def vlm_model_id(use_api: bool) -> str:
+    """
+    Identifier of the VLLM that produces answers (part of result cache keys).
+    """
+    if not use_api:
+        return "simulated"
+    return f"{_MODEL_ID}+json" if CONSTRAINED_DECODING else _MODEL_ID
 
 # --------------------------
 # REAL VLLM (HuggingFace LLaVA)
@@ -78,16 +118,265 @@ def ensure_model_loaded():
 
 #         answers[p] = text_output
 #     return answers
-def vllm_query_api_template(image_paths: List[str], prompt: str, api_key: str = None) -> Dict[str, str]:
+def _to_pil(image_input):
+    """
+    Accept a file path or an in-memory BGR frame (numpy array) and return an RGB PIL image.
+    """
+    from PIL import Image
+    if isinstance(image_input, str):
+        return Image.open(image_input).convert("RGB")
+    import cv2
+    return Image.fromarray(cv2.cvtColor(image_input, cv2.COLOR_BGR2RGB))
+
+
+VLM_BATCH_SIZE = 4
+MAX_NEW_TOKENS = 128
+# grammar-constrained JSON answers (src/vlm_answer.py); VLM_CONSTRAINED=0 → free text
+CONSTRAINED_DECODING = os.environ.get("VLM_CONSTRAINED", "1") != "0"
+
+
+def set_vlm_model(model, processor, model_id: str = None):
+    """
+    Install an already constructed model/processor pair (e.g. a tiny stand-in LLaVA in tests)
+    instead of lazily loading _MODEL_ID.
+    """
+    global _model_loaded, _processor, _model, _MODEL_ID
+    with _model_lock:
+        _model, _processor = model, processor
+        if model_id:
+            _MODEL_ID = model_id
+        _model_loaded = True
+        _prefix_kv.clear()
+        _grammars.clear()
+
+
+class _TokenBudget:
+    """
+    Adaptive max_new_tokens: the JSON answer is short, so once a few answers have been seen,
+    cap generation a little above the longest one instead of always allowing MAX_NEW_TOKENS.
+    Answers that hit the cap push it back up.
+    """
+
+    def __init__(self, initial: int = 64, floor: int = 24, ceiling: int = MAX_NEW_TOKENS, warmup: int = 4):
+        self.initial, self.floor, self.ceiling, self.warmup = initial, floor, ceiling, warmup
+        self.longest = 0
+        self.seen = 0
+
+    def current(self) -> int:
+        if self.seen < self.warmup:
+            return self.initial
+        return max(self.floor, min(self.ceiling, int(self.longest * 1.25) + 8))
+
+    def observe(self, n_tokens: int, truncated: bool):
+        self.seen += 1
+        self.longest = max(self.longest, int(n_tokens * 1.5) if truncated else n_tokens)
+
+
+_token_budget = _TokenBudget()
+_prefix_kv = {}          # prefix text -> (KV cache, prefix length); one entry per golden-step prompt
+_prefix_cache_ok = True  # flipped off if this transformers version can't run the cached path
+_grammars = {}           # number of golden steps -> AnswerGrammar for the loaded tokenizer
+
+
+def answer_grammar(n_steps: int) -> AnswerGrammar:
+    """
+    JSON answer grammar for the loaded tokenizer (vocabulary scanned once per step count).
+    """
+    if n_steps not in _grammars:
+        _grammars[n_steps] = AnswerGrammar(_processor.tokenizer, n_steps)
+    return _grammars[n_steps]
+
+
+def _llava_prompt(prefix: str, suffix: str, primer: str = "") -> str:
+    # shared text first so its KV can be reused; the image + per-frame evidence come after it
+    return f"USER: {prefix}<image>\n{suffix} ASSISTANT:{' ' + primer if primer else ''}"
+
+
+def _get_prefix_kv(prefix_text: str):
+    import torch
+    if prefix_text not in _prefix_kv:
+        _prefix_kv.clear()
+        ids = _processor.tokenizer(prefix_text, return_tensors="pt").input_ids.to(_model.device)
+        with torch.inference_mode():
+            out = _model(input_ids=ids, use_cache=True)
+        _prefix_kv[prefix_text] = (out.past_key_values, ids.shape[1])
+    return _prefix_kv[prefix_text]
+
+
+def _generate_with_prefix_cache(images, prefix: str, suffixes: List[str], max_new_tokens: int, grammar=None):
+    """
+    Greedy decoding that reuses the KV cache of the shared prompt prefix (golden steps):
+    only the image + evidence suffix and the answer tokens are run per frame.
+    grammar: AnswerGrammar; each sequence can only spell the JSON answer and stops at its "}".
+    Returns (texts, generated token counts).
+    """
+    import copy
+    import torch
+
+    tok = _processor.tokenizer
+    device = _model.device
+    prefix_cache, P = _get_prefix_kv(f"USER: {prefix}")
+    B = len(images)
+
+    primer = f" {PRIMER}" if grammar is not None else ""
+    rest = [f"<image>\n{s} ASSISTANT:{primer}" for s in suffixes]
+    # left padding per call (the shared tokenizer's own setting is left alone)
+    inputs = _processor(text=rest, images=images, return_tensors="pt", padding=True, padding_side="left",
+                        add_special_tokens=False).to(device)
+
+    cache = copy.deepcopy(prefix_cache)
+    if B > 1:
+        cache.batch_repeat_interleave(B)
+    # pads sit between prefix and suffix; the attention mask and position ids skip them
+    attn = torch.cat([torch.ones(B, P, dtype=inputs.attention_mask.dtype, device=device),
+                      inputs.attention_mask], dim=1)
+    position_ids = (attn.cumsum(-1) - 1).clamp(min=0)[:, P:]
+    cache_position = torch.arange(P, attn.shape[1], device=device)
+
+    eos = tok.eos_token_id
+    pad = tok.pad_token_id if tok.pad_token_id is not None else eos
+    finished = torch.zeros(B, dtype=torch.bool, device=device)
+    lengths = torch.zeros(B, dtype=torch.long, device=device)
+    generated = []
+    states = [grammar.start() for _ in range(B)] if grammar is not None else None
+
+    with torch.inference_mode():
+        out = _model(input_ids=inputs.input_ids, pixel_values=inputs.pixel_values.to(_model.dtype),
+                     attention_mask=attn, position_ids=position_ids, past_key_values=cache,
+                     cache_position=cache_position, use_cache=True)
+        for step in range(max_new_tokens):
+            logits = out.logits[:, -1, :]
+            if states is None:
+                next_tok = logits.argmax(-1)
+            else:
+                picked = [pad if s.done else grammar.pick(s, logits[b]) for b, s in enumerate(states)]
+                for s, t in zip(states, picked):
+                    grammar.advance(s, t)
+                next_tok = torch.tensor(picked, dtype=torch.long, device=device)
+            next_tok = torch.where(finished, torch.full_like(next_tok, pad), next_tok)
+            generated.append(next_tok)
+            lengths += (~finished).long()
+            finished |= next_tok == eos
+            if states is not None:
+                finished |= torch.tensor([s.done for s in states], device=device)
+            if bool(finished.all()) or step == max_new_tokens - 1:
+                break
+            attn = torch.cat([attn, torch.ones(B, 1, dtype=attn.dtype, device=device)], dim=1)
+            position_ids = position_ids[:, -1:] + 1
+            cache_position = cache_position[-1:] + 1
+            out = _model(input_ids=next_tok[:, None], attention_mask=attn, position_ids=position_ids,
+                         past_key_values=out.past_key_values, cache_position=cache_position, use_cache=True)
+
+    gen = torch.stack(generated, dim=1)
+    texts = tok.batch_decode(gen, skip_special_tokens=True)
+    if grammar is not None:
+        texts = [PRIMER + t for t in texts]
+    return [t.strip() for t in texts], lengths.tolist()
+
+
+def _grammar_constraint(grammar, prompt_len: int, batch: int):
+    """
+    prefix_allowed_tokens_fn for generate(): replays each row's new tokens through the grammar.
+    """
+    states = [grammar.start() for _ in range(batch)]
+    consumed = [0] * batch
+    eos = _processor.tokenizer.eos_token_id
+
+    def allowed(batch_id, input_ids):
+        state = states[batch_id]
+        new = input_ids[prompt_len:].tolist()
+        for t in new[consumed[batch_id]:]:
+            grammar.advance(state, t)
+        consumed[batch_id] = len(new)
+        if state.done:
+            return [eos]
+        forced = grammar.forced(state)
+        return [forced] if forced is not None else grammar.allowed(state)
+    return allowed
+
+
+def _generate_plain(images, prompts: List[str], max_new_tokens: int, grammar=None):
+    """
+    Batched generate() without prefix reuse; decodes only the newly generated tokens.
+    grammar: AnswerGrammar constraining the answers (prompts must end with PRIMER).
+    """
+    import torch
+
+    tok = _processor.tokenizer
+    inputs = _processor(text=prompts, images=images, return_tensors="pt", padding=True,
+                        padding_side="left").to(_model.device)
+    prompt_len = inputs.input_ids.shape[1]
+    constraint = {}
+    if grammar is not None:
+        constraint["prefix_allowed_tokens_fn"] = _grammar_constraint(grammar, prompt_len, len(prompts))
+    with torch.inference_mode():
+        output_ids = _model.generate(**inputs, max_new_tokens=max_new_tokens, do_sample=False,
+                                     pad_token_id=tok.pad_token_id if tok.pad_token_id is not None else tok.eos_token_id,
+                                     **constraint)
+    gen = output_ids[:, prompt_len:]
+    lengths = [int((row != tok.pad_token_id).sum()) if tok.pad_token_id is not None else row.shape[0] for row in gen]
+    texts = tok.batch_decode(gen, skip_special_tokens=True)
+    if grammar is not None:
+        texts = [PRIMER + t for t in texts]
+    return [t.strip() for t in texts], lengths
+
+
+def vllm_query_batch(image_inputs, prefix: str, suffixes: List[str], batch_size: int = VLM_BATCH_SIZE,
+                     n_steps: int = None) -> List[str]:
+    """
+    Answer many frames with LLaVA, `batch_size` images per forward pass.
+    The prompt of each frame is prefix + image + suffix; the prefix (golden steps) is shared,
+    so its KV cache is computed once and reused.
+    n_steps (number of golden steps) with CONSTRAINED_DECODING: answers are grammar-constrained
+    JSON that stops at its closing brace; otherwise generation length adapts to the answers seen.
+    """
+    global _prefix_cache_ok
+    ensure_model_loaded()
+    grammar = answer_grammar(n_steps) if CONSTRAINED_DECODING and n_steps else None
+    primer = PRIMER if grammar is not None else ""
+    images = [_to_pil(p) for p in image_inputs]
+    answers = []
+    for start in range(0, len(images), batch_size):
+        imgs = images[start:start + batch_size]
+        sufs = suffixes[start:start + batch_size]
+        budget = grammar.max_new_tokens() if grammar is not None else _token_budget.current()
+        texts = None
+        if _prefix_cache_ok:
+            try:
+                texts, lengths = _generate_with_prefix_cache(imgs, prefix, sufs, budget, grammar)
+            except Exception as e:
+                print("⚠️ Prefix KV cache unavailable, using plain batched generate:", e)
+                _prefix_cache_ok = False
+        if texts is None:
+            texts, lengths = _generate_plain(imgs, [_llava_prompt(prefix, s, primer) for s in sufs], budget, grammar)
+        if grammar is None:
+            for n in lengths:
+                _token_budget.observe(n, truncated=n >= budget)
+        metrics.incr("vlm_tokens", sum(lengths))
+        answers.extend(texts)
+    return answers
+
+
+def vllm_query_api_template(image_paths: List[str], prompt: str, api_key: str = None,
+                            n_steps: int = None) -> Dict[str, str]:
+    """
+    One frame per generate() call with a complete prompt. n_steps: golden steps the answer may
+    name (default: the highest "Step N" in the prompt); constrained like vllm_query_batch.
+    """
     ensure_model_loaded()   # make sure model is loaded only if use_api=True
+    grammar = None
+    if CONSTRAINED_DECODING:
+        n_steps = n_steps or max((int(n) for n in re.findall(r"Step (\d+)", prompt)), default=9)
+        grammar = answer_grammar(n_steps)
     answers = {}
-    from PIL import Image
-    for p in image_paths:
-        image = Image.open(p).convert("RGB")
-        inputs = _processor(text=prompt, images=image, return_tensors="pt").to(_model.device)
-        output_ids = _model.generate(**inputs, max_new_tokens=128)
-        text_output = _processor.batch_decode(output_ids, skip_special_tokens=True)[0]
-        answers[p] = text_output
+    for i, p in enumerate(image_paths):
+        key = p if isinstance(p, str) else f"frame_{i}"
+        if grammar is not None:
+            texts, _ = _generate_plain([_to_pil(p)], [_llava_prompt("", prompt, PRIMER)], grammar.max_new_tokens(),
+                                       grammar)
+        else:
+            texts, _ = _generate_plain([_to_pil(p)], [_llava_prompt("", prompt)], MAX_NEW_TOKENS)
+        answers[key] = texts[0]
     return answers
 
 
@@ -209,91 +498,53 @@ def vllm_query_api_template(image_paths: List[str], prompt: str, api_key: str =
 #             })
 
 #     return out
-def verify_steps_with_vllm(image_answers, golden_steps, detections=None):
-    out = {
-        str(i): {
-            "expected": step,
-            "status": "missing",
-            "evidence_frame": None,
-            "note": None
-        }
-        for i, step in enumerate(golden_steps, start=1)
-    }
-
-    # Track objects across frames for Step 1
-    seen_objects = set()
-
+def verify_steps_with_vllm(image_answers, golden_steps, detections=None, timestamps=None, rules=None):
+    """
+    Batch form of the step-rule engine (see step_rules): frames in answer order.
+    rules: compiled StepRules (default: compile_rules(golden_steps)).
+    """
+    engine = RuleEngine(rules or compile_rules(golden_steps))
     for frame, text in image_answers.items():
-        det_objs = [] if detections is None else detections.get(frame, [])
-        objs = [d["object"] for d in det_objs]
-
-        # Update global object tracker
-        seen_objects.update(objs)
-
-        # --- Step 2: Open case ---
-        if "case" in objs and "open" in text.lower():
-            if out["2"]["status"] == "missing":
-                out["2"].update({"status": "done", "evidence_frame": frame, "note": text})
-
-        # --- Step 3: Left earbud ---
-        if "left_earbud" in objs:
-            if out["3"]["status"] == "missing":
-                out["3"].update({"status": "done", "evidence_frame": frame, "note": "Left earbud inserted"})
-
-        # --- Step 4: Right earbud ---
-        if "right_earbud" in objs:
-            if out["4"]["status"] == "missing":
-                out["4"].update({"status": "done", "evidence_frame": frame, "note": "Right earbud inserted"})
+        engine.update(frame, text, [] if detections is None else detections.get(frame, []),
+                      None if timestamps is None else timestamps.get(frame))
+    return engine.result()
 
-        # --- Step 5: Case closed ---
-        if "closed" in text.lower() and "case" in text.lower():
-            if out["5"]["status"] == "missing":
-                out["5"].update({"status": "done", "evidence_frame": frame, "note": text})
-
-        # --- Step 6: Cable ---
-        if "cable" in objs:
-            if out["6"]["status"] == "missing":
-                out["6"].update({"status": "done", "evidence_frame": frame, "note": "Cable plugged in"})
-
-    # --- Step 1 (Preparation) – check across all frames ---
-    if {"case", "left_earbud", "right_earbud", "cable"}.issubset(seen_objects):
-        out["1"].update({"status": "done", "note": "Case, cable and both earbuds present"})
-
-    return out
-
-
-from src.object_detector import detect_objects   # new file we’ll create
 
 # --------------------------
 # Convenience wrapper
 # --------------------------
 
-def run_vllm_verification(frames, golden_steps, use_api: bool = False, api_key: str = None, raw: bool = False):
-    """
-    frames: list of either file paths OR raw frames (numpy arrays)
-    """
-    results = {}
-    all_detections_for_return = []
-
-    for i, p in enumerate(frames):
-        detected_objs = detect_objects(p)
-        print("🔍 Detected objects:", detected_objs)
-        all_detections_for_return = detected_objs
-
-        key = f"frame_{i}" if not isinstance(p, str) else os.path.basename(p)
+def _iter_batches(items, size):
+    it = iter(items)
+    while True:
+        batch = list(islice(it, size))
+        if not batch:
+            return
+        yield batch
 
-        # Build object summary string
-        if detected_objs:
-            object_summary = ", ".join(f"{d['object']} (conf {d['confidence']:.2f})" for d in detected_objs)
-        else:
-            object_summary = "none"
 
-        prompt = f"""
+def prompt_prefix(golden_steps) -> str:
+    """
+    Part of the prompt shared by every frame of a run (built once; its KV cache is reused).
+    """
+    return f"""
 You are an AI assembly verification assistant.
 
 Golden steps:
 {chr(10).join(golden_steps)}
+"""
+
+
+def prompt_suffix(detected_objs) -> str:
+    # Build object summary string
+    detected_objs = as_detections(detected_objs)
+    if len(detected_objs):
+        object_summary = ", ".join(f"{obj} (conf {conf:.2f})"
+                                   for obj, conf in zip(detected_objs.objects(), detected_objs.conf.tolist()))
+    else:
+        object_summary = "none"
 
+    return f"""
 Evidence: {object_summary}
 
 For this frame:
@@ -308,30 +559,318 @@ For this frame:
 }}
 """
 
-        # 2) call VLLM (real or simulated)
-        try:
-            if use_api:
-                answers = vllm_query_api_template([p], prompt, api_key=api_key)
-            else:
-                answers = simulated_vllm([p], prompt)
-        except Exception as e:
-            print("⚠️ Falling back to simulated VLLM due to error:", e)
-            answers = simulated_vllm([p], prompt)
 
-        # store the raw answer (simulated returns text; real VLLM may return JSON-like text)
-        results[key] = list(answers.values())[0] 
+def build_prompt(golden_steps, detected_objs) -> str:
+    return prompt_prefix(golden_steps) + prompt_suffix(detected_objs)
 
-        # 3) override step1 result based on detector if applicable
-        # if step1_ok:
-        #     # override the frame's result to a JSON string the verifier can parse
-        #     results[p] = json.dumps({
-        #         "detected_step": 1,
-        #         "status": "done",
-        #         "note": "Case + cable + at least one earbud observed"
-        #     })
 
-    # 4) produce verification (parses the model outputs)
-    verification = verify_steps_with_vllm(results, golden_steps)
+def answer_id(golden_steps, use_api: bool, det_id: str) -> str:
+    """
+    Frame memo key of the answers of a run. A real VLLM reads the golden steps in the prompt
+    prefix and (constrained) can only answer their step numbers, so both join the key;
+    simulated answers are shared across step lists.
+    """
+    prompt = f"{prompt_prefix(golden_steps)}|n_steps={len(golden_steps)}" if use_api else None
+    return answer_model_id(vlm_model_id(use_api), det_id, prompt)
 
-    return {"answers": results, "verification": verification, "detections": all_detections_for_return}
 
+class VerificationRun:
+    """
+    State of one verification pass, split into the stages the executors schedule:
+      prepare (decode side: keys, frame metadata, content hashes)
+      → detect (earlier run → memo → batched YOLO)
+      → answer (detector gate → earlier run → memo → VLLM)
+      → finish (verifier result).
+    run_vllm_verification runs them in sequence; pipelined_executor overlaps them, stream_verifier
+    feeds them from a live source. prepare/detect may run on worker threads; answer must see
+    batches in frame order. The step verifier is updated as answers arrive.
+    history=False keeps no per-frame answers/detections/metadata (bounded memory for live streams).
+    progress(stage, n): optional callback after each batch ("decode" / "detect" / "vlm", n frames);
+    called from whichever thread ran the stage.
+    calibration: the frames are station ROI crops (see station_calibration); boxes are mapped back.
+    track_every: K > 0 runs YOLO on every Kth frame (or when a track gets unsure) and propagates
+    tracked boxes in between (see object_tracker); detect() must then see batches in frame order.
+    """
+
+    def __init__(self, golden_steps, use_api: bool = False, api_key: str = None, detect_batch_size: int = 8,
+                 known_detections: dict = None, known_answers: dict = None, known_meta: dict = None,
+                 memo: FrameMemo = None, gate_policy: GatePolicy = None, history: bool = True, rules=None,
+                 progress=None, calibration=None, track_every: int = 0):
+        self.golden_steps = golden_steps
+        self.use_api = use_api
+        self.api_key = api_key
+        self.detect_batch_size = detect_batch_size
+        self.known_detections = known_detections or {}
+        self.known_answers = known_answers or {}
+        self.known_meta = known_meta or {}
+        self.memo = memo
+        self.calibration = calibration
+        self.det_id = detector_id(calibration)
+        self.ans_id = answer_id(golden_steps, use_api, self.det_id)
+        self.prefix = prompt_prefix(golden_steps)
+        self.gate = VlmGate(gate_policy)
+        self.verifier = RuleEngine(rules or compile_rules(golden_steps))
+        self.history = history
+        self.progress = progress
+        self.tracker = ObjectTracker(detect_every=track_every) if track_every else None
+        self._track_pos = 0
+        self.results = {}
+        self.detections = {}
+        self.frame_meta = {}
+
+    def prepare(self, batch, start: int = 0):
+        """
+        batch: items of the frame stream; start: position of its first item in the stream.
+        Returns (keys, images, hashes, metas).
+        """
+        keys, images, hashes, metas = [], [], [], []
+        for i, item in enumerate(batch, start=start):
+            meta = None
+            if isinstance(item, tuple):
+                idx, ts, p = item
+                key = frame_name(idx)
+                meta = {"index": idx, "timestamp": ts}
+            else:
+                p = item
+                key = f"frame_{i}" if not isinstance(p, str) else os.path.basename(p)
+            if isinstance(p, str):
+                p = load_frame(p)
+
+            h = None
+            if self.memo is not None:
+                h = self.known_meta.get(key, {}).get("hash")
+                if h is None and p is not None:
+                    h = frame_hash(p)
+                if meta is not None:
+                    meta["hash"] = h
+            keys.append(key)
+            images.append(p)
+            hashes.append(h)
+            metas.append(meta)
+        if self.progress:
+            self.progress("decode", len(keys))
+        return keys, images, hashes, metas
+
+    def detect(self, keys, images, hashes, detect_fn=None):
+        """
+        1) detections: earlier run → memo → YOLO (batched). detect_fn overrides detect_objects_batch.
+        """
+        detect_fn = detect_fn or detect_objects_batch
+        # earlier runs' entries may still be JSON lists (Detections.to_list)
+        batch_detections = [self.known_detections.get(key) for key in keys]
+        batch_detections = [None if d is None else as_detections(d) for d in batch_detections]
+        if self.memo is not None:
+            memo_dets = self.memo.get_detections([h for h, d in zip(hashes, batch_detections) if d is None],
+                                                 self.det_id)
+            for j, h in enumerate(hashes):
+                if batch_detections[j] is None and h in memo_dets:
+                    batch_detections[j] = memo_dets[h]
+        todo = [j for j, d in enumerate(batch_detections) if d is None]
+        cache_hits = len(keys) - len(todo)
+        if self.tracker is not None:
+            batch_detections, todo = self._track(keys, images, batch_detections, detect_fn)
+        elif todo:
+            fresh = detect_fn([images[j] for j in todo], batch_size=self.detect_batch_size,
+                              calibration=self.calibration)
+            for j, dets in zip(todo, fresh):
+                batch_detections[j] = dets
+        # only real detector output is memoized (tracked frames are recomputed from it)
+        if todo and self.memo is not None:
+            self.memo.put_detections({hashes[j]: batch_detections[j] for j in todo if hashes[j]}, self.det_id)
+        metrics.incr("detect_cache_hits", cache_hits)
+        if self.progress:
+            self.progress("detect", len(keys))
+        return batch_detections
+
+    def _track(self, keys, images, batch_detections, detect_fn):
+        """
+        Tracker pass over one batch (in frame order): YOLO on the planned frames in one call,
+        tracked boxes elsewhere. Returns (detections, positions that went through YOLO).
+        """
+        tracker = self.tracker
+        fresh = {}
+        planned = tracker.plan([d is not None for d in batch_detections])
+        if planned:
+            dets = detect_fn([images[j] for j in planned], batch_size=self.detect_batch_size,
+                             calibration=self.calibration)
+            fresh = dict(zip(planned, dets))
+
+        out = []
+        for j, key in enumerate(keys):
+            self._track_pos += 1
+            # time in video frames (streamed frames) or stream positions
+            t = parse_frame_name(key) if key.startswith("frame_") else self._track_pos
+            dets = batch_detections[j] if batch_detections[j] is not None else fresh.get(j)
+            if dets is not None and dets.tracked:
+                dets = None    # an earlier tracked run's propagated frame: propagate again
+            if dets is None and j not in fresh and tracker.wants_detection() and images[j] is not None:
+                # a track got unsure between planned detections
+                dets = fresh[j] = detect_fn([images[j]], batch_size=1, calibration=self.calibration)[0]
+            out.append(tracker.step(key, t, dets))
+        metrics.incr("detect_tracked", sum(1 for d in out if d.tracked and len(d)))
+        return out, sorted(fresh)
+
+    def answer(self, keys, images, hashes, metas, batch_detections):
+        """
+        2) VLLM answers for one batch, fed to the step verifier; batches must arrive in frame
+        order (gate state, answer reuse). Returns the step-completion events of the batch.
+        """
+        for key, meta in zip(keys, metas):
+            if meta is not None:
+                self.frame_meta[key] = meta
+
+        memo_answers = {}
+        if self.memo is not None:
+            memo_answers = self.memo.get_answers(
+                [h for key, h in zip(keys, hashes) if key not in self.known_answers], self.ans_id)
+        fresh_answers = {}
+        batch_answers = {}
+        sources = {}
+
+        pending = []
+        for key, p, h, detected_objs in zip(keys, images, hashes, batch_detections):
+            log_sampled("detect", "%s: %s", key, detected_objs)
+            self.detections[key] = detected_objs
+            metrics.incr("frames")
+
+            source = self.gate.decide(key, detected_objs)
+            if source is not None:
+                # no new evidence: reuse the answer of the last frame sent to the VLLM
+                sources[key] = source
+                metrics.incr("vlm_calls_saved")
+            elif key in self.known_answers or h in memo_answers:
+                batch_answers[key] = self.known_answers[key] if key in self.known_answers else memo_answers[h]
+                metrics.incr("vlm_cache_hits")
+            else:
+                pending.append((key, p, h, detected_objs))
+
+        # call VLLM (real: batched with the shared prefix; simulated: per frame)
+        if pending:
+            with metrics.timer("vlm", n=len(pending)):
+                texts = None
+                if self.use_api:
+                    try:
+                        texts = vllm_query_batch([p for _, p, _, _ in pending], self.prefix,
+                                                 [prompt_suffix(d) for _, _, _, d in pending],
+                                                 n_steps=len(self.golden_steps))
+                    except Exception as e:
+                        print("⚠️ Falling back to simulated VLLM due to error:", e)
+                        metrics.incr("vlm_fallbacks", len(pending))
+                if texts is None:
+                    texts = [list(simulated_vllm([p], self.prefix + prompt_suffix(d)).values())[0]
+                             for _, p, _, d in pending]
+            metrics.incr("vlm_calls", len(pending))
+
+            # store the raw answer (simulated returns text; real VLLM may return JSON-like text)
+            for (key, _, h, _), text in zip(pending, texts):
+                batch_answers[key] = text
+                if h:
+                    fresh_answers[h] = text
+
+        for key in keys:
+            if key in sources:
+                src = sources[key]
+                self.results[key] = batch_answers[src] if src in batch_answers else self.results[src]
+            else:
+                self.results[key] = batch_answers[key]
+
+        if self.memo is not None:
+            self.memo.put_answers(fresh_answers, self.ans_id)
+
+        # 3) update the step verifier (parses the model outputs together with per-frame detections)
+        events = []
+        with metrics.timer("verify", n=len(keys)):
+            for key, meta, detected_objs in zip(keys, metas, batch_detections):
+                # typed answer (parsed once per distinct text, see vlm_answer.parse_answer)
+                events += self.verifier.update(key, parse_answer(self.results[key]), detected_objs,
+                                               meta["timestamp"] if meta else None)
+
+        if not self.history:
+            # only the answer later frames may still reuse (the gate's last VLLM call) is kept
+            last = self.gate.last_called
+            self.results = {last: self.results[last]} if last in self.results else {}
+            self.detections.clear()
+            self.frame_meta.clear()
+        if self.progress:
+            self.progress("vlm", len(keys))
+        return events
+
+    def finish(self) -> dict:
+        out = {"answers": self.results, "verification": self.verifier.result(), "detections": self.detections,
+               "frame_meta": self.frame_meta, "vlm_gate": self.gate.stats()}
+        if self.tracker is not None:
+            out["tracks"] = self.tracker.tracks()
+        return out
+
+
+def run_vllm_verification(frames, golden_steps, use_api: bool = False, api_key: str = None, raw: bool = False,
+                          detect_batch_size: int = 8, known_detections: dict = None, known_answers: dict = None,
+                          known_meta: dict = None, memo: FrameMemo = None, gate_policy: GatePolicy = None,
+                          rules=None, progress=None, calibration=None, track_every: int = 0):
+    """
+    frames: list of file paths, raw frames (numpy arrays), or a stream of
+    (frame_index, timestamp, frame) tuples as yielded by `iter_frames`.
+    Streamed frames are consumed `detect_batch_size` at a time: each chunk goes through
+    YOLO in one batched call, then through the VLLM (batched for the real model).
+    Nothing touches the disk.
+
+    known_detections / known_answers: per-frame results from an earlier run (keyed like the
+    output). Frames found there skip YOLO / the VLLM; such frames may be passed as None.
+    memo: per-frame store keyed by frame content hash; hits skip YOLO / the VLLM, misses are
+    written back. known_meta supplies the hashes of frames passed as None.
+    gate_policy: which frames are worth a VLLM call (see vlm_gate); the rest reuse an earlier answer.
+    rules: compiled step rules (see step_rules; default: inferred from golden_steps).
+    progress: per-stage callback, see VerificationRun.
+    calibration: frames are cropped to a station ROI (StationCalibration); boxes are mapped back.
+    track_every: run YOLO every Kth frame and track objects in between (0 = every frame).
+    """
+    run = VerificationRun(golden_steps, use_api=use_api, api_key=api_key, detect_batch_size=detect_batch_size,
+                          known_detections=known_detections, known_answers=known_answers,
+                          known_meta=known_meta, memo=memo, gate_policy=gate_policy, rules=rules,
+                          progress=progress, calibration=calibration, track_every=track_every)
+    start = 0
+    for batch in _iter_batches(frames, detect_batch_size):
+        keys, images, hashes, metas = run.prepare(batch, start)
+        batch_detections = run.detect(keys, images, hashes)
+        run.answer(keys, images, hashes, metas, batch_detections)
+        start += len(batch)
+    return run.finish()
+
+
+def reverify_from_memo(frame_meta: dict, golden_steps, memo: FrameMemo, use_api: bool = False,
+                       gate_policy: GatePolicy = None, rules=None, calibration=None):
+    """
+    Re-run only the verifier over memoized evidence for an earlier run's frames
+    (frame_meta with content hashes). Pure in-memory pass: no decoding, YOLO or VLLM.
+    Gate decisions are replayed from the detections, so only frames that were sent to the
+    VLLM need a memoized answer. Returns None if anything needed is not in the memo.
+    """
+    det_id = detector_id(calibration)
+    ans_id = answer_id(golden_steps, use_api, det_id)
+    hashes = [m.get("hash") for m in frame_meta.values()]
+    if not all(hashes):
+        return None
+
+    dets = memo.get_detections(hashes, det_id)
+    if len(dets) < len(set(hashes)):
+        return None
+    detections = {key: dets[m["hash"]] for key, m in frame_meta.items()}
+
+    gate = VlmGate(gate_policy)
+    sources = {key: gate.decide(key, d) for key, d in detections.items()}
+    answers = memo.get_answers([frame_meta[k]["hash"] for k, src in sources.items() if src is None], ans_id)
+
+    image_answers = {}
+    for key, m in frame_meta.items():
+        src = sources[key]
+        if src is not None:
+            image_answers[key] = image_answers[src]
+        elif m["hash"] in answers:
+            image_answers[key] = answers[m["hash"]]
+        else:
+            return None
+    with metrics.timer("verify"):
+        verification = verify_steps_with_vllm(image_answers, golden_steps, detections,
+                                              {key: m["timestamp"] for key, m in frame_meta.items()}, rules)
+    return {"answers": image_answers, "verification": verification, "detections": detections,
+            "frame_meta": frame_meta, "vlm_gate": gate.stats()}
@@ -0,0 +1,313 @@
+# src/vlm_answer.py
+"""
+Structured VLLM answers: the small JSON object the prompt asks for, a grammar that constrains
+decoding to it, and a tolerant parser that turns any answer text into a typed VlmAnswer.
+
+    {"detected_step": <step number or null>, "status": "done" | "missing" | "out_of_order" | "uncertain",
+     "note": "<short note>"}
+
+AnswerGrammar drives greedy decoding token by token (see vllm_reasoner):
+  - the fixed parts (keys, quotes, commas) are forced without looking at the logits,
+  - step number and status are an argmax over the tokens that can still spell a valid value,
+  - the note is free text without quotes / backslashes / newlines / braces, at most note_tokens long,
+  - generation stops at the closing brace.
+The opening `{"detected_step":` (PRIMER) goes at the end of the prompt, so it costs no decoding step.
+A 6-step answer is ~30-40 generated tokens instead of up to MAX_NEW_TOKENS of free text.
+
+parse_answer accepts constrained JSON, sloppy JSON from an unconstrained model (single quotes,
+trailing commas, cut-off output) and the simulated free-text answers (no structure: note = text).
+"""
+import json
+import re
+from dataclasses import dataclass
+from functools import lru_cache
+from typing import List, Optional
+
+STATUSES = ("done", "missing", "out_of_order", "uncertain")
+PRIMER = '{"detected_step":'
+NOTE_TOKENS = 24
+# characters that would end or break the JSON string of the note (plus control characters)
+NOTE_FORBIDDEN = frozenset('"\\{}') | frozenset(map(chr, range(32)))
+
+_BYTE_PIECE = re.compile(r"<0x([0-9A-Fa-f]{2})>")
+
+
+# --------------------------
+# Typed answer + tolerant parser
+# --------------------------
+@dataclass(frozen=True)
+class VlmAnswer:
+    detected_step: Optional[int]     # step the model says the frame shows (None: none / not given)
+    status: Optional[str]            # one of STATUSES; None for unstructured answers
+    note: str                        # the note, or the whole text of an unstructured answer
+    structured: bool = False
+
+    def named_step(self) -> Optional[str]:
+        """
+        Step key the answer vouches for ("3"), or None; "missing" / "uncertain" answers vouch for nothing.
+        """
+        if self.detected_step is None or self.status in ("missing", "uncertain"):
+            return None
+        return str(self.detected_step)
+
+
+_FIELD_STEP = re.compile(r"""detected_step['"]?\s*[:=]\s*['"]?(?:step\s*)?(\d+|null|none)""", re.I)
+_FIELD_STATUS = re.compile(r"""status['"]?\s*[:=]\s*['"]?(done|missing|out[\s_-]*of[\s_-]*order|uncertain)""", re.I)
+_FIELD_NOTE = re.compile(r"""note['"]?\s*[:=]\s*(?:"((?:[^"\\]|\\.)*)|'([^']*))""", re.I | re.S)
+_TRAILING_COMMA = re.compile(r",\s*([}\]])")
+
+
+def _normalize_status(value) -> Optional[str]:
+    if not isinstance(value, str):
+        return None
+    value = re.sub(r"[\s-]+", "_", value.strip().lower())
+    return value if value in STATUSES else None
+
+
+def _normalize_step(value) -> Optional[int]:
+    if isinstance(value, bool):
+        return None
+    if isinstance(value, (int, float)):
+        return int(value)
+    if isinstance(value, str):
+        m = re.search(r"\d+", value)
+        return int(m.group()) if m else None
+    return None
+
+
+def _load_object(blob: str):
+    # strict JSON first (C parser), then the usual small-model slips
+    for candidate in (blob, _TRAILING_COMMA.sub(r"\1", blob.replace("'", '"'))):
+        try:
+            obj = json.loads(candidate)
+        except ValueError:
+            continue
+        if isinstance(obj, dict):
+            return obj
+    return None
+
+
+@lru_cache(maxsize=4096)
+def parse_answer(text: str) -> VlmAnswer:
+    """
+    Typed view of one raw answer. Cached: gated frames share the answer text they reuse.
+    """
+    text = text or ""
+    start = text.find("{")
+    if start < 0:
+        return VlmAnswer(None, None, text.strip())
+
+    end = text.rfind("}")
+    obj = _load_object(text[start:end + 1]) if end > start else None
+    if obj is not None:
+        note = obj.get("note")
+        return VlmAnswer(_normalize_step(obj.get("detected_step")), _normalize_status(obj.get("status")),
+                         note.strip() if isinstance(note, str) else "", True)
+
+    # cut off or malformed: pick the fields out one by one
+    body = text[start:]
+    step = _FIELD_STEP.search(body)
+    status = _FIELD_STATUS.search(body)
+    note = _FIELD_NOTE.search(body)
+    if not (step or status or note):
+        return VlmAnswer(None, None, text.strip())
+    return VlmAnswer(_normalize_step(step.group(1)) if step else None,
+                     _normalize_status(status.group(1)) if status else None,
+                     (note.group(1) if note.group(1) is not None else note.group(2)).strip() if note else "",
+                     True)
+
+
+# --------------------------
+# Grammar-constrained decoding
+# --------------------------
+def _byte_level_decoder() -> dict:
+    # inverse of GPT-2's bytes_to_unicode: printable stand-in character → byte
+    keep = list(range(ord("!"), ord("~") + 1)) + list(range(ord("¡"), ord("¬") + 1)) + list(range(ord("®"), ord("ÿ") + 1))
+    chars, extra = {}, 0
+    for b in range(256):
+        if b in keep:
+            chars[chr(b)] = b
+        else:
+            chars[chr(256 + extra)] = b
+            extra += 1
+    return chars
+
+
+def token_texts(tokenizer) -> List[Optional[str]]:
+    """
+    Text of every vocabulary token as it appears mid-sequence (SentencePiece "▁" spaces and
+    <0x..> byte pieces, or GPT-2 style byte-level pieces); None for special tokens, which the
+    grammar never allows. Partial UTF-8 characters come out as U+FFFD.
+    """
+    special = set(tokenizer.all_special_ids)
+    pieces = tokenizer.convert_ids_to_tokens(list(range(len(tokenizer))))
+    byte_level = any(p and "Ġ" in p for p in pieces)
+    decoder = _byte_level_decoder() if byte_level else None
+    texts = []
+    for i, piece in enumerate(pieces):
+        if i in special or piece is None:
+            texts.append(None)
+        elif decoder is not None and all(c in decoder for c in piece):
+            texts.append(bytes(decoder[c] for c in piece).decode("utf-8", errors="replace"))
+        elif _BYTE_PIECE.fullmatch(piece):
+            texts.append(chr(int(_BYTE_PIECE.fullmatch(piece).group(1), 16)))
+        else:
+            texts.append(piece.replace("▁", " "))
+    return texts
+
+
+class AnswerState:
+    """
+    Position of one sequence in the answer grammar.
+    """
+    __slots__ = ("seg", "rest", "options", "note_len", "done")
+
+    def __init__(self):
+        self.seg = -1
+        self.rest = ""          # literal: text still to emit
+        self.options = ()       # choice: remaining text of the values still possible
+        self.note_len = 0
+        self.done = False
+
+
+class AnswerGrammar:
+    def __init__(self, tokenizer, n_steps: int, note_tokens: int = NOTE_TOKENS):
+        self.texts = texts = token_texts(tokenizer)
+        self.by_text = {}
+        for i, t in enumerate(texts):
+            if t and t not in self.by_text:
+                self.by_text[t] = i
+        self.note_ids = [i for i, t in enumerate(texts) if t and not NOTE_FORBIDDEN.intersection(t)]
+        self.segments = [
+            ("choice", (" null",) + tuple(f" {i}" for i in range(1, max(1, n_steps) + 1))),
+            ("literal", ', "status": "'),
+            ("choice", STATUSES),
+            ("literal", '", "note": "'),
+            ("note", None),
+            ("literal", '"}'),
+        ]
+        self.note_tokens = note_tokens
+        self._allowed = {}
+        self._tensors = {}
+
+    def max_new_tokens(self) -> int:
+        """
+        Upper bound of generated tokens (one per character outside the note).
+        """
+        n = self.note_tokens
+        for kind, value in self.segments:
+            if kind == "literal":
+                n += len(value)
+            elif kind == "choice":
+                n += max(len(v) for v in value)
+        return n
+
+    def start(self) -> AnswerState:
+        state = AnswerState()
+        self._enter(state, 0)
+        return state
+
+    def _enter(self, state: AnswerState, seg: int):
+        state.seg = seg
+        if seg >= len(self.segments):
+            state.done = True
+            return
+        kind, value = self.segments[seg]
+        if kind == "literal":
+            state.rest = value
+        elif kind == "choice":
+            state.options = value
+        else:
+            state.note_len = 0
+
+    def _next_literal(self, state: AnswerState) -> str:
+        kind, value = self.segments[state.seg + 1] if state.seg + 1 < len(self.segments) else ("literal", "")
+        return value if kind == "literal" else ""
+
+    def _prefix_ids(self, strings) -> List[int]:
+        # vocabulary tokens that spell a non-empty prefix of one of the strings
+        ids = set()
+        for s in strings:
+            for k in range(1, len(s) + 1):
+                i = self.by_text.get(s[:k])
+                if i is not None:
+                    ids.add(i)
+        return sorted(ids)
+
+    def forced(self, state: AnswerState) -> Optional[int]:
+        """
+        The token to emit when the grammar leaves no choice (longest token of the literal), else None.
+        """
+        if state.done:
+            return None
+        kind = self.segments[state.seg][0]
+        rest = state.rest
+        if kind == "note" and state.note_len >= self.note_tokens:
+            rest = self._next_literal(state)
+        elif kind != "literal":
+            return None
+        for k in range(len(rest), 0, -1):
+            i = self.by_text.get(rest[:k])
+            if i is not None:
+                return i
+        raise ValueError(f"no token spells a prefix of {rest!r}")
+
+    def allowed(self, state: AnswerState) -> List[int]:
+        """
+        Token ids the model may choose from (state must not be forced / done).
+        """
+        kind = self.segments[state.seg][0]
+        key = (kind, state.options) if kind == "choice" else kind
+        ids = self._allowed.get(key)
+        if ids is None:
+            if kind == "choice":
+                ids = self._prefix_ids([o for o in state.options if o])
+                if "" in state.options:   # a complete value that may still go on (" 1" vs " 12")
+                    ids = sorted(set(ids) | set(self._prefix_ids([self._next_literal(state)])))
+            else:
+                ids = sorted(set(self.note_ids) | set(self._prefix_ids([self._next_literal(state)])))
+            self._allowed[key] = ids
+        return ids
+
+    def pick(self, state: AnswerState, logits) -> int:
+        """
+        Greedy choice for one sequence from its next-token logits (1-D torch tensor).
+        """
+        forced = self.forced(state)
+        if forced is not None:
+            return forced
+        kind = self.segments[state.seg][0]
+        key = ((kind, state.options) if kind == "choice" else kind, logits.device)
+        ids = self._tensors.get(key)
+        if ids is None:
+            import torch
+            ids = self._tensors[key] = torch.tensor(self.allowed(state), dtype=torch.long, device=logits.device)
+        return int(ids[int(logits.index_select(0, ids).argmax())])
+
+    def advance(self, state: AnswerState, token_id: int):
+        """
+        Consume the token a sequence emitted.
+        """
+        if state.done:
+            return
+        text = self.texts[token_id] or "" if 0 <= token_id < len(self.texts) else ""
+        kind = self.segments[state.seg][0]
+        if kind == "literal":
+            state.rest = state.rest[len(text):]
+            if not state.rest:
+                self._enter(state, state.seg + 1)
+        elif kind == "choice":
+            longer = tuple(o[len(text):] for o in state.options if o and o.startswith(text))
+            if longer:
+                state.options = longer
+                if longer == ("",):
+                    self._enter(state, state.seg + 1)
+            else:
+                # a complete value followed by the start of the next literal
+                self._enter(state, state.seg + 1)
+                self.advance(state, token_id)
+        elif state.note_len >= self.note_tokens or text.startswith('"'):
+            self._enter(state, state.seg + 1)
+            self.advance(state, token_id)
+        else:
+            state.note_len += 1
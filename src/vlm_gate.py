@@ -0,0 +1,78 @@
+# src/vlm_gate.py
+"""
+Detector-gated VLLM calls: only frames with new evidence go to the (slow) VLLM,
+the rest reuse the answer of the last frame that was sent.
+
+A frame is sent when
+  - it is the first frame,
+  - the set of detected objects changed (an empty frame only counts if call_on_empty),
+  - some object's confidence crossed conf_threshold (in either direction), or
+  - max_gap frames were skipped in a row: a step transition the detector can't see
+    (case opened/closed, LED on) is plausible by then.
+Decisions depend only on detections, so replaying them over cached detections
+gives the same answers (see reverify_from_memo).
+"""
+from dataclasses import asdict, dataclass
+from typing import Optional
+
+from src.object_detector import as_detections
+
+
+@dataclass
+class GatePolicy:
+    enabled: bool = True
+    conf_threshold: float = 0.5
+    max_gap: int = 6
+    call_on_empty: bool = False
+
+    def to_dict(self) -> dict:
+        return asdict(self)
+
+
+class VlmGate:
+    def __init__(self, policy: Optional[GatePolicy] = None):
+        self.policy = policy or GatePolicy()
+        self.prev_labels = None
+        self.prev_conf = {}
+        self.last_called = None   # key of the last frame whose answer is a real VLLM answer
+        self.skipped_in_row = 0
+        self.calls = 0
+        self.skipped = 0
+
+    def _needs_call(self, labels, conf) -> bool:
+        p = self.policy
+        if not p.enabled or self.last_called is None:
+            return True
+        if self.skipped_in_row >= p.max_gap:
+            return True
+        if labels != self.prev_labels and (labels or p.call_on_empty):
+            return True
+        thr = p.conf_threshold
+        for obj in labels | self.prev_labels:
+            if (conf.get(obj, 0.0) >= thr) != (self.prev_conf.get(obj, 0.0) >= thr):
+                return True
+        return False
+
+    def decide(self, key: str, detections) -> Optional[str]:
+        """
+        Returns None if the frame must go to the VLLM, otherwise the key of the
+        earlier frame whose answer it reuses.
+        """
+        conf = as_detections(detections).best_conf()
+        labels = frozenset(conf)
+        call = self._needs_call(labels, conf)
+        self.prev_labels, self.prev_conf = labels, conf
+
+        if call:
+            self.last_called = key
+            self.skipped_in_row = 0
+            self.calls += 1
+            return None
+        self.skipped_in_row += 1
+        self.skipped += 1
+        return self.last_called
+
+    def stats(self) -> dict:
+        total = self.calls + self.skipped
+        return {"frames": total, "vlm_calls": self.calls, "vlm_calls_saved": self.skipped,
+                "saved_ratio": round(self.skipped / total, 3) if total else 0.0}
@@ -0,0 +1,57 @@
+# tests/conftest.py
+import pytest
+
+from src import object_detector
+
+
+@pytest.fixture
+def dummy_detector():
+    """
+    Colour-block stand-in detector (bench_suite.DummyDetector) instead of YOLO weights.
+    """
+    from src.bench_suite import DummyDetector
+    model_path = object_detector.MODEL_PATH
+    object_detector.set_model_factory(lambda: DummyDetector(), "dummy")
+    yield
+    object_detector.set_model_factory(None, model_path)
+
+
+@pytest.fixture(scope="session")
+def tiny_llava():
+    """
+    Random 2-layer LLaVA + byte-level BPE processor (no downloads): exercises the real decoding
+    code paths of vllm_reasoner. Returns (model, processor).
+    """
+    torch = pytest.importorskip("torch")
+    tokenizers = pytest.importorskip("tokenizers")
+    transformers = pytest.importorskip("transformers")
+    from tokenizers import decoders, models, pre_tokenizers, trainers
+
+    bpe = tokenizers.Tokenizer(models.BPE(unk_token="<unk>"))
+    bpe.pre_tokenizer = pre_tokenizers.ByteLevel(add_prefix_space=False)
+    bpe.decoder = decoders.ByteLevel()
+    corpus = ["You are an AI assembly verification assistant. Golden steps: Step 1 case cable earbud open "
+              "close insert left right",
+              '{"detected_step": 1, "status": "done", "note": "ok"} null missing out_of_order uncertain '
+              "USER ASSISTANT Evidence none conf"] * 50
+    bpe.train_from_iterator(corpus, trainers.BpeTrainer(
+        vocab_size=400, special_tokens=["<unk>", "<s>", "</s>", "<pad>", "<image>"],
+        initial_alphabet=pre_tokenizers.ByteLevel.alphabet()))
+    tok = transformers.PreTrainedTokenizerFast(tokenizer_object=bpe, unk_token="<unk>", bos_token="<s>",
+                                               eos_token="</s>", pad_token="<pad>",
+                                               extra_special_tokens={"image_token": "<image>"})
+    image_processor = transformers.CLIPImageProcessor(size={"shortest_edge": 28},
+                                                      crop_size={"height": 28, "width": 28})
+    processor = transformers.LlavaProcessor(image_processor=image_processor, tokenizer=tok, patch_size=14,
+                                            vision_feature_select_strategy="default",
+                                            num_additional_image_tokens=1)
+    config = transformers.LlavaConfig(
+        vision_config=transformers.CLIPVisionConfig(hidden_size=32, intermediate_size=64, num_hidden_layers=2,
+                                                    num_attention_heads=2, image_size=28, patch_size=14),
+        text_config=transformers.LlamaConfig(hidden_size=32, intermediate_size=64, num_hidden_layers=2,
+                                             num_attention_heads=2, num_key_value_heads=2, vocab_size=len(tok),
+                                             max_position_embeddings=2048),
+        image_token_index=tok.convert_tokens_to_ids("<image>"), vision_feature_layer=-1)
+    torch.manual_seed(0)
+    model = transformers.LlavaForConditionalGeneration(config).eval()
+    return model, processor
@@ -0,0 +1,36 @@
+# tests/test_alignment.py
+import numpy as np
+import pytest
+
+from src.alignment import banded_dtw
+
+
+def _full_dtw(a, b):
+    n, m = len(a), len(b)
+    d = np.full((n + 1, m + 1), np.inf)
+    d[0, 0] = 0.0
+    for i in range(n):
+        for j in range(m):
+            d[i + 1, j + 1] = np.abs(a[i] - b[j]).sum() + min(d[i, j], d[i, j + 1], d[i + 1, j])
+    return d[n, m]
+
+
+@pytest.mark.parametrize("n, m", [(12, 12), (9, 20), (25, 7)])
+def test_wide_band_matches_full_dtw(n, m):
+    rng = np.random.RandomState(n * 100 + m)
+    a, b = rng.rand(n, 3), rng.rand(m, 3)
+    path, costs, total = banded_dtw(a, b, band=max(n, m))
+    assert total == pytest.approx(_full_dtw(a, b))
+    assert costs.sum() == pytest.approx(total)
+    assert tuple(path[0]) == (0, 0) and tuple(path[-1]) == (n - 1, m - 1)
+    steps = np.diff(path, axis=0)
+    assert ((steps >= 0) & (steps <= 1)).all() and (steps.sum(axis=1) >= 1).all()
+
+
+def test_time_shifted_copy_aligns_on_the_shift():
+    a = np.zeros((30, 2))
+    a[10:15, 0] = 1.0
+    b = np.roll(a, 3, axis=0)
+    path, costs, total = banded_dtw(a, b, band=5)
+    assert total == 0.0
+    assert {(i, j) for i, j in path if a[i, 0]} == {(i, i + 3) for i in range(10, 15)}
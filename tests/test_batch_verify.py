@@ -0,0 +1,58 @@
+# tests/test_batch_verify.py
+import json
+import os
+
+from src.batch_verify import LEDGER_NAME, run_batch
+from src.bench_suite import make_synthetic_video
+from src.pipeline import GOLDEN_STEPS
+
+
+def _dummy_worker():
+    # runs in every (spawned) worker process instead of loading YOLO weights
+    from src import object_detector, vllm_reasoner
+    from src.bench_suite import DummyDetector
+    object_detector.set_model_factory(lambda: DummyDetector(), "dummy")
+    vllm_reasoner.set_simulation(0)
+
+
+def _ledger_lines(out_root):
+    with open(os.path.join(out_root, LEDGER_NAME), encoding="utf-8") as f:
+        return [json.loads(line) for line in f]
+
+
+def test_rerun_retries_failed_and_changed_videos_only(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    good = make_synthetic_video(str(tmp_path / "good.mp4"), seconds=2, fps=10, size=(320, 180))
+    bad = str(tmp_path / "bad.mp4")
+    with open(bad, "wb") as f:
+        f.write(b"not a video")
+    videos = sorted([os.path.abspath(good), os.path.abspath(bad)])
+
+    def run():
+        before = len(_ledger_lines("out")) if os.path.exists(os.path.join("out", LEDGER_NAME)) else 0
+        summary = run_batch(videos, "out", GOLDEN_STEPS, workers=1, initializer=_dummy_worker,
+                            every_n_frames=2, use_cache=False)
+        return summary, {(e["video"], e["status"]) for e in _ledger_lines("out")[before:]}
+
+    summary, ran = run()
+    assert ran == {(os.path.abspath(good), "ok"), (os.path.abspath(bad), "failed")}
+    assert (summary["verified"], summary["failed_to_run"]) == (1, 1)
+
+    # only the failed video is retried
+    summary, ran = run()
+    assert ran == {(os.path.abspath(bad), "failed")}
+
+    # a replaced file (new size / mtime) is verified again, the finished one is still skipped
+    make_synthetic_video(bad, seconds=1, fps=10, size=(320, 180))
+    summary, ran = run()
+    assert ran == {(os.path.abspath(bad), "ok")}
+    assert (summary["verified"], summary["failed_to_run"], summary["pending"]) == (2, 0, 0)
+
+    # same size, new mtime: re-verified
+    st = os.stat(good)
+    os.utime(good, ns=(st.st_atime_ns, st.st_mtime_ns + 10 ** 9))
+    summary, ran = run()
+    assert ran == {(os.path.abspath(good), "ok")}
+
+    summary, ran = run()
+    assert ran == set()
@@ -0,0 +1,58 @@
+# tests/test_bench_suite.py
+import copy
+import json
+import os
+import subprocess
+import sys
+
+from src.bench_suite import SCENARIOS, compare_to_baseline, run_scenario
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+BASELINE = os.path.join(ROOT, "benchmarks", "baseline.json")
+
+
+def _baseline():
+    with open(BASELINE, encoding="utf-8") as f:
+        return json.load(f)
+
+
+def test_committed_baseline_matches_the_cli_defaults():
+    baseline = _baseline()
+    # python -m src.bench_suite without flags compares against it instead of reporting a config change
+    assert baseline["config"] == {"detect_ms": 5.0, "vlm_ms": 2.0, "seed": 0, "repeats": 3}
+    assert sorted(baseline["scenarios"]) == sorted(SCENARIOS)
+
+
+def test_outputs_match_the_baseline(tmp_path, monkeypatch, dummy_detector):
+    monkeypatch.chdir(tmp_path)       # synthetic videos render under ./.cache/bench
+    current = run_scenario("stride8_sequential")
+    assert current["result_hash"] == _baseline()["scenarios"]["stride8_sequential"]["result_hash"]
+
+
+def test_compare_flags_regressions():
+    baseline = _baseline()
+    assert compare_to_baseline(baseline, baseline) == []
+
+    slower = copy.deepcopy(baseline)
+    slower["scenarios"]["adaptive"]["fps"] *= 0.5
+    slower["scenarios"]["adaptive"]["result_hash"] = "0" * 16
+    problems = compare_to_baseline(slower, baseline)
+    assert len(problems) == 2 and all(p.startswith("adaptive: ") for p in problems)
+
+    other = dict(baseline, config=dict(baseline["config"], repeats=1))
+    assert len(compare_to_baseline(other, baseline)) == 1
+
+
+def test_save_baseline_then_compare(tmp_path):
+    path = str(tmp_path / "baseline.json")
+    env = dict(os.environ, PYTHONPATH=ROOT)
+    cmd = [sys.executable, "-m", "src.bench_suite", "--scenarios", "adaptive", "--repeats", "1", "--baseline", path]
+    subprocess.run(cmd + ["--save_baseline"], cwd=tmp_path, env=env, check=True, capture_output=True)
+    with open(path, encoding="utf-8") as f:
+        saved = json.load(f)
+    assert list(saved["scenarios"]) == ["adaptive"]
+    assert saved["scenarios"]["adaptive"]["result_hash"] == _baseline()["scenarios"]["adaptive"]["result_hash"]
+
+    # a different config is reported instead of compared
+    out = subprocess.run(cmd + ["--vlm_ms", "0"], cwd=tmp_path, env=env, capture_output=True, text=True)
+    assert out.returncode == 1 and "re-record it" in out.stdout
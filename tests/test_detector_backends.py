@@ -0,0 +1,103 @@
+# tests/test_detector_backends.py
+import numpy as np
+import pytest
+
+from src.detector_backends import decode_yolov8, letterbox, nms
+
+N_CLASSES = 80
+
+
+def _head_output(rows, n_anchors=200, seed=0):
+    """
+    YOLOv8 head output (4 + classes, anchors): low-score noise plus rows of (cx, cy, w, h, cls, score).
+    """
+    rng = np.random.RandomState(seed)
+    out = np.zeros((4 + N_CLASSES, n_anchors), np.float32)
+    out[:4] = rng.uniform(20, 600, (4, n_anchors))
+    out[4:] = rng.uniform(0, 0.2, (N_CLASSES, n_anchors))
+    for a, (cx, cy, w, h, cls, score) in enumerate(rows):
+        out[:4, a] = cx, cy, w, h
+        out[4:, a] = 0.0
+        out[4 + cls, a] = score
+    return out
+
+
+def test_decode_known_boxes():
+    # 640x480 frame letterboxed to 640: scale 1, 80 px pad on top
+    rows = [(100, 180, 40, 40, 67, 0.9),     # cell phone
+            (104, 182, 40, 40, 67, 0.7),     # its duplicate: suppressed
+            (102, 181, 40, 40, 65, 0.6),     # same place, other class: kept
+            (400, 300, 80, 20, 62, 0.8)]     # tv
+    xyxy, conf, cls = decode_yolov8(_head_output(rows), 1.0, (0, 80), (480, 640), conf_threshold=0.25)
+    assert cls.tolist() == [67, 62, 65]
+    assert conf.tolist() == pytest.approx([0.9, 0.8, 0.6])
+    assert xyxy[:2].tolist() == [[80, 80, 120, 120], [360, 210, 440, 230]]
+
+    xyxy, conf, cls = decode_yolov8(_head_output(rows), 1.0, (0, 80), (480, 640), classes=[62])
+    assert cls.tolist() == [62]
+
+
+def test_nms_is_class_aware():
+    boxes = np.array([[0, 0, 10, 10], [1, 1, 11, 11], [0, 0, 10, 10]], np.float64)
+    keep = nms(boxes, np.array([0.9, 0.8, 0.7]), np.array([0, 0, 1]), 0.5)
+    assert keep.tolist() == [0, 2]
+
+
+def test_decode_matches_ultralytics_postprocessing():
+    torch = pytest.importorskip("torch")
+    ops = pytest.importorskip("ultralytics.utils.ops")
+    try:
+        from ultralytics.utils.nms import non_max_suppression
+    except ImportError:   # older Ultralytics
+        non_max_suppression = ops.non_max_suppression
+    frame = np.zeros((360, 500, 3), np.uint8)
+    _, scale, pad = letterbox(frame, 640)
+    rng = np.random.RandomState(1)
+    rows = [(rng.uniform(100, 540), rng.uniform(150, 490), rng.uniform(20, 120), rng.uniform(20, 120),
+             int(rng.choice([62, 65, 67])), rng.uniform(0.3, 0.95)) for _ in range(60)]
+    out = _head_output(rows, n_anchors=400, seed=1)
+
+    xyxy, conf, cls = decode_yolov8(out, scale, pad, frame.shape, conf_threshold=0.25, iou_threshold=0.45)
+    ref = non_max_suppression(torch.from_numpy(out[None]), conf_thres=0.25, iou_thres=0.45)[0].numpy()
+    ref[:, :4] = ops.scale_boxes((640, 640), ref[:, :4].copy(), frame.shape, ratio_pad=((scale, scale), pad))
+
+    ours = sorted(zip(cls.tolist(), np.round(conf, 4).tolist(), np.round(xyxy, 2).tolist()))
+    theirs = sorted(zip(ref[:, 5].astype(int).tolist(), np.round(ref[:, 4], 4).tolist(),
+                        np.round(ref[:, :4], 2).tolist()))
+    assert len(ours) == len(theirs) > 10
+    for (c1, s1, b1), (c2, s2, b2) in zip(ours, theirs):
+        assert c1 == c2 and s1 == pytest.approx(s2) and b1 == pytest.approx(b2, abs=0.05)
+
+
+@pytest.mark.parametrize("shape", [(480, 640), (360, 500), (720, 1280)])
+def test_letterbox_matches_ultralytics(shape):
+    augment = pytest.importorskip("ultralytics.data.augment")
+    frame = np.random.RandomState(0).randint(0, 255, shape + (3,), np.uint8)
+    ours, scale, pad = letterbox(frame, 640)
+    theirs = augment.LetterBox((640, 640), auto=False)(image=frame)
+    assert scale == pytest.approx(min(640 / shape[0], 640 / shape[1]))
+    assert np.abs(ours.astype(int) - theirs.astype(int)).max() <= 1
+
+
+class _FakeYolo:
+    # writes <weights>.onnx like Ultralytics' exporter, whatever the precision
+    def __init__(self, weights):
+        self.weights = weights
+
+    def export(self, half=False, **kwargs):
+        path = self.weights.replace(".pt", ".onnx")
+        with open(path, "w") as f:
+            f.write("fp16" if half else "fp32")
+        return path
+
+
+def test_fp16_export_keeps_the_fp32_export(tmp_path, monkeypatch):
+    ultralytics = pytest.importorskip("ultralytics")
+    from src.detector_backends import export_onnx
+    monkeypatch.setattr(ultralytics, "YOLO", _FakeYolo)
+    weights = str(tmp_path / "yolov8n.pt")
+    fp32 = export_onnx(weights)
+    fp16 = export_onnx(weights, half=True)
+    assert fp16.endswith("_fp16.onnx")
+    assert open(fp32).read() == "fp32" and open(fp16).read() == "fp16"
+    assert sorted(p.name for p in tmp_path.iterdir()) == ["yolov8n.onnx", "yolov8n_fp16.onnx"]
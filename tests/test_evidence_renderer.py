@@ -0,0 +1,24 @@
+# tests/test_evidence_renderer.py
+import cv2
+import numpy as np
+
+from src.evidence_renderer import EvidenceRenderer
+
+
+def test_box_variants_are_written_to_separate_files(tmp_path):
+    video = str(tmp_path / "clip.mp4")
+    writer = cv2.VideoWriter(video, cv2.VideoWriter_fourcc(*"mp4v"), 10, (160, 120))
+    for i in range(10):
+        writer.write(np.full((120, 160, 3), 40 + i * 10, np.uint8))
+    writer.release()
+
+    verification = {"1": {"status": "done", "evidence_frame": "frame_0004.jpg"}}
+    detections = {"frame_0004.jpg": [{"object": "case", "confidence": 0.9, "box": [20, 60, 100, 110]}]}
+    renderer = EvidenceRenderer(video, verification, {"frame_0004.jpg": {"index": 4, "timestamp": 0.4}},
+                                detections, str(tmp_path / "out"))
+    with_boxes = renderer.annotated_path("1")
+    plain = renderer.annotated_path("1", boxes=False)
+    assert with_boxes != plain
+    assert renderer.annotated_path("1") == with_boxes
+    # the earlier path still holds the boxed image
+    assert np.abs(cv2.imread(with_boxes).astype(int) - cv2.imread(plain).astype(int)).max() > 100
@@ -0,0 +1,32 @@
+# tests/test_frame_extractor.py
+from collections import Counter
+
+import cv2
+import numpy as np
+
+from src.frame_extractor import iter_frames_adaptive
+
+
+def _burst_video(path, seconds=8, fps=10, burst=(4, 5), size=(160, 120)):
+    # static workstation; during the burst second a block flickers on and off every frame
+    w, h = size
+    writer = cv2.VideoWriter(path, cv2.VideoWriter_fourcc(*"mp4v"), fps, (w, h))
+    background = np.random.default_rng(0).integers(90, 140, size=(h, w, 3), dtype=np.uint8)
+    for i in range(seconds * fps):
+        frame = background.copy()
+        if burst[0] * fps <= i < burst[1] * fps and i % 2 == 0:
+            cv2.rectangle(frame, (20, 20), (140, 100), (255, 255, 255), -1)
+        writer.write(frame)
+    writer.release()
+    return path
+
+
+def test_change_burst_is_sampled_densely(tmp_path):
+    video = _burst_video(str(tmp_path / "burst.mp4"))
+    picked = [idx for idx, _, _ in iter_frames_adaptive(video, max_per_second=4, min_per_second=1, probe_every=1)]
+    per_second = Counter(idx // 10 for idx in picked)
+    assert picked == sorted(picked)
+    assert per_second[4] == 4                       # the burst gets the full per-second budget
+    # idle seconds keep min_per_second (second 0 also has the always-sampled first frame)
+    assert [per_second[s] for s in (1, 2, 3, 6, 7)] == [1] * 5
+    assert per_second[0] == 2
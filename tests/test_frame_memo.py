@@ -0,0 +1,31 @@
+# tests/test_frame_memo.py
+from src import vllm_reasoner
+from src.frame_memo import FrameMemo
+from src.pipeline import GOLDEN_STEPS
+from src.vllm_reasoner import answer_id
+
+
+def test_simulated_answers_are_shared_across_step_lists():
+    assert answer_id(GOLDEN_STEPS, False, "det") == answer_id(GOLDEN_STEPS[:-1], False, "det")
+
+
+def test_real_answers_depend_on_the_prompt_and_step_count(monkeypatch):
+    six, seven = GOLDEN_STEPS, GOLDEN_STEPS + ["Step 7: Put the case in the box"]
+    reworded = GOLDEN_STEPS[:-1] + ["Step 6: Plug in the charging cable"]
+    ids = {answer_id(steps, True, "det") for steps in (six, seven, reworded)}
+    assert len(ids) == 3
+    assert answer_id(six, True, "det") != answer_id(six, True, "other-det")
+    # same prompt text, other step count: the constrained grammar allows other step numbers
+    monkeypatch.setattr(vllm_reasoner, "prompt_prefix", lambda steps: "fixed prompt")
+    assert answer_id(six, True, "det") != answer_id(seven, True, "det")
+    monkeypatch.undo()
+    monkeypatch.setattr(vllm_reasoner, "CONSTRAINED_DECODING", False)
+    assert answer_id(six, True, "det") not in ids
+
+
+def test_memo_does_not_replay_answers_of_another_step_list(tmp_path):
+    memo = FrameMemo(str(tmp_path / "memo.sqlite"))
+    six, seven = GOLDEN_STEPS, GOLDEN_STEPS + ["Step 7: Put the case in the box"]
+    memo.put_answers({"h1": '{"detected_step": 6, "status": "done", "note": ""}'}, answer_id(six, True, "det"))
+    assert memo.get_answers(["h1"], answer_id(six, True, "det"))
+    assert memo.get_answers(["h1"], answer_id(seven, True, "det")) == {}
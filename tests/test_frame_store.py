@@ -0,0 +1,83 @@
+# tests/test_frame_store.py
+import json
+
+import numpy as np
+
+from src import vllm_reasoner
+from src.bench_suite import make_synthetic_video
+from src.frame_extractor import frame_name
+from src.frame_store import FrameStore, load_result, write_frame_store
+from src.object_detector import Detections
+from src.pipeline import GOLDEN_STEPS, run_pipeline
+
+
+def _store(tmp_path, detections=None, answers=None, n=6):
+    # frames every 0.5 s: frame_0000 @ 0.0, frame_0005 @ 0.5, ...
+    meta = {frame_name(5 * i): {"index": 5 * i, "timestamp": 0.5 * i} for i in range(n)}
+    path = write_frame_store(str(tmp_path / "frames"), meta, detections or {}, answers or {})
+    return FrameStore(path), list(meta)
+
+
+def _lists(detections):
+    return {k: d.to_list() for k, d in detections.items()}
+
+
+def test_round_trip_matches_the_in_memory_result(tmp_path, monkeypatch, dummy_detector):
+    monkeypatch.chdir(tmp_path)
+    video = make_synthetic_video(str(tmp_path / "clip.mp4"), seconds=4, fps=10, size=(320, 180))
+    vllm_reasoner.set_simulation(0)
+    result = run_pipeline(video, "out", GOLDEN_STEPS, every_n_frames=2, use_cache=False)
+
+    loaded = load_result("out")
+    assert loaded["frames"] == result["frames"]
+    assert loaded["timestamps"] == result["timestamps"]
+    assert loaded["vllm_texts"] == result["vllm_texts"]
+    assert _lists(loaded["detections"]) == _lists(result["detections"])
+    assert any(len(d) for d in loaded["detections"].values())
+    assert loaded["verification"] == json.loads(json.dumps(result["verification"]))
+
+
+def test_query_bounds_are_half_open(tmp_path):
+    store, keys = _store(tmp_path)
+    assert store.query(0.5, 1.0)["frames"] == [keys[1]]
+    assert store.query(0.5, 1.01)["frames"] == keys[1:3]
+    assert store.query(None, None)["frames"] == keys
+    assert store.query(2.5)["frames"] == [keys[5]]
+    assert store.query(None, 0.0)["frames"] == []
+    assert store.query(1.0, 1.0)["frames"] == []
+    assert store.query(2.0, 1.0)["frames"] == []
+    empty = store.query(10.0, 20.0)
+    assert empty == {"frames": [], "timestamps": {}, "detections": {}, "vllm_texts": {}}
+
+
+def test_frames_without_detections(tmp_path):
+    store, keys = _store(tmp_path)
+    assert store.meta["detections"] == 0
+    out = store.query()
+    assert [len(d) for d in out["detections"].values()] == [0] * len(keys)
+    assert out["vllm_texts"] == {k: "" for k in keys}
+
+    dets = {keys[2]: Detections.from_list([{"object": "case", "confidence": 0.9, "box": [1, 2, 3, 4]},
+                                           {"object": "cable", "confidence": 0.5}])}
+    store, keys = _store(tmp_path, detections=dets)
+    out = store.query(0.5, 1.5)["detections"]
+    assert [len(out[k]) for k in keys[1:3]] == [0, 2]
+    assert out[keys[2]].to_list() == dets[keys[2]].to_list()
+
+
+def test_answers_are_stored_once(tmp_path):
+    texts = ["Case opened fully.", "Case opened fully.", "Étui fermé ✅", "", "Case opened fully.", "Étui fermé ✅"]
+    store, keys = _store(tmp_path, answers=dict(zip(map(frame_name, range(0, 30, 5)), texts)))
+    assert store.meta["answers"] == 3
+    assert list(store.query()["vllm_texts"].values()) == texts
+    assert store.query(1.0, 2.0)["vllm_texts"] == {keys[2]: "Étui fermé ✅", keys[3]: ""}
+
+
+def test_monolithic_result_files_load_as_they_are(tmp_path):
+    old = {"video": "clip.mp4", "frames": ["frame_0000.jpg"], "timestamps": {"frame_0000.jpg": 0.0},
+           "vllm_texts": {"frame_0000.jpg": "Case opened fully."},
+           "detections": {"frame_0000.jpg": [{"object": "case", "confidence": 0.9}]},
+           "verification": {"1": {"status": "done"}}}
+    (tmp_path / "verification_result.json").write_text(json.dumps(old), encoding="utf-8")
+    assert load_result(str(tmp_path)) == old
+    assert load_result(str(tmp_path / "verification_result.json"), 5.0, 6.0) == old
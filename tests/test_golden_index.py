@@ -0,0 +1,49 @@
+# tests/test_golden_index.py
+import json
+import os
+
+import numpy as np
+
+from src import vllm_reasoner
+from src.bench_suite import make_synthetic_video
+from src.golden_index import build_index, list_indexes, load_index
+from src.pipeline import GOLDEN_STEPS, run_pipeline
+
+
+def _run(video, out_dir, seed, **kwargs):
+    vllm_reasoner.set_simulation(seed)
+    return run_pipeline(video, out_dir, GOLDEN_STEPS, every_n_frames=2, use_cache=False, **kwargs)
+
+
+def test_build_load_compare_round_trip(tmp_path, monkeypatch, dummy_detector):
+    monkeypatch.chdir(tmp_path)
+    golden_video = make_synthetic_video(str(tmp_path / "golden.mp4"), seconds=6, fps=10, size=(320, 180))
+    test_video = make_synthetic_video(str(tmp_path / "test.mp4"), seconds=5, fps=10, size=(320, 180))
+    golden = _run(golden_video, "out_golden", 0)
+
+    root = str(tmp_path / "idx")
+    os.makedirs(os.path.join(root, f"earbuds.tmp{os.getpid()}"))      # left over by a crashed build
+    path = build_index(golden, "earbuds", GOLDEN_STEPS, root=root)
+    assert sorted(os.listdir(root)) == ["earbuds"] and list_indexes(root) == ["earbuds"]
+
+    index = load_index("earbuds", root)
+    assert load_index(path) is index                                   # cached per process
+    assert isinstance(index.features, np.memmap) and len(index.times) == len(golden["frames"])
+    assert index.meta["status"] == {s: v["status"] for s, v in golden["verification"].items()}
+
+    # same comparison as against out_golden/verification_result.json, without reading it
+    from_json = _run(test_video, "out_json", 1)
+    from_index = _run(test_video, "out_index", 1, golden_index=path)
+    for step, info in from_json["verification"].items():
+        indexed = from_index["verification"][step]
+        assert {k: indexed[k] for k in info} == info
+        assert indexed["golden_status"] == golden["verification"][step]["status"]
+    assert from_index["alignment"] == from_json["alignment"]
+
+    # rebuilding swaps the directory and drops the cached index
+    build_index(dict(golden, frames=golden["frames"][:10]), "earbuds", GOLDEN_STEPS, root=root)
+    rebuilt = load_index("earbuds", root)
+    assert rebuilt is not index and rebuilt.meta["frames"] == 10
+    assert sorted(os.listdir(root)) == ["earbuds"]
+    with open(os.path.join(path, "meta.json"), encoding="utf-8") as f:
+        assert json.load(f)["frames"] == 10
@@ -0,0 +1,72 @@
+# tests/test_job_runner.py
+import io
+import json
+import os
+import time
+
+from src.bench_suite import make_synthetic_video
+from src.job_runner import JobRunner, save_upload
+
+
+def _dummy_worker(latency_ms=0.0):
+    # runs in every (spawned) worker process: no YOLO weights or VLLM there either
+    from src import object_detector, vllm_reasoner
+    from src.bench_suite import DummyDetector
+    object_detector.set_model_factory(lambda: DummyDetector(), "dummy")
+    vllm_reasoner.set_simulation(0, latency_ms)
+
+
+def _wait(jobs, timeout=180):
+    deadline = time.time() + timeout
+    while any(job.status in ("queued", "running") for job in jobs):
+        assert time.time() < deadline, [job.snapshot() for job in jobs]
+        time.sleep(0.1)
+    time.sleep(0.5)   # let the last progress events arrive
+
+
+def test_parallel_jobs_keep_their_own_progress_and_timings(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    short = make_synthetic_video(str(tmp_path / "short.mp4"), seconds=3, fps=10, size=(320, 180))
+    long = make_synthetic_video(str(tmp_path / "long.mp4"), seconds=6, fps=10, size=(320, 180))
+    runner = JobRunner(workers=2, warmup=False, initializer=_dummy_worker, initargs=(20.0,),
+                       every_n_frames=2, use_cache=False)
+    try:
+        jobs = [runner.submit(short, "out_short"), runner.submit(long, "out_long")]
+        _wait(jobs)
+    finally:
+        runner.shutdown()
+
+    assert [job.total for job in jobs] == [15, 30]
+    for job in jobs:
+        assert job.status == "done", job.error
+        assert job.counts["decode"] == job.counts["vlm"] == job.total
+        assert len(job.result["frames"]) == job.total
+        # stage timers belong to the worker running the job, not to a process shared with the other one
+        with open(os.path.join(job.out_dir, "timing_summary.json"), encoding="utf-8") as f:
+            timing = json.load(f)
+        assert timing["stages"]["decode"]["items"] == job.total
+        assert timing["counters"]["frames"] == job.total
+
+
+def test_uploaded_copies_are_removed_when_jobs_finish(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    video = make_synthetic_video(str(tmp_path / "clip.mp4"), seconds=2, fps=10, size=(320, 180))
+    with open(video, "rb") as f:
+        good = io.BytesIO(f.read())
+    good.name = "clip.mp4"
+    bad = io.BytesIO(b"not a video")
+    bad.name = "broken.mp4"
+    uploads = os.path.join("data", "uploads")
+    runner = JobRunner(warmup=False, initializer=_dummy_worker, every_n_frames=2, use_cache=False)
+    try:
+        jobs = [runner.submit(save_upload(good, uploads), "out_good", remove_video=True),
+                runner.submit(save_upload(bad, uploads), "out_bad", remove_video=True),
+                runner.submit(video, "out_kept")]
+        _wait(jobs)
+    finally:
+        runner.shutdown()
+
+    assert [job.status for job in jobs] == ["done", "failed", "done"]
+    assert jobs[1].error
+    assert os.listdir(uploads) == []
+    assert os.path.exists(video)
@@ -0,0 +1,70 @@
+# tests/test_object_detector.py
+from types import SimpleNamespace
+
+import cv2
+import numpy as np
+
+from src.bench_suite import make_synthetic_video
+from src.object_detector import (LABELS, Detections, _remap_detections, as_detections, detect_objects,
+                                 detect_objects_batch)
+
+COCO_NAMES = {0: "person", 39: "bottle", 64: "mouse", 65: "remote", 67: "cell phone", 63: "laptop"}
+
+
+def test_to_list_from_list_round_trip():
+    items = [{"object": "case", "confidence": 0.91, "box": [10.0, 20.0, 110.0, 220.5]},
+             {"object": "cable", "confidence": 0.4, "box": [0.0, 0.0, 5.0, 5.0]}]
+    dets = Detections.from_list(items)
+    assert dets.labels is LABELS
+    assert dets.objects() == ["case", "cable"]
+    assert dets.to_list() == items
+    assert Detections.from_list(dets.to_list()).to_list() == items
+
+
+def test_legacy_entries_without_box():
+    items = [{"object": "case", "confidence": 0.9}, {"object": "left_earbud", "confidence": 0.7,
+                                                     "box": [1.0, 2.0, 3.0, 4.0]}]
+    dets = Detections.from_list(items)
+    assert np.isnan(dets.box[0]).all() and dets.box.dtype == np.float32
+    assert dets.to_list() == items
+
+    # names outside LABELS (older caches) extend the label tuple instead of failing
+    old = Detections.from_list([{"object": "screwdriver", "confidence": 0.8}])
+    assert old.objects() == ["screwdriver"] and old.labels[:len(LABELS)] == LABELS
+
+
+def test_empty_frame():
+    for dets in (Detections(), Detections.from_list([]), as_detections(None)):
+        assert len(dets) == 0 and dets.box.shape == (0, 4)
+        assert dets.to_list() == [] and dets.best_conf() == {} and dets.object_set() == frozenset()
+
+
+def test_lut_remap_drops_classes_outside_the_class_map():
+    boxes = SimpleNamespace(cls=np.array([0, 67, 39, 65, 64, 99, 63]),
+                            conf=np.array([0.99, 0.8, 0.9, 0.6, 0.3, 0.9, 0.7]),
+                            xyxy=np.arange(28, dtype=np.float64).reshape(7, 4) + 0.04)
+    dets = _remap_detections(SimpleNamespace(boxes=boxes), 0.5, COCO_NAMES)
+    # person / bottle are not in CLASS_MAP, 99 is not a class of the model, mouse is below the threshold
+    assert dets.objects() == ["case", "left_earbud", "case"]
+    assert dets.conf.tolist() == np.float32([0.8, 0.6, 0.7]).tolist()
+    assert dets.box.tolist() == [[4.0, 5.0, 6.0, 7.0], [12.0, 13.0, 14.0, 15.0], [24.0, 25.0, 26.0, 27.0]]
+    assert dets.best_conf() == {"case": np.float32(0.8), "left_earbud": np.float32(0.6)}
+
+    none = SimpleNamespace(boxes=SimpleNamespace(cls=np.zeros(0), conf=np.zeros(0), xyxy=np.zeros((0, 4))))
+    assert len(_remap_detections(none, 0.5, COCO_NAMES)) == 0
+
+
+def test_batched_detection_matches_single_frames(tmp_path, dummy_detector):
+    cap = cv2.VideoCapture(make_synthetic_video(str(tmp_path / "clip.mp4"), seconds=3, fps=10, size=(320, 180)))
+    frames = []
+    ok, frame = cap.read()
+    while ok:
+        frames.append(frame)
+        ok, frame = cap.read()
+    cap.release()
+    inputs = frames[::3] + [str(tmp_path / "missing.jpg")]
+
+    single = [detect_objects(f).to_list() for f in inputs]
+    assert any(single) and single[-1] == []
+    for batch_size in (1, 4, 16):
+        assert [d.to_list() for d in detect_objects_batch(inputs, batch_size=batch_size)] == single
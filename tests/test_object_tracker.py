@@ -0,0 +1,40 @@
+# tests/test_object_tracker.py
+import numpy as np
+
+from src.object_detector import Detections
+from src.object_tracker import ObjectTracker
+
+
+def _case_at(x):
+    return Detections.from_list([{"object": "case", "confidence": 0.9, "box": [x, 10, x + 40, 50]}])
+
+
+def test_tracked_boxes_follow_constant_velocity():
+    tracker = ObjectTracker(detect_every=4, alpha=1.0, beta=1.0)
+    first = tracker.step("frame_0000.jpg", 0, _case_at(0))
+    tracker.step("frame_0004.jpg", 4, _case_at(20))     # 5 px per frame
+    between = tracker.step("frame_0006.jpg", 6)
+    assert between.tracked and between.objects() == ["case"]
+    assert between.track.tolist() == first.track.tolist()
+    assert np.allclose(between.box[0], [30, 10, 70, 50])
+
+
+def test_detection_schedule():
+    tracker = ObjectTracker(detect_every=3)
+    assert tracker.plan([False] * 7) == [0, 3, 6]
+    assert tracker.plan([False, True, False, False, False]) == [0, 4]   # cached frame 1 resets the schedule
+    tracker.step("frame_0000.jpg", 0, _case_at(0))
+    assert not tracker.wants_detection()
+    tracker.step("frame_0001.jpg", 1)
+    assert not tracker.wants_detection()
+    tracker.step("frame_0002.jpg", 2)
+    assert tracker.wants_detection()
+
+
+def test_lost_object_is_dropped_after_max_missed():
+    tracker = ObjectTracker(detect_every=1, max_missed=1)
+    tracker.step("frame_0000.jpg", 0, _case_at(0))
+    for t in (1, 2):
+        tracker.step(f"frame_{t:04d}.jpg", t, Detections())
+    assert len(tracker.step("frame_0003.jpg", 3)) == 0
+    assert [t["frames"] for t in tracker.tracks()] == [["frame_0000.jpg"]]
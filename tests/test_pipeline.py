@@ -0,0 +1,20 @@
+# tests/test_pipeline.py
+import json
+import os
+
+from src import vllm_reasoner
+from src.bench_suite import make_synthetic_video
+from src.pipeline import GOLDEN_STEPS, run_pipeline
+
+
+def test_tracked_run_after_cached_plain_run_writes_tracks(tmp_path, monkeypatch, dummy_detector):
+    monkeypatch.chdir(tmp_path)       # stage cache + frame memo live under ./.cache
+    video = make_synthetic_video(str(tmp_path / "clip.mp4"), seconds=4, fps=10, size=(320, 180))
+    vllm_reasoner.set_simulation(0)
+    run_pipeline(video, "out_plain", GOLDEN_STEPS, every_n_frames=2)
+
+    result = run_pipeline(video, "out_tracked", GOLDEN_STEPS, every_n_frames=2, track_every=3)
+    assert os.path.exists(os.path.join("out_tracked", "tracks.json"))
+    assert "motion_events" in result
+    with open(os.path.join("out_tracked", "tracks.json"), encoding="utf-8") as f:
+        assert json.load(f)
@@ -0,0 +1,28 @@
+# tests/test_pipelined_executor.py
+import pytest
+
+from src import vllm_reasoner
+from src.bench_suite import make_synthetic_video
+from src.pipeline import GOLDEN_STEPS, run_pipeline
+
+
+def _lists(detections):
+    return {k: d.to_list() for k, d in detections.items()}
+
+
+@pytest.mark.parametrize("detect_workers", [1, 3])
+def test_pipelined_matches_sequential(tmp_path, monkeypatch, dummy_detector, detect_workers):
+    monkeypatch.chdir(tmp_path)
+    video = make_synthetic_video(str(tmp_path / "clip.mp4"), seconds=6, fps=10, size=(320, 180))
+    runs = {}
+    for executor in ("sequential", "pipelined"):
+        vllm_reasoner.set_simulation(0)
+        runs[executor] = run_pipeline(video, f"out_{executor}", GOLDEN_STEPS, every_n_frames=2, use_cache=False,
+                                      detect_batch_size=4, executor=executor, detect_workers=detect_workers)
+    seq, pipe = runs["sequential"], runs["pipelined"]
+    assert pipe["frames"] == seq["frames"]
+    assert pipe["timestamps"] == seq["timestamps"]
+    assert _lists(pipe["detections"]) == _lists(seq["detections"])
+    assert pipe["vllm_texts"] == seq["vllm_texts"]
+    assert pipe["verification"] == seq["verification"]
+    assert pipe["vlm_gate"] == seq["vlm_gate"]
@@ -0,0 +1,31 @@
+# tests/test_result_cache.py
+from src.result_cache import ResultCache, cache_key
+
+
+def test_cache_key_is_stable_and_input_sensitive():
+    assert cache_key(video="abc", stride=8) == cache_key(stride=8, video="abc")
+    assert cache_key(video="abc", stride=8) != cache_key(video="abc", stride=4)
+    assert cache_key(steps=["1", "2"]) != cache_key(steps=["2", "1"])
+
+
+def test_get_put_round_trip(tmp_path):
+    cache = ResultCache(str(tmp_path))
+    assert cache.get("frames", "k") is None
+    cache.put("frames", "k", {"frame_0000.jpg": {"timestamp": 0.0}})
+    assert cache.get("frames", "k") == {"frame_0000.jpg": {"timestamp": 0.0}}
+
+
+def test_put_scans_the_cache_only_when_over_the_limit(tmp_path, monkeypatch):
+    scans = []
+    entries = ResultCache._entries
+    monkeypatch.setattr(ResultCache, "_entries", lambda self: scans.append(1) or entries(self))
+    cache = ResultCache(str(tmp_path), max_bytes=10_000)
+    for i in range(20):
+        cache.put("answers", f"k{i}", {"text": "x" * 100})
+    assert len(scans) == 1                 # first put per root only
+
+    small = ResultCache(str(tmp_path), max_bytes=1_000)
+    small.put("answers", "last", {"text": "x" * 100})
+    assert len(scans) == 2                 # over the limit: evict
+    assert small.size_bytes() <= 1_000
+    assert small.get("answers", "last") is not None
@@ -0,0 +1,47 @@
+# tests/test_station_calibration.py
+import numpy as np
+import pytest
+
+from src import object_detector
+from src.bench_suite import OBJECT_COLORS
+from src.station_calibration import RoiCrop, StationCalibration
+
+CAL = StationCalibration("line1", (1920, 1080), (480, 270, 1440, 810), infer_size=320)
+
+
+def _frame(width, height, rect):
+    # one "cell phone" (→ case) block at rect (x1, y1, x2, y2) in this frame's pixels
+    frame = np.zeros((height, width, 3), dtype=np.uint8)
+    x1, y1, x2, y2 = rect
+    frame[y1:y2, x1:x2] = OBJECT_COLORS["cell phone"]
+    return frame
+
+
+def test_apply_remembers_the_decoded_frame_size():
+    crop = CAL.apply(np.zeros((720, 1280, 3), dtype=np.uint8))
+    assert isinstance(crop, RoiCrop) and crop.frame_size == (1280, 720)
+    assert crop.shape[:2] == (180, 320)
+    assert crop[10:20].frame_size == (1280, 720)
+
+
+@pytest.mark.parametrize("size", [(1920, 1080), (1280, 720)])
+def test_to_source_uses_the_decoded_frame_size(size):
+    w, h = size
+    x1, y1, x2, y2 = CAL.roi_for(w, h)
+    crop = CAL.apply(np.zeros((h, w, 3), dtype=np.uint8))
+    whole = CAL.to_source([0, 0, crop.shape[1], crop.shape[0]], crop.shape, crop.frame_size)
+    assert whole.tolist() == [x1, y1, x2, y2]
+
+
+@pytest.mark.parametrize("size", [(1920, 1080), (1280, 720)])
+def test_detection_boxes_land_on_the_object(size, dummy_detector):
+    w, h = size
+    rect = (w // 2, h // 2, w // 2 + w // 8, h // 2 + h // 8)
+    crop = CAL.apply(_frame(w, h, rect))
+    batch = object_detector.detect_objects_batch([crop], calibration=CAL)[0]
+    single = object_detector.detect_objects(crop, calibration=CAL)
+    assert batch.objects() == ["case"]
+    assert batch.box.dtype == np.float32
+    # DummyDetector works on a 4x downscaled crop: a few frame pixels of slack
+    assert np.allclose(batch.box[0], rect, atol=4 * w / 320 + 1)
+    assert single.to_list() == batch.to_list()
@@ -0,0 +1,79 @@
+# tests/test_step_rules.py
+from src.object_detector import LABELS
+from src.pipeline import GOLDEN_STEPS
+from src.step_rules import RuleEngine, compile_rules
+from src.vllm_reasoner import verify_steps_with_vllm
+
+ALL_OBJECTS = [{"object": o, "confidence": 0.9, "box": [0, 0, 10, 10]}
+               for o in ("case", "left_earbud", "right_earbud", "cable")]
+
+
+def _statuses(engine):
+    return {k: v["status"] for k, v in engine.result().items()}
+
+
+def test_out_of_order_step_is_not_a_prerequisite():
+    # golden frame 0: every object in view, nothing opened yet
+    engine = RuleEngine(compile_rules(GOLDEN_STEPS))
+    engine.update("f0", "Workstation with all parts", ALL_OBJECTS, 0.0)
+    assert _statuses(engine) == {"1": "done", "2": "missing", "3": "out_of_order",
+                                 "4": "out_of_order", "5": "missing", "6": "out_of_order"}
+
+
+def test_golden_sequence_passes_its_own_check():
+    engine = RuleEngine(compile_rules(GOLDEN_STEPS))
+    answers = ["Workstation with all parts", "The case is open", "Left earbud inserted",
+               "Right earbud inserted", "The case is closed", "Cable plugged in"]
+    for i, text in enumerate(answers):
+        engine.update(f"f{i}", text, ALL_OBJECTS, float(i))
+    # each ordered step is upgraded one frame after its prerequisite completes
+    for i in range(len(answers), len(answers) + 3):
+        engine.update(f"f{i}", "The case is closed", ALL_OBJECTS, float(i))
+    assert set(_statuses(engine).values()) == {"done"}
+    assert engine.finished()
+
+
+def test_upgrade_emits_one_event_per_status_change():
+    engine = RuleEngine(compile_rules(GOLDEN_STEPS))
+    events = []
+    events += engine.update("f0", "nothing", ALL_OBJECTS[1:2], 0.0)
+    events += engine.update("f1", "nothing", ALL_OBJECTS[1:2], 1.0)
+    assert [(e["step"], e["status"]) for e in events] == [("3", "out_of_order")]
+    events += engine.update("f2", "The case is open", ALL_OBJECTS[:1], 2.0)
+    events += engine.update("f3", "nothing", ALL_OBJECTS[1:2], 3.0)
+    assert [(e["step"], e["status"]) for e in events][-2:] == [("2", "done"), ("3", "done")]
+    assert engine.result()["3"]["evidence_frame"] == "f3"
+
+
+def _app_golden_steps():
+    # the Streamlit app's own list (streamlit itself need not be installed)
+    import ast
+    with open("app_streamlit.py", "r", encoding="utf-8") as f:
+        tree = ast.parse(f.read())
+    for node in tree.body:
+        if isinstance(node, ast.Assign) and getattr(node.targets[0], "id", None) == "golden_steps":
+            return ast.literal_eval(node.value)
+    raise AssertionError("no golden_steps in app_streamlit.py")
+
+
+def test_inventory_step_without_objects_expects_every_class_and_is_unordered():
+    rules = compile_rules(_app_golden_steps())
+    assert rules[0].inventory and rules[0].cumulative_objects == frozenset(LABELS)
+    assert rules[0].after == () and rules[1].after == ()
+    assert [r.after for r in rules[2:]] == [("2",), ("3",), ("4",), ("5",)]
+
+
+def test_app_golden_steps_pass_on_an_ordered_run():
+    def objs(*names):
+        return [{"object": o, "confidence": 0.9, "box": [0, 0, 10, 10]} for o in names]
+
+    frames = [("Parts on the table.", objs("case", "left_earbud", "right_earbud")),
+              ("Case opened fully.", objs("case", "left_earbud", "right_earbud")),
+              ("Left earbud inserted in left slot.", objs("case", "left_earbud", "right_earbud")),
+              ("Right earbud inserted in right slot.", objs("case", "right_earbud")),
+              ("Case closed completely.", objs("case")),
+              ("Cable connected and LED on.", objs("case", "cable"))]
+    answers = {f"frame_{i:04d}.jpg": text for i, (text, _) in enumerate(frames)}
+    detections = {f"frame_{i:04d}.jpg": dets for i, (_, dets) in enumerate(frames)}
+    result = verify_steps_with_vllm(answers, _app_golden_steps(), detections)
+    assert {k: v["status"] for k, v in result.items()} == {str(i): "done" for i in range(1, 7)}
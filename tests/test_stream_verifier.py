@@ -0,0 +1,25 @@
+# tests/test_stream_verifier.py
+import time
+
+import cv2
+import numpy as np
+
+from src import vllm_reasoner
+from src.pipeline import GOLDEN_STEPS
+from src.stream_verifier import run_stream
+
+
+def test_max_seconds_verifies_the_partial_batch(tmp_path, dummy_detector):
+    video = str(tmp_path / "clip.mp4")
+    writer = cv2.VideoWriter(video, cv2.VideoWriter_fourcc(*"mp4v"), 10, (64, 48))
+    for i in range(40):
+        writer.write(np.full((48, 64, 3), i * 5, np.uint8))
+    writer.release()
+    vllm_reasoner.set_simulation(0)
+
+    t0 = time.perf_counter()
+    # 4 s of video at 10 fps sampled 5/s: the 100-frame batch never fills before the deadline
+    result = run_stream(video, GOLDEN_STEPS, sample_fps=5, realtime=True, batch_size=100,
+                        stop_when_done=False, max_seconds=0.5)
+    assert time.perf_counter() - t0 < 2.5
+    assert 0 < result["frames"] < 20
@@ -0,0 +1,52 @@
+# tests/test_vllm_reasoner.py
+import json
+
+import numpy as np
+import pytest
+
+from src import vllm_reasoner
+from src.pipeline import GOLDEN_STEPS
+from src.vlm_answer import PRIMER, parse_answer
+
+EVIDENCE = [[], [{"object": "case", "confidence": 0.9, "box": [0, 0, 9, 9]}],
+            [{"object": "case", "confidence": 0.9, "box": [0, 0, 9, 9]},
+             {"object": "cable", "confidence": 0.5, "box": [5, 5, 20, 20]}]]
+
+
+@pytest.fixture
+def llava(tiny_llava, monkeypatch):
+    model, processor = tiny_llava
+    monkeypatch.setattr(vllm_reasoner, "_prefix_cache_ok", True)
+    monkeypatch.setattr(vllm_reasoner, "_token_budget", vllm_reasoner._TokenBudget())
+    vllm_reasoner.set_vlm_model(model, processor, "tiny-llava")
+    frames = [np.random.RandomState(i).randint(0, 255, (40, 50, 3), np.uint8) for i in range(len(EVIDENCE))]
+    # suffixes of different lengths: the batch is padded
+    return frames, [vllm_reasoner.prompt_suffix(e) for e in EVIDENCE], processor
+
+
+@pytest.mark.parametrize("constrained", [False, True])
+def test_prefix_cached_generation_matches_plain_generate(llava, constrained):
+    frames, suffixes, _ = llava
+    images = [vllm_reasoner._to_pil(f) for f in frames]
+    prefix = vllm_reasoner.prompt_prefix(GOLDEN_STEPS)
+    grammar = vllm_reasoner.answer_grammar(len(GOLDEN_STEPS)) if constrained else None
+    budget = grammar.max_new_tokens() if constrained else 20
+    cached, _ = vllm_reasoner._generate_with_prefix_cache(images, prefix, suffixes, budget, grammar)
+    prompts = [vllm_reasoner._llava_prompt(prefix, s, PRIMER if constrained else "") for s in suffixes]
+    plain, _ = vllm_reasoner._generate_plain(images, prompts, budget, grammar)
+    assert cached == plain
+
+
+@pytest.mark.parametrize("prefix_cache", [True, False])
+def test_constrained_answers_are_typed_json(llava, monkeypatch, prefix_cache):
+    frames, suffixes, processor = llava
+    monkeypatch.setattr(vllm_reasoner, "_prefix_cache_ok", prefix_cache)
+    texts = vllm_reasoner.vllm_query_batch(frames, vllm_reasoner.prompt_prefix(GOLDEN_STEPS), suffixes,
+                                           n_steps=len(GOLDEN_STEPS))
+    for text in texts:
+        obj = json.loads(text)
+        answer = parse_answer(text)
+        assert answer.structured and answer.status == obj["status"]
+        assert obj["detected_step"] is None or 1 <= obj["detected_step"] <= len(GOLDEN_STEPS)
+    # padding is chosen per call, not left behind on the shared tokenizer
+    assert processor.tokenizer.padding_side == "right"
@@ -0,0 +1,45 @@
+# tests/test_vlm_answer.py
+import json
+
+import pytest
+
+from src.vlm_answer import PRIMER, STATUSES, AnswerGrammar, VlmAnswer, parse_answer
+
+
+@pytest.mark.parametrize("text, expected", [
+    ('{"detected_step": 3, "status": "done", "note": "left earbud in"}', VlmAnswer(3, "done", "left earbud in", True)),
+    ("{'detected_step': '2', 'status': 'Out of order', 'note': 'early',}", VlmAnswer(2, "out_of_order", "early", True)),
+    ('Sure! {"detected_step": null, "status": "uncertain", "note": "blurry"} Hope that helps.',
+     VlmAnswer(None, "uncertain", "blurry", True)),
+    ('{"detected_step": 5, "status": "done", "note": "case clo', VlmAnswer(5, "done", "case clo", True)),
+    ("Case opened fully.", VlmAnswer(None, None, "Case opened fully.")),
+])
+def test_parse_answer(text, expected):
+    assert parse_answer(text) == expected
+
+
+def test_named_step_only_when_vouched_for():
+    assert VlmAnswer(3, "done", "").named_step() == "3"
+    assert VlmAnswer(3, "out_of_order", "").named_step() == "3"
+    assert VlmAnswer(3, "missing", "").named_step() is None
+    assert VlmAnswer(None, "done", "").named_step() is None
+
+
+@pytest.mark.parametrize("n_steps", [6, 12])
+def test_grammar_only_spells_valid_answers(tiny_llava, n_steps):
+    torch = pytest.importorskip("torch")
+    tok = tiny_llava[1].tokenizer
+    grammar = AnswerGrammar(tok, n_steps)
+    for seed in range(40):
+        gen = torch.Generator().manual_seed(seed)
+        state, ids = grammar.start(), []
+        for _ in range(grammar.max_new_tokens()):
+            if state.done:
+                break
+            t = grammar.pick(state, torch.randn(len(tok), generator=gen))
+            grammar.advance(state, t)
+            ids.append(t)
+        assert state.done
+        obj = json.loads(PRIMER + tok.decode(ids))
+        assert obj["status"] in STATUSES
+        assert obj["detected_step"] is None or 1 <= obj["detected_step"] <= n_steps
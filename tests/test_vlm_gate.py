@@ -0,0 +1,38 @@
+# tests/test_vlm_gate.py
+from src.vlm_gate import GatePolicy, VlmGate
+
+
+def _dets(**conf):
+    return [{"object": obj, "confidence": c} for obj, c in conf.items()]
+
+
+def _decisions(gate, frames):
+    return [gate.decide(key, dets) for key, dets in frames]
+
+
+def test_reuses_answer_until_evidence_changes():
+    frames = [("f0", _dets(case=0.9)),
+              ("f1", _dets(case=0.85)),               # same objects, still above threshold → reuse f0
+              ("f2", _dets(case=0.4)),                # confidence dropped below 0.5 → new call
+              ("f3", []),                             # empty frame, nothing was above threshold → reuse f2
+              ("f4", _dets(case=0.45)),               # objects back → new call
+              ("f5", _dets(case=0.45, cable=0.7)),    # new object → new call
+              ("f6", [])]                             # cable gone: its confidence crossed the threshold
+    gate = VlmGate(GatePolicy(conf_threshold=0.5))
+    assert _decisions(gate, frames) == [None, "f0", None, "f2", None, None, None]
+    assert gate.stats() == {"frames": 7, "vlm_calls": 5, "vlm_calls_saved": 2, "saved_ratio": 0.286}
+
+
+def test_confidence_threshold_decides_reuse():
+    frames = [("f0", _dets(case=0.9)), ("f1", _dets(case=0.6))]
+    assert _decisions(VlmGate(GatePolicy(conf_threshold=0.5)), frames) == [None, "f0"]
+    assert _decisions(VlmGate(GatePolicy(conf_threshold=0.7)), frames) == [None, None]
+
+
+def test_max_gap_and_empty_frames():
+    steady = [(f"f{i}", _dets(case=0.9)) for i in range(8)]
+    assert _decisions(VlmGate(GatePolicy(max_gap=3)), steady) == [None, "f0", "f0", "f0", None, "f4", "f4", "f4"]
+
+    frames = [("f0", _dets(case=0.9)), ("f1", [])]
+    assert _decisions(VlmGate(GatePolicy(call_on_empty=True)), frames) == [None, None]
+    assert _decisions(VlmGate(GatePolicy(enabled=False)), steady[:3]) == [None, None, None]